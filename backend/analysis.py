@@ -0,0 +1,404 @@
+"""
+Static reachability analysis: find nodes no input can reach, without samples.
+
+Conditions of the form `input.field <op> constant` (and `and`/`not`
+combinations of them) are turned into constraints on the field's possible
+values. Constraints are accumulated down the tree, including the negation of
+every earlier sibling's condition, since `traverse_tree` takes the first
+matching child. A node whose accumulated constraints cannot all hold is
+unreachable. Anything the analysis does not understand constrains nothing,
+so every node it reports is truly unreachable; it may miss some.
+
+Inputs are assumed to be JSON values: numbers, booleans, strings, null,
+lists and objects. Evaluation errors (missing fields, comparing a string to a
+number) make a condition False, and the analysis accounts for that.
+
+Python's JSON parser also accepts NaN and Infinity. NaN compares False with
+everything and unequal to everything, just as the values in a domain's
+`other` do when they do not raise, so it is counted there. An infinity
+meets every bound a large enough finite number meets, so domains of finite
+numbers never rule out a path an infinity can take, as long as conditions
+compare with finite constants. Conditions with a non-finite constant
+(`1e999`, `-1e999`) are therefore not understood.
+"""
+import ast
+import math
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from compiled import CompiledTree
+from conditions import MISSING
+from fields import condition_reads, input_field
+
+
+# Reasons a node is reported unreachable
+UNSATISFIABLE = "unsatisfiable"
+SHADOWED = "shadowed"
+INVALID_CONDITION = "invalid_condition"
+PARENT_UNREACHABLE = "parent_unreachable"
+
+
+class FieldDomain:
+    """
+    The values a single input field may still take on some path.
+
+    Numbers (booleans count as 0/1) are tracked as an interval minus excluded
+    points, strings as an allowed set or an excluded set, and `other` covers
+    everything else: a missing field, null, lists, objects and NaN.
+    """
+
+    __slots__ = ("numeric", "lo", "lo_open", "hi", "hi_open", "excluded", "strings", "str_excluded", "other")
+
+    def __init__(self):
+        self.numeric = True
+        self.lo = -math.inf
+        self.lo_open = True
+        self.hi = math.inf
+        self.hi_open = True
+        self.excluded = frozenset()
+        self.strings: Optional[frozenset] = None
+        self.str_excluded = frozenset()
+        self.other = True
+
+    def copy(self) -> "FieldDomain":
+        domain = FieldDomain.__new__(FieldDomain)
+        for name in FieldDomain.__slots__:
+            setattr(domain, name, getattr(self, name))
+        return domain
+
+    def has_numbers(self) -> bool:
+        if not self.numeric or self.lo > self.hi:
+            return False
+        if self.lo == self.hi:
+            return not (self.lo_open or self.hi_open) and self.lo not in self.excluded
+        return True
+
+    def has_strings(self) -> bool:
+        return self.strings is None or bool(self.strings - self.str_excluded)
+
+    def is_empty(self) -> bool:
+        return not (self.other or self.has_numbers() or self.has_strings())
+
+    def clamp_lower(self, value: float, open_: bool) -> None:
+        if value > self.lo or (value == self.lo and open_ and not self.lo_open):
+            self.lo, self.lo_open = value, open_
+
+    def clamp_upper(self, value: float, open_: bool) -> None:
+        if value < self.hi or (value == self.hi and open_ and not self.hi_open):
+            self.hi, self.hi_open = value, open_
+
+    def only_numbers(self) -> None:
+        self.strings = frozenset()
+        self.other = False
+
+    def only_strings(self) -> None:
+        self.numeric = False
+        self.other = False
+
+    def pin_number(self, value: float) -> None:
+        self.only_numbers()
+        self.clamp_lower(value, False)
+        self.clamp_upper(value, False)
+
+    def pin_string(self, value: str) -> None:
+        self.only_strings()
+        self.strings = frozenset([value]) if self.strings is None else self.strings & {value}
+
+    def contains_number(self, value: float) -> bool:
+        if not self.numeric or value in self.excluded:
+            return False
+        if value < self.lo or (value == self.lo and self.lo_open):
+            return False
+        return value < self.hi or (value == self.hi and not self.hi_open)
+
+    def example(self) -> Any:
+        """
+        One value in the domain, or MISSING when only a missing field (or
+        null, a list or an object) is left. A pinned string comes first,
+        then numbers, integers where possible, then any other string.
+        """
+        if self.strings and self.has_strings():
+            return min(self.strings - self.str_excluded)
+        if self.has_numbers():
+            value = self._example_number()
+            if value is not None:
+                return value
+        if self.has_strings():
+            value, suffix = "x", 0
+            while value in self.str_excluded:
+                suffix += 1
+                value = f"x{suffix}"
+            return value
+        return MISSING
+
+    def _example_number(self) -> Optional[float]:
+        lo, hi = self.lo, self.hi
+        if lo == hi:
+            return lo
+        # Integers counting away from a bound, or from 0 if there is none;
+        # at most len(excluded) of them can be excluded
+        if lo > -math.inf:
+            start, step = (math.floor(lo) + 1 if self.lo_open else math.ceil(lo)), 1
+        elif hi < math.inf:
+            start, step = (math.ceil(hi) - 1 if self.hi_open else math.floor(hi)), -1
+        else:
+            start, step = 0, 1
+        for value in range(start, start + step * (len(self.excluded) + 1), step):
+            if self.contains_number(value):
+                return value
+        if lo == -math.inf or hi == math.inf:
+            return None
+        # No room for an integer: evenly spaced points strictly inside
+        parts = len(self.excluded) + 2
+        for part in range(1, parts):
+            value = lo + (hi - lo) * part / parts
+            if self.contains_number(value):
+                return value
+        return None
+
+    def describe(self) -> Dict[str, Any]:
+        """
+        The domain as JSON. `numbers` and `strings` are null when no number
+        or string is left; null bounds and a null `allowed` are unbounded.
+        """
+        numbers = None
+        if self.has_numbers():
+            numbers = {
+                "min": None if self.lo == -math.inf else self.lo,
+                "min_inclusive": not self.lo_open,
+                "max": None if self.hi == math.inf else self.hi,
+                "max_inclusive": not self.hi_open,
+                "excluded": sorted(self.excluded),
+            }
+        strings = None
+        if self.has_strings():
+            if self.strings is None:
+                strings = {"allowed": None, "excluded": sorted(self.str_excluded)}
+            else:
+                strings = {"allowed": sorted(self.strings - self.str_excluded), "excluded": []}
+        return {"numbers": numbers, "strings": strings, "other": self.other}
+
+
+class Atom:
+    """
+    `input.<field> <op> <constant>`, with the field always on the left.
+    """
+
+    __slots__ = ("field", "op", "value")
+
+    def __init__(self, field: str, op: str, value: Any):
+        self.field = field
+        self.op = op
+        self.value = value
+
+    def apply(self, domain: FieldDomain, positive: bool, errors: bool) -> None:
+        """
+        Narrow `domain` given the comparison was True (`positive`) or False.
+        With `errors`, the comparison may instead have raised.
+        """
+        op, value = self.op, self.value
+
+        if op in ("==", "!="):
+            if (op == "==") == positive:
+                # Raising is only possible for a missing field, which is in `other`
+                other = domain.other
+                if isinstance(value, str):
+                    domain.pin_string(value)
+                else:
+                    domain.pin_number(value)
+                domain.other = other and errors
+            elif isinstance(value, str):
+                domain.str_excluded = domain.str_excluded | {value}
+            else:
+                domain.excluded = domain.excluded | {value}
+            return
+
+        if isinstance(value, str):
+            # String ordering is not tracked
+            return
+
+        if not positive:
+            op = _NEGATED[op]
+        elif not errors:
+            # Ordering only succeeds for numbers; anything else raises
+            domain.only_numbers()
+        if op == ">":
+            domain.clamp_lower(value, True)
+        elif op == ">=":
+            domain.clamp_lower(value, False)
+        elif op == "<":
+            domain.clamp_upper(value, True)
+        elif op == "<=":
+            domain.clamp_upper(value, False)
+
+
+_OPS = {ast.Eq: "==", ast.NotEq: "!=", ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">="}
+_NEGATED = {"<": ">=", "<=": ">", ">": "<=", ">=": "<"}
+_FLIPPED = {"==": "==", "!=": "!=", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+
+# Formulas are nested tuples: ("atom", Atom), ("and", [formulas]), ("not", formula)
+# or None for anything we cannot reason about.
+Formula = Optional[Tuple[str, Any]]
+
+
+def _constant(node: ast.AST) -> Tuple[bool, Any]:
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        found, value = _constant(node.operand)
+        if found and isinstance(value, (int, float)) and not isinstance(value, bool):
+            return True, -value
+        return False, None
+    if isinstance(node, ast.Constant) and isinstance(node.value, (bool, int, float, str)):
+        value = node.value
+        if isinstance(value, float) and not math.isfinite(value):
+            # See the module docstring
+            return False, None
+        return True, int(value) if isinstance(value, bool) else value
+    return False, None
+
+
+def _to_formula(node: ast.AST) -> Formula:
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+        return ("and", [_to_formula(value) for value in node.values])
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        operand = _to_formula(node.operand)
+        return None if operand is None else ("not", operand)
+
+    if isinstance(node, ast.Compare):
+        operands = [node.left] + node.comparators
+        links = []
+        for op, left, right in zip(node.ops, operands, operands[1:]):
+            if type(op) not in _OPS:
+                links.append(None)
+                continue
+            symbol = _OPS[type(op)]
+            field, (found, value) = input_field(left), _constant(right)
+            if field is None:
+                field, (found, value) = input_field(right), _constant(left)
+                symbol = _FLIPPED[symbol]
+            links.append(Atom(field, symbol, value) if field is not None and found else None)
+        if len(links) == 1:
+            return None if links[0] is None else ("atom", links[0])
+        # A chain is the conjunction of its links
+        return ("and", [None if atom is None else ("atom", atom) for atom in links])
+
+    return None
+
+
+@lru_cache(maxsize=4096)
+def condition_formula(source: str) -> Formula:
+    """
+    Parse a condition into a constraint formula, or None if it is not understood.
+    """
+    tree = condition_reads(source).tree
+    return None if tree is None else _to_formula(tree.body)
+
+
+Domains = Dict[str, FieldDomain]
+
+
+def apply_formula(domains: Domains, formula: Formula, positive: bool, errors: bool = False) -> Optional[Domains]:
+    """
+    Return the domains narrowed by knowing the condition evaluated True
+    (`positive`) or False, or None when that is impossible. With `errors`,
+    the condition may instead have raised, which `traverse_tree` treats as
+    False. The input dict is never modified.
+    """
+    if formula is None:
+        return domains
+
+    kind, body = formula
+    if kind == "not":
+        # `not x` raises whenever x does, so the operand may always have raised
+        return apply_formula(domains, body, not positive, True)
+
+    if kind == "and":
+        if not positive or errors:
+            # Some operand was False or raised: a disjunction we do not track
+            return domains
+        for operand in body:
+            domains = apply_formula(domains, operand, True)
+            if domains is None:
+                return None
+        return domains
+
+    atom = body
+    domain = domains.get(atom.field)
+    domain = FieldDomain() if domain is None else domain.copy()
+    atom.apply(domain, positive, errors)
+    if domain.is_empty():
+        return None
+    narrowed = dict(domains)
+    narrowed[atom.field] = domain
+    return narrowed
+
+
+def child_domains(
+    compiled: CompiledTree,
+    node: int,
+    domains: Domains,
+) -> Tuple[List[Tuple[int, Optional[Domains], Optional[str]]], Optional[Domains]]:
+    """
+    For each child of `node`, reached with `domains`: (child index, domains on
+    entering it, None and the reason if it cannot be entered). Also returns
+    the domains left when no child matches, or None if some child always does.
+    """
+    branches: List[Tuple[int, Optional[Domains], Optional[str]]] = []
+    running: Optional[Domains] = domains
+    shadowed = False
+    for child in compiled.iter_children(node):
+        condition = compiled.conditions[child]
+        if running is None:
+            # An earlier sibling always matches, or no input is left over
+            branches.append((child, None, SHADOWED if shadowed else UNSATISFIABLE))
+        elif condition is None:
+            branches.append((child, running, None))
+            running = None
+            shadowed = True
+        elif condition.code is None:
+            # Conditions that fail to compile always evaluate to False
+            branches.append((child, None, INVALID_CONDITION))
+        else:
+            formula = condition_formula(condition.source)
+            entered = apply_formula(running, formula, True)
+            branches.append((child, entered, UNSATISFIABLE if entered is None else None))
+            running = apply_formula(running, formula, False, True)
+    return branches, running
+
+
+def find_unreachable(compiled: CompiledTree) -> List[Tuple[int, str]]:
+    """
+    Return (node index, reason) for every node no input can reach, in preorder.
+    """
+    unreachable: Dict[int, str] = {}
+
+    # (node index, domains that hold on reaching it, or None if it cannot be reached)
+    stack: List[Tuple[int, Optional[Domains]]] = [(0, {})]
+    while stack:
+        node, domains = stack.pop()
+
+        if domains is None:
+            # Everything below an unreachable node is unreachable too
+            for child in compiled.iter_children(node):
+                unreachable.setdefault(child, PARENT_UNREACHABLE)
+                stack.append((child, None))
+            continue
+
+        for child, entered, reason in child_domains(compiled, node, domains)[0]:
+            if reason is not None:
+                unreachable[child] = reason
+            stack.append((child, entered))
+
+    if not compiled.relocated:
+        # Index order is preorder
+        return sorted(unreachable.items())
+    return [(index, unreachable[index]) for index in compiled.preorder() if index in unreachable]
+
+
+def static_unreachable_nodes(compiled: CompiledTree, qualify_duplicates: bool = False) -> List[Dict[str, str]]:
+    """
+    Unreachable nodes as {"node_id", "reason"} records, in preorder, under
+    their qualified ids if `qualify_duplicates` is set.
+    """
+    node_ids = compiled.display_ids(qualify_duplicates)
+    return [{"node_id": node_ids[index], "reason": reason} for index, reason in find_unreachable(compiled)]
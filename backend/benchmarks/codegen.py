@@ -0,0 +1,110 @@
+"""
+Generated per-tree functions (codegen.py) versus `traverse_tree` and
+`CompiledTree.traverse` on the complex_loan example.
+
+Before timing anything, checks that the generated function takes the same
+path, and reports the same condition errors, as `traverse_tree` on random
+inputs: fields are drawn from the samples' values plus a few of the wrong
+type, and some are left out.
+
+Run from the backend directory:
+
+    python -m benchmarks.codegen [random rows]
+"""
+import logging
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from codegen import CodegenCache
+from compiled import compile_tree
+from engine import traverse_tree
+from tree_examples import complex_loan_tree, complex_loan_sample_inputs
+
+
+def random_rows(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    samples = [sample["input_values"] for sample in complex_loan_sample_inputs]
+    values: Dict[str, List[Any]] = {}
+    for sample in samples:
+        for name, value in sample.items():
+            values.setdefault(name, []).append(value)
+    for choices in values.values():
+        choices.extend([None, "n/a", 0, -1, True])
+    return samples + [
+        {name: rng.choice(choices) for name, choices in values.items() if rng.random() < 0.9}
+        for _ in range(count)
+    ]
+
+
+class _Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages: List[str] = []
+
+    def emit(self, record: logging.LogRecord):
+        self.messages.append(record.getMessage())
+
+
+def check_equivalence(traverse: Callable, rows: List[Dict[str, Any]]) -> int:
+    """
+    How many rows get a different path or different logged errors than
+    `traverse_tree`.
+    """
+    root = complex_loan_tree.root
+    logger = logging.getLogger("treejack.conditions")
+    collect = _Collect()
+    logger.addHandler(collect)
+    logger.propagate = False
+    mismatches = 0
+    try:
+        for inputs in rows:
+            expected = traverse_tree(root, inputs)[0]
+            expected_messages, collect.messages = collect.messages, []
+            path = traverse(inputs)[0]
+            if path != expected or collect.messages != expected_messages:
+                mismatches += 1
+            collect.messages = []
+    finally:
+        logger.removeHandler(collect)
+        logger.propagate = True
+    return mismatches
+
+
+def us_per_traversal(traverse: Callable, rows: List[Dict[str, Any]], rounds: int) -> float:
+    for inputs in rows:
+        traverse(inputs)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for inputs in rows:
+            traverse(inputs)
+    return (time.perf_counter() - start) / (rounds * len(rows)) * 1e6
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    compiled = compile_tree(complex_loan_tree.root)
+    cache = CodegenCache(maxsize=1)
+    start = time.perf_counter()
+    generated = cache.traversal(compiled)
+    print(f"generated {len(compiled)} nodes in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    mismatches = check_equivalence(generated.traverse, random_rows(count))
+    print(f"equivalence: {count} random rows, {mismatches} mismatches")
+    if mismatches:
+        sys.exit(1)
+
+    # Timed on the samples themselves; logging errors for the random rows
+    # would dominate the timings
+    logging.getLogger("treejack.conditions").disabled = True
+    rows = [sample["input_values"] for sample in complex_loan_sample_inputs]
+    root = complex_loan_tree.root
+    for label, traverse in (
+        ("traverse_tree", lambda inputs: traverse_tree(root, inputs)),
+        ("CompiledTree", compiled.traverse),
+        ("generated", generated.traverse),
+        ("generated final", generated.final),
+    ):
+        result = us_per_traversal(traverse, rows, rounds=5000)
+        print(f"{label:<16} us/traversal: {result:6.2f}")
@@ -0,0 +1,93 @@
+"""
+Microbenchmark: memory allocated per traversal with the old per-condition
+`type('input', (), inputs)` accessor versus a shared InputView.
+
+Run from the backend directory:
+
+    python -m benchmarks.input_access
+"""
+import gc
+import logging
+import time
+import tracemalloc
+from functools import lru_cache
+from typing import Any, Callable, Dict
+
+from engine import traverse_tree
+from models import Node
+from tree_examples import complex_loan_tree, complex_loan_sample_inputs
+
+
+@lru_cache(maxsize=None)
+def _legacy_code(source: str):
+    try:
+        return compile(source, "<condition>", "eval")
+    except SyntaxError:
+        return None
+
+
+def legacy_traverse(node: Node, inputs: Dict[str, Any]):
+    """
+    The traversal as it was before InputView: one new class per condition.
+    """
+    path = [node.node_id]
+    for child in node.children:
+        if child.condition:
+            code = _legacy_code(child.condition)
+            if code is None:
+                continue
+            try:
+                matched = bool(eval(code, {}, {"input": type('input', (), inputs)}))
+            except Exception:
+                matched = False
+            if not matched:
+                continue
+        return path + legacy_traverse(child, inputs)
+    return path
+
+
+def measure(traverse: Callable, rounds: int) -> Dict[str, float]:
+    rows = [sample["input_values"] for sample in complex_loan_sample_inputs]
+    root = complex_loan_tree.root
+
+    # Warm the condition cache so compilation is not measured
+    for inputs in rows:
+        traverse(root, inputs)
+
+    gc.collect()
+    collections_before = sum(stat["collections"] for stat in gc.get_stats())
+
+    tracemalloc.start()
+    peak_total = 0
+    for inputs in rows:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        traverse(root, inputs)
+        _, peak = tracemalloc.get_traced_memory()
+        peak_total += peak - base
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for inputs in rows:
+            traverse(root, inputs)
+    elapsed = time.perf_counter() - start
+
+    traversals = rounds * len(rows)
+    return {
+        "peak_bytes": peak_total / len(rows),
+        "us_per_traversal": elapsed / traversals * 1e6,
+        "gc_collections": sum(stat["collections"] for stat in gc.get_stats()) - collections_before,
+    }
+
+
+if __name__ == "__main__":
+    # Samples with missing fields log evaluation errors; keep them out of the timings
+    logging.getLogger("treejack.conditions").disabled = True
+    for label, traverse in (("type()", legacy_traverse), ("InputView", traverse_tree)):
+        result = measure(traverse, rounds=2000)
+        print(
+            f"{label:<10} peak bytes/traversal: {result['peak_bytes']:8.0f}   "
+            f"us/traversal: {result['us_per_traversal']:7.2f}   "
+            f"gc collections: {result['gc_collections']}"
+        )
@@ -0,0 +1,43 @@
+"""
+Scaling of process-pool batch scoring from 1 to N workers on the
+complex_loan example.
+
+Run from the backend directory:
+
+    python -m benchmarks.parallel_scaling [rows] [max_workers]
+"""
+import logging
+import os
+import random
+import sys
+import time
+
+from engine import simulate_batch
+from compiled import compile_tree
+from parallel import parallel_simulate_batch
+from tree_examples import complex_loan_tree, complex_loan_sample_inputs
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    random.seed(0)
+    samples = [sample["input_values"] for sample in complex_loan_sample_inputs]
+    rows = [random.choice(samples) for _ in range(count)]
+    root = complex_loan_tree.root
+
+    # Samples with missing fields log evaluation errors; keep them out of the timings
+    logging.getLogger("treejack.conditions").disabled = True
+    start = time.perf_counter()
+    expected = simulate_batch(compile_tree(root), rows, final_only=True)
+    baseline = time.perf_counter() - start
+    print(f"in-process       {count / baseline:12.0f} rows/s")
+
+    workers = 1
+    while workers <= max_workers:
+        start = time.perf_counter()
+        results = parallel_simulate_batch(root, rows, final_only=True, workers=workers, chunk_size=5000)
+        elapsed = time.perf_counter() - start
+        assert results == expected
+        print(f"{workers:3d} worker(s)     {count / elapsed:12.0f} rows/s   speedup {baseline / elapsed:5.2f}x")
+        workers *= 2
@@ -0,0 +1,66 @@
+"""
+Cost of a one-operation patch as trees grow, against `CompiledTree.copy()`,
+the flat copy patches used to start from. Also times the first traversal of
+a patched tree, which builds the flat arrays its layers stand in for, and
+a patch of a patched tree.
+
+Run from the backend directory:
+
+    python -m benchmarks.patching [fanout:depth ...]
+"""
+import logging
+import sys
+import time
+from typing import Any, Callable, List
+
+from benchmarks.synthetic import make_inputs, make_tree
+from compiled import compile_tree
+from conditions import input_namespace
+from models import AddNodeOperation, EditNodeOperation, MoveNodeOperation, Node, RemoveNodeOperation
+from patches import apply_patch
+
+
+def ms(call: Callable[[], Any], rounds: int = 20) -> float:
+    call()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        call()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def first_use_ms(make: Callable[[], Any], use: Callable[[Any], Any], rounds: int = 5) -> float:
+    total = 0.0
+    for _ in range(rounds):
+        value = make()
+        start = time.perf_counter()
+        use(value)
+        total += time.perf_counter() - start
+    return total / rounds * 1000
+
+
+if __name__ == "__main__":
+    shapes: List[str] = sys.argv[1:] or ["6:6", "5:8"]
+    logging.getLogger("treejack.conditions").disabled = True
+    for shape in shapes:
+        fanout, depth = (int(part) for part in shape.split(":"))
+        compiled = compile_tree(make_tree(depth, fanout))
+        compiled.subtree_hashes()
+        last = len(compiled) - 1
+        operations = {
+            "edit text": [EditNodeOperation(op="edit", index=last, text="edited")],
+            "edit condition": [EditNodeOperation(op="edit", index=last, condition="input.f0 > 1")],
+            "add leaf": [AddNodeOperation(op="add", parent=compiled.parent[last], node=Node(node_id="added", text="added"))],
+            "remove leaf": [RemoveNodeOperation(op="remove", index=last)],
+            "move leaf": [MoveNodeOperation(op="move", index=last, parent=1)],
+        }
+        print(f"{len(compiled)} nodes (fanout {fanout}, depth {depth})")
+        print(f"  {'flat copy':24s} {ms(compiled.copy):9.3f} ms")
+        for name, patch in operations.items():
+            print(f"  {name:24s} {ms(lambda: apply_patch(compiled, patch)):9.3f} ms")
+
+        patched, _, _ = apply_patch(compiled, operations["move leaf"])
+        print(f"  {'patch of a patched tree':24s} {ms(lambda: apply_patch(patched, operations['edit text'])):9.3f} ms")
+
+        namespace = input_namespace(make_inputs(1, seed=1)[0])
+        print(f"  {'first traversal after':24s} {first_use_ms(lambda: apply_patch(compiled, operations['move leaf'])[0], lambda tree: tree.traverse_indices(namespace)):9.3f} ms")
+        print(f"  {'traversal':24s} {ms(lambda: patched.traverse_indices(namespace), 1000):9.3f} ms")
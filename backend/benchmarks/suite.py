@@ -0,0 +1,228 @@
+"""
+Benchmark suite: per-traversal latency, throughput and peak memory for the
+engine functions and the HTTP endpoints (through an in-process test client),
+over synthetic trees of varying depth, fan-out and condition complexity.
+
+Results are written as JSON so runs from different versions can be compared.
+
+Run from the backend directory:
+
+    python -m benchmarks.suite [--quick] [--output results.json] [--compare baseline.json]
+
+With --compare, every (case, target) whose mean latency grew by more than
+--threshold (default 10%) is reported, and the exit status is 1.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import fastapi
+import pydantic
+from fastapi.testclient import TestClient
+
+from compiled import compile_tree
+from engine import detect_unreachable_nodes, traverse_tree
+from main import app
+from benchmarks.synthetic import COMPLEXITIES, count_nodes, make_inputs, make_tree
+
+
+# (name, depth, fanout, shape); deep spines stay well inside JSON nesting limits
+SHAPES = [
+    ("wide", 2, 32, "full"),
+    ("balanced", 6, 4, "full"),
+    ("deep", 200, 3, "spine"),
+]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(calls: List[Callable[[], Any]], work_units: int) -> Dict[str, Any]:
+    """
+    Time each call separately, then run them all again under tracemalloc for
+    peak memory. `work_units` is what throughput counts (rows, samples or
+    requests).
+    """
+    timings = []
+    start = time.perf_counter()
+    for call in calls:
+        begin = time.perf_counter_ns()
+        call()
+        timings.append((time.perf_counter_ns() - begin) / 1000)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    for call in calls:
+        call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "calls": len(calls),
+        "latency_us": {
+            "mean": statistics.fmean(timings),
+            "p50": percentile(timings, 0.5),
+            "p95": percentile(timings, 0.95),
+            "p99": percentile(timings, 0.99),
+            "max": timings[-1],
+        },
+        "throughput_per_s": work_units / elapsed if elapsed else None,
+        "peak_memory_bytes": peak - baseline,
+    }
+
+
+def run_case(
+    client: TestClient,
+    name: str,
+    depth: int,
+    fanout: int,
+    shape: str,
+    complexity: str,
+    rows: int,
+    samples: int,
+    requests: int,
+    seed: int,
+) -> List[Dict[str, Any]]:
+    root = make_tree(depth, fanout, complexity, shape, seed=seed)
+    inputs = make_inputs(rows, seed=seed + 1)
+    sample_inputs = inputs[:samples]
+    compiled = compile_tree(root)
+    tree_json = {"root": root.model_dump()}
+
+    targets: List[Tuple[str, List[Callable[[], Any]], int]] = [
+        ("engine.traverse_tree", [lambda row=row: traverse_tree(root, row) for row in inputs], rows),
+        ("CompiledTree.traverse", [lambda row=row: compiled.traverse(row) for row in inputs], rows),
+        ("engine.detect_unreachable_nodes", [lambda: detect_unreachable_nodes(root, sample_inputs)] * 3, samples * 3),
+        (
+            "POST /simulate",
+            [
+                lambda row=row: client.post("/simulate", json={"tree": tree_json, "input_values": row})
+                for row in inputs[:requests]
+            ],
+            requests,
+        ),
+        (
+            "POST /simulate/batch",
+            [lambda: client.post("/simulate/batch", json={"tree": tree_json, "input_values": inputs, "final_only": True})] * 3,
+            rows * 3,
+        ),
+        (
+            "POST /detect-unreachable",
+            [lambda: client.post("/detect-unreachable", json={"tree": tree_json, "sample_inputs": sample_inputs})] * 3,
+            samples * 3,
+        ),
+    ]
+
+    case = {"case": f"{name}/{complexity}", "depth": depth, "fanout": fanout, "shape": shape, "nodes": count_nodes(root)}
+    results = []
+    for target, calls, units in targets:
+        # Warm the condition cache so compile time does not skew the first calls
+        calls[0]()
+        results.append({**case, "target": target, **measure(calls, units)})
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        return output.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], threshold: float) -> List[str]:
+    """
+    Describe every (case, target) whose mean latency regressed by more than
+    `threshold` (a fraction) against the baseline run.
+    """
+    previous = {(r["case"], r["target"]): r["latency_us"]["mean"] for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["case"], result["target"]))
+        after = result["latency_us"]["mean"]
+        if before and after > before * (1 + threshold):
+            regressions.append(
+                f"{result['case']:<24} {result['target']:<32} {before:10.1f}us -> {after:10.1f}us (+{after / before - 1:.0%})"
+            )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="fewer rows and requests, for a fast check")
+    parser.add_argument("--rows", type=int, help="input rows per case (default 2000, 200 with --quick)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="a previous --output file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed mean latency growth (default 0.10)")
+    args = parser.parse_args(argv)
+
+    rows = args.rows or (200 if args.quick else 2000)
+    samples = min(rows, 500)
+    requests = 10 if args.quick else 50
+
+    client = TestClient(app)
+    results = []
+    # Conditions that fail on missing fields log an error; keep that out of the output
+    logging.getLogger("treejack.conditions").disabled = True
+    for name, depth, fanout, shape in SHAPES:
+        for complexity in COMPLEXITIES:
+            results.extend(
+                run_case(client, name, depth, fanout, shape, complexity, rows, samples, requests, args.seed)
+            )
+
+    print(f"{'case':<24} {'target':<32} {'mean us':>10} {'p95 us':>10} {'per s':>10} {'peak KiB':>9}")
+    for r in results:
+        print(
+            f"{r['case']:<24} {r['target']:<32} {r['latency_us']['mean']:10.1f} {r['latency_us']['p95']:10.1f} "
+            f"{r['throughput_per_s']:10.0f} {r['peak_memory_bytes'] / 1024:9.0f}"
+        )
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "fastapi": fastapi.__version__,
+            "pydantic": pydantic.VERSION,
+            "rows": rows,
+            "samples": samples,
+            "requests": requests,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["results"], args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
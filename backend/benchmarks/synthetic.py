@@ -0,0 +1,108 @@
+"""
+Synthetic trees and inputs for benchmarks.
+
+Trees are generated from a seed, so the same parameters always give the same
+tree. Conditions read numeric fields f0..f{n-1} and a string field `kind`;
+generated inputs leave some fields out, so missing-field errors are exercised
+too.
+"""
+import random
+from typing import Any, Dict, List
+
+from models import Node
+
+
+KINDS = ["a", "b", "c", "d"]
+
+# Shapes: "full" gives every node `fanout` children down to `depth`;
+# "spine" does too, but only the first child of each node goes deeper,
+# which allows very deep trees with a bounded node count
+SHAPES = ("full", "spine")
+
+# Condition complexity levels
+COMPLEXITIES = ("simple", "compound", "arithmetic")
+
+
+def make_condition(rng: random.Random, complexity: str, fields: int) -> str:
+    def field() -> str:
+        return f"input.f{rng.randrange(fields)}"
+
+    def comparison() -> str:
+        if rng.random() < 0.2:
+            return f"input.kind == '{rng.choice(KINDS)}'"
+        return f"{field()} {rng.choice(['<', '<=', '>', '>='])} {rng.randrange(100)}"
+
+    if complexity == "simple":
+        return comparison()
+    if complexity == "compound":
+        parts = [comparison() for _ in range(rng.randint(2, 3))]
+        if rng.random() < 0.5:
+            return " and ".join(parts)
+        return f"({parts[0]} or {parts[1]}) and not {comparison()}"
+    if complexity == "arithmetic":
+        return f"{field()} * {rng.randint(1, 3)} + {field()} / {rng.randint(1, 4)} > {rng.randrange(200)}"
+    raise ValueError(f"unknown complexity {complexity!r}")
+
+
+def make_tree(
+    depth: int,
+    fanout: int,
+    complexity: str = "simple",
+    shape: str = "full",
+    fields: int = 8,
+    seed: int = 0,
+) -> Node:
+    """
+    Build a tree `depth` levels below the root. The last child of each node is
+    unconditional, so every traversal reaches a leaf.
+    """
+    if shape not in SHAPES:
+        raise ValueError(f"unknown shape {shape!r}")
+    rng = random.Random(seed)
+    counter = 0
+
+    def new_node(condition) -> Node:
+        nonlocal counter
+        counter += 1
+        return Node(node_id=f"n{counter}", text=f"Node {counter}", condition=condition)
+
+    root = new_node(None)
+    # Built top-down with an explicit stack, so deep spines are fine
+    stack = [(root, 0)]
+    while stack:
+        node, level = stack.pop()
+        if level >= depth:
+            continue
+        children = [new_node(make_condition(rng, complexity, fields)) for _ in range(fanout - 1)]
+        children.append(new_node(None))
+        node.children = children
+        expand = children if shape == "full" else children[:1]
+        stack.extend((child, level + 1) for child in expand)
+    return root
+
+
+def make_inputs(count: int, fields: int = 8, missing: float = 0.05, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Random input rows for trees from `make_tree`.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        row: Dict[str, Any] = {
+            f"f{i}": rng.choice([rng.randrange(100), rng.random() * 100])
+            for i in range(fields)
+            if rng.random() >= missing
+        }
+        row["kind"] = rng.choice(KINDS)
+        rows.append(row)
+    return rows
+
+
+def count_nodes(root: Node) -> int:
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
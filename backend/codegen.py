@@ -0,0 +1,301 @@
+"""
+Per-tree code generation: a whole compiled tree as one Python function.
+
+The generated function takes the input dict and returns the index of the
+node the traversal ends at. The path follows from that index, since every
+node has one path from the root. Each node's children become a sequence of
+`if` blocks, in order. A block that matches returns from inside it, so
+siblings need no `elif` nesting and the indentation only grows with depth.
+Input fields are read into local variables the first time a condition on
+the current branch needs them, not all up front.
+
+Results and reported errors are the same as `engine.traverse_tree`:
+
+- Every condition runs in its own try/except, so an exception makes it
+  False and is reported, as in CompiledCondition.
+- A field the input lacks raises the same AttributeError as `input.<field>`
+  at the point where the expression reads it, so short-circuiting works as
+  before.
+- Only conditions that the sandbox (`sandbox.py`) would run without any
+  of its checks are inlined: no calls, membership tests or operators whose
+  result can outgrow their operands. The others, and conditions that did
+  not compile, are called through their CompiledCondition.
+- Children that use the lookup tables of `dispatch.py` are left to
+  `CompiledTree.descend`, and so are nodes below MAX_INLINE_DEPTH or past
+  MAX_INLINE_NODES. This keeps very deep or very large trees within what
+  Python's compiler accepts.
+
+Generated code is cached by the tree's root digest (see
+`CompiledTree.subtree_hashes`), so a tree that is registered again after
+eviction does not pay for compilation twice. The code hard-codes node
+indices, so trees that patches left out of preorder layout are keyed by
+their structure arrays as well: the same content laid out differently
+needs different code.
+"""
+import ast
+import hashlib
+import os
+import time
+import weakref
+from array import array
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from models import Node
+from compiled import CompiledTree, WrappedTree
+from conditions import MISSING, input_namespace
+from fields import condition_reads
+from lru import LRUCache
+from sandbox import inlinable
+
+
+# Generated code is nested one level per tree level; Python's tokenizer
+# refuses more than 100 levels of indentation
+MAX_INLINE_DEPTH = 48
+
+# Larger trees inline this many nodes and walk the rest
+MAX_INLINE_NODES = 4096
+
+# How many generated trees to keep; 0 turns code generation off
+DEFAULT_CODEGEN_CACHE_SIZE = 0
+
+
+def _missing(name: str) -> Any:
+    raise AttributeError(f"input has no field '{name}'")
+
+
+def _inline_fields(source: str) -> Optional[FrozenSet[str]]:
+    """
+    The fields a condition reads, or None when it cannot be inlined: it
+    names anything but `input`, uses `input` other than as `input.<field>`,
+    or needs the sandbox's checks (see `sandbox.inlinable`).
+    """
+    reads = condition_reads(source)
+    if reads.tree is None or not reads.plain or reads.other_names or not inlinable(reads.tree):
+        return None
+    return reads.fields
+
+
+class _ReadFields(ast.NodeTransformer):
+    # input.<field> -> (local if local is not _MISSING else _missing('<field>'))
+
+    def __init__(self, names: Dict[str, str]):
+        self.names = names
+
+    def visit_Attribute(self, node: ast.Attribute) -> ast.AST:
+        if isinstance(node.value, ast.Name) and node.value.id == "input":
+            local = self.names[node.attr]
+            return ast.IfExp(
+                test=ast.Compare(
+                    left=ast.Name(local, ast.Load()),
+                    ops=[ast.IsNot()],
+                    comparators=[ast.Name("_MISSING", ast.Load())],
+                ),
+                body=ast.Name(local, ast.Load()),
+                orelse=ast.Call(ast.Name("_missing", ast.Load()), [ast.Constant(node.attr)], []),
+            )
+        return self.generic_visit(node)
+
+
+class _Generator:
+    """
+    Writes the source of one tree's function.
+    """
+
+    def __init__(self, compiled: CompiledTree):
+        self.compiled = compiled
+        self.lines: List[str] = []
+        self.locals: Dict[str, str] = {}
+        self.inlined = 0
+
+    def source(self) -> str:
+        self.lines.append("def _final(_inputs):")
+        self.lines.append(" _get = _inputs.get")
+        self.node(0, frozenset(), 1)
+        return "\n".join(self.lines) + "\n"
+
+    def local(self, field: str) -> str:
+        name = self.locals.get(field)
+        if name is None:
+            name = self.locals[field] = f"_f{len(self.locals)}"
+        return name
+
+    def node(self, index: int, bound: FrozenSet[str], level: int) -> None:
+        """
+        Statements run once node `index` is entered; all paths return.
+        """
+        compiled = self.compiled
+        pad = " " * level
+        self.inlined += 1
+        children = compiled.children_of(index)
+
+        delegate = (
+            compiled.depth[index] >= MAX_INLINE_DEPTH
+            or self.inlined >= MAX_INLINE_NODES
+            or any(compiled.dispatch[child] is not None for child in children)
+        )
+        if children and delegate:
+            self.lines.append(f"{pad}return _rest(_inputs, {index})")
+            return
+
+        for child in children:
+            condition = compiled.conditions[child]
+            if condition is None:
+                # Always entered; later siblings are never checked
+                self.node(child, bound, level)
+                return
+            if condition.code is None:
+                # Reported and False every time
+                self.lines.append(f"{pad}_c[{child}](None)")
+                continue
+
+            fields = _inline_fields(condition.source)
+            if fields is None:
+                self.lines.append(f"{pad}if _c[{child}](_namespace(_inputs)):")
+            else:
+                for field in sorted(fields - bound):
+                    self.lines.append(f"{pad}{self.local(field)} = _get({field!r}, _MISSING)")
+                bound = bound | fields
+                # A tree of our own, as the transformer changes it in place
+                tree = _ReadFields(self.locals).visit(ast.parse(condition.source, mode="eval"))
+                self.lines.append(f"{pad}try:")
+                self.lines.append(f"{pad} _m = True if ({ast.unparse(tree.body)}) else False")
+                self.lines.append(f"{pad}except Exception as e:")
+                self.lines.append(f"{pad} _m = _failed({child}, e)")
+                self.lines.append(f"{pad}if _m:")
+            self.node(child, bound, level + 1)
+
+        self.lines.append(f"{pad}return {index}")
+
+
+def generate_source(compiled: CompiledTree) -> str:
+    """
+    Source of the function for `compiled`, defining `_final(inputs)`.
+    """
+    return _Generator(compiled).source()
+
+
+class GeneratedTree(WrappedTree):
+    """
+    A compiled tree with its generated function.
+    """
+
+    __slots__ = ("final", "__weakref__")
+
+    def __init__(self, compiled: CompiledTree, code: Any):
+        super().__init__(compiled)
+        conditions = compiled.conditions
+
+        def failed(index: int, error: Exception) -> bool:
+            conditions[index].report_error(error)
+            return False
+
+        def rest(inputs: Dict[str, Any], index: int) -> int:
+            path = [index]
+            compiled.descend(input_namespace(inputs), index, path)
+            return path[-1]
+
+        namespace = {
+            "_MISSING": MISSING,
+            "_missing": _missing,
+            "_c": conditions,
+            "_failed": failed,
+            "_rest": rest,
+            "_namespace": input_namespace,
+        }
+        exec(code, namespace)
+        self.final = namespace["_final"]
+
+    def run(self, inputs: Dict[str, Any]) -> Tuple[int, List[str]]:
+        """
+        The index of the node the traversal ends at, and the path of node ids.
+        """
+        final = self.final(inputs)
+        node_ids = self.compiled.node_ids
+        return final, [node_ids[index] for index in self.compiled.path_to(final)]
+
+    def traverse_indices(self, namespace: Dict[str, Any]) -> List[int]:
+        return self.compiled.path_to(self.final(namespace["input"]._values))
+
+    def traverse(self, inputs: Dict[str, Any]) -> tuple[List[str], List[Node], Node]:
+        # The generated function takes the inputs as they are
+        nodes = self.compiled.nodes
+        visited_nodes = [nodes[i] for i in self.compiled.path_to(self.final(inputs))]
+        return [node.node_id for node in visited_nodes], visited_nodes, visited_nodes[-1]
+
+
+def code_key(compiled: CompiledTree) -> bytes:
+    """
+    The cache key for `compiled`'s generated code: its root digest, plus
+    its layout if patches moved it away from a fresh compile's.
+    """
+    digest = compiled.subtree_hashes()[0]
+    if not (compiled.removed or compiled.relocated):
+        return digest
+    h = hashlib.sha256(digest)
+    h.update(array("i", compiled.first_child).tobytes())
+    h.update(array("i", compiled.next_sibling).tobytes())
+    return h.digest()
+
+
+class CodegenCache(LRUCache):
+    """
+    Bounded LRU of generated code, keyed by `code_key`.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_CODEGEN_CACHE_SIZE):
+        super().__init__(maxsize)
+        self.compile_seconds = 0.0
+        # Each compiled tree's generated form, while the compiled tree lives
+        self._trees: "weakref.WeakKeyDictionary[CompiledTree, GeneratedTree]" = weakref.WeakKeyDictionary()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def traversal(self, compiled: CompiledTree):
+        """
+        What to traverse: the generated form of `compiled`, or `compiled`
+        itself when code generation is off. Both offer the same traversal
+        methods.
+        """
+        if not self.enabled:
+            return compiled
+        with self._lock:
+            generated = self._trees.get(compiled)
+        if generated is None:
+            generated = GeneratedTree(compiled, self.code_for(compiled))
+            with self._lock:
+                self._trees[compiled] = generated
+        return generated
+
+    def code_for(self, compiled: CompiledTree) -> Any:
+        key = code_key(compiled)
+        code = self.lookup(key)
+        if code is not None:
+            return code
+
+        # Generate outside the lock; a racing thread may do the same tree
+        # twice, which is harmless
+        started = time.perf_counter()
+        code = compile(generate_source(compiled), "<treejack codegen>", "exec")
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.compile_seconds += elapsed
+            self.store(key, code)
+        return code
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**super().info(), "compile_seconds": self.compile_seconds}
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            self._trees = weakref.WeakKeyDictionary()
+            self.compile_seconds = 0.0
+
+
+tree_functions = CodegenCache(
+    maxsize=int(os.environ.get("TREEJACK_CODEGEN_CACHE_SIZE", DEFAULT_CODEGEN_CACHE_SIZE)),
+)
@@ -0,0 +1,433 @@
+"""
+Columnar evaluation of a compiled tree over many input rows at once.
+
+Inputs are given as columns: a dict mapping field name to a NumPy array or a
+list of values, all of the same length. Use `MISSING` in a list where a row
+does not have the field at all (which is different from a None value).
+
+Instead of walking the tree once per row, row indices are partitioned down
+the tree: each condition is evaluated once per node, as a vectorized mask,
+over all the rows that reach that node. Conditions that cannot be expressed
+as array operations fall back to row-wise evaluation for just those rows.
+Results are identical to `engine.traverse_tree`.
+
+NumPy is optional; without it every row is traversed individually.
+"""
+import ast
+import operator
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from compiled import CompiledTree
+from conditions import CompiledCondition, MISSING, input_namespace
+from sandbox import check_budget
+
+# Beyond this, int64 arithmetic or float comparisons could disagree with Python ints
+_EXACT_INT_LIMIT = 2 ** 53
+
+_COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+_ARITHMETIC = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+
+
+class NotVectorizable(Exception):
+    """
+    Raised when a condition, or the columns it reads, cannot be evaluated as
+    array operations with exactly Python's semantics.
+    """
+
+
+# Column kinds
+_NUMERIC = "numeric"
+_STRING = "string"
+
+
+class Columns:
+    """
+    Lazily converts raw input columns to typed arrays plus a presence mask.
+    """
+
+    def __init__(self, columns: Dict[str, Any]):
+        self.raw = columns
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("all columns must have the same length")
+        self.row_count = lengths.pop() if lengths else 0
+        self._typed: Dict[str, Optional[Tuple[str, Any, Any]]] = {}
+
+    def typed(self, name: str) -> Tuple[str, Any, Any]:
+        """
+        Return (kind, values, present) for a column. A column that is absent
+        altogether is all-missing.
+        """
+        if name not in self._typed:
+            self._typed[name] = self._convert(name)
+        typed = self._typed[name]
+        if typed is None:
+            raise NotVectorizable(f"column '{name}' has mixed or unsupported types")
+        return typed
+
+    def _convert(self, name: str) -> Optional[Tuple[str, Any, Any]]:
+        n = self.row_count
+        if name not in self.raw:
+            return _NUMERIC, np.zeros(n, dtype=np.int64), np.zeros(n, dtype=bool)
+
+        values = self.raw[name]
+        if isinstance(values, np.ndarray):
+            present = np.ones(n, dtype=bool)
+            if values.dtype.kind == "b":
+                return _NUMERIC, values.astype(np.int64), present
+            if values.dtype.kind in "iu":
+                if n and np.abs(values.astype(np.float64)).max() > _EXACT_INT_LIMIT:
+                    return None
+                return _NUMERIC, values.astype(np.int64), present
+            if values.dtype.kind == "f":
+                return _NUMERIC, values.astype(np.float64), present
+            if values.dtype.kind == "U":
+                return _STRING, values, present
+            values = values.tolist()
+
+        kinds = set(map(type, values))
+        has_missing = type(MISSING) in kinds
+        kinds.discard(type(MISSING))
+        if not kinds <= {bool, int, float} and kinds != {str}:
+            return None
+
+        # Let NumPy do the per-element work in C
+        objects = np.empty(n, dtype=object)
+        objects[:] = values
+        present = objects != MISSING if has_missing else np.ones(n, dtype=bool)
+        if kinds == {str}:
+            objects[~present] = ""
+            return _STRING, objects.astype(str), present
+
+        objects[~present] = 0
+        dtype = np.int64 if kinds <= {bool, int} else np.float64
+        try:
+            typed = objects.astype(dtype)
+        except OverflowError:
+            return None
+        if n and np.abs(typed.astype(np.float64)).max() > _EXACT_INT_LIMIT:
+            return None
+        return _NUMERIC, typed, present
+
+    def row(self, index: int) -> Dict[str, Any]:
+        """
+        Rebuild one row as an input dict, for row-wise fallback.
+        """
+        row = {}
+        for name, values in self.raw.items():
+            value = values[index]
+            if value is MISSING:
+                continue
+            row[name] = value.item() if hasattr(value, "item") else value
+        return row
+
+
+# A compiled plan evaluates over the selected rows and returns (kind, values, error)
+# where `error` marks rows on which Python would have raised. Constants are
+# returned with kind "const" and a plain Python value.
+Plan = Callable[[Columns, Any], Tuple[str, Any, Any]]
+
+
+def _const_kind(value: Any) -> str:
+    if isinstance(value, (bool, int, float)):
+        return _NUMERIC
+    if isinstance(value, str):
+        return _STRING
+    raise NotVectorizable(f"unsupported constant {value!r}")
+
+
+def _compile_value(node: ast.AST) -> Plan:
+    if isinstance(node, ast.Constant):
+        value = node.value
+        kind = _const_kind(value)
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, int) and abs(value) > _EXACT_INT_LIMIT:
+            raise NotVectorizable("integer constant too large")
+        return lambda columns, rows: ("const", (kind, value), None)
+
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "input":
+        name = node.attr
+
+        def read(columns: Columns, rows):
+            kind, values, present = columns.typed(name)
+            return kind, values[rows], ~present[rows]
+        return read
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand = _compile_value(node.operand)
+        negate = isinstance(node.op, ast.USub)
+
+        def unary(columns: Columns, rows):
+            kind, values, error = operand(columns, rows)
+            if kind == "const":
+                const_kind, value = values
+                if const_kind != _NUMERIC:
+                    raise NotVectorizable("unary operator on a string")
+                return kind, (const_kind, -value if negate else value), error
+            if kind != _NUMERIC:
+                raise NotVectorizable("unary operator on a string column")
+            return kind, -values if negate else values, error
+        return unary
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+        left = _compile_value(node.left)
+        right = _compile_value(node.right)
+        op = _ARITHMETIC[type(node.op)]
+        is_division = isinstance(node.op, ast.Div)
+
+        def binop(columns: Columns, rows):
+            left_kind, left_values, left_error = left(columns, rows)
+            right_kind, right_values, right_error = right(columns, rows)
+            left_values = _as_numeric(left_kind, left_values)
+            right_values = _as_numeric(right_kind, right_values)
+            error = _either(left_error, right_error)
+
+            if is_division:
+                # Python raises ZeroDivisionError where NumPy returns inf/nan
+                zero = np.asarray(right_values == 0)
+                if zero.any():
+                    error = _either(error, np.broadcast_to(zero, rows.shape))
+                    right_values = np.where(right_values == 0, 1, right_values)
+                values = np.true_divide(left_values, right_values)
+            else:
+                left_values = np.asarray(left_values)
+                right_values = np.asarray(right_values)
+                if left_values.dtype.kind == "i" and right_values.dtype.kind == "i":
+                    # Check the magnitude in floating point before int64 can wrap
+                    estimate = op(left_values.astype(np.float64), right_values.astype(np.float64))
+                    if estimate.size and np.abs(estimate).max() > _EXACT_INT_LIMIT:
+                        raise NotVectorizable("integer arithmetic may overflow")
+                values = op(left_values, right_values)
+            return _NUMERIC, np.broadcast_to(values, rows.shape), error
+        return binop
+
+    raise NotVectorizable(f"unsupported expression {type(node).__name__}")
+
+
+def _as_numeric(kind: str, values: Any) -> Any:
+    if kind == "const":
+        const_kind, value = values
+        if const_kind != _NUMERIC:
+            raise NotVectorizable("arithmetic on a string")
+        return value
+    if kind != _NUMERIC:
+        raise NotVectorizable("arithmetic on a string column")
+    return values
+
+
+def _either(a: Any, b: Any) -> Any:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a | b
+
+
+def _compare_pair(op: Any, left: Tuple[str, Any, Any], right: Tuple[str, Any, Any], shape) -> Tuple[Any, Any]:
+    left_kind, left_values, left_error = left
+    right_kind, right_values, right_error = right
+    if left_kind == "const":
+        left_kind, left_values = left_values
+    if right_kind == "const":
+        right_kind, right_values = right_values
+    error = _either(left_error, right_error)
+
+    if left_kind != right_kind:
+        # Numbers never equal strings, and ordering them raises TypeError
+        if op is operator.eq:
+            return np.zeros(shape, dtype=bool), error
+        if op is operator.ne:
+            return np.ones(shape, dtype=bool), error
+        return np.zeros(shape, dtype=bool), np.ones(shape, dtype=bool)
+
+    return np.broadcast_to(np.asarray(op(left_values, right_values), dtype=bool), shape), error
+
+
+def _compile_bool(node: ast.AST) -> Callable[[Columns, Any], Tuple[Any, Any]]:
+    """
+    Compile a boolean-valued expression into a function returning
+    (truth mask, error mask) over the selected rows.
+    """
+    if isinstance(node, ast.Compare):
+        if any(type(op) not in _COMPARISONS for op in node.ops):
+            raise NotVectorizable("unsupported comparison operator")
+        operands = [_compile_value(node.left)] + [_compile_value(c) for c in node.comparators]
+        ops = [_COMPARISONS[type(op)] for op in node.ops]
+
+        def compare(columns: Columns, rows):
+            shape = rows.shape
+            result = np.ones(shape, dtype=bool)
+            error = np.zeros(shape, dtype=bool)
+            left = operands[0](columns, rows)
+            for op, operand in zip(ops, operands[1:]):
+                right = operand(columns, rows)
+                values, pair_error = _compare_pair(op, left, right, shape)
+                # Later links in a chain only run where every earlier link held
+                reached = result & ~error
+                if pair_error is not None:
+                    error = error | (reached & pair_error)
+                result = result & values
+                left = right
+            return result & ~error, error
+        return compare
+
+    if isinstance(node, ast.BoolOp):
+        operands = [_compile_bool(value) for value in node.values]
+        is_and = isinstance(node.op, ast.And)
+
+        def boolop(columns: Columns, rows):
+            shape = rows.shape
+            # Rows still evaluating operands; the rest have short-circuited
+            pending = np.ones(shape, dtype=bool)
+            result = np.zeros(shape, dtype=bool) if not is_and else np.ones(shape, dtype=bool)
+            error = np.zeros(shape, dtype=bool)
+            for operand in operands:
+                values, operand_error = operand(columns, rows)
+                error = error | (pending & operand_error)
+                if is_and:
+                    result = result & (values | ~pending)
+                    pending = pending & values & ~operand_error
+                else:
+                    result = result | (pending & values)
+                    pending = pending & ~values & ~operand_error
+            return result & ~error, error
+        return boolop
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        operand = _compile_bool(node.operand)
+
+        def negate(columns: Columns, rows):
+            values, error = operand(columns, rows)
+            return ~values & ~error, error
+        return negate
+
+    raise NotVectorizable(f"unsupported condition {type(node).__name__}")
+
+
+# Condition text -> vectorized plan, or None when it must run row-wise
+_plans: Dict[str, Optional[Callable]] = {}
+_plans_lock = threading.Lock()
+
+
+def _plan_for(condition: CompiledCondition) -> Optional[Callable]:
+    source = condition.source
+    with _plans_lock:
+        if source in _plans:
+            return _plans[source]
+
+    plan = None
+    if condition.code is not None:
+        try:
+            plan = _compile_bool(ast.parse(source, mode="eval").body)
+        except NotVectorizable:
+            plan = None
+
+    with _plans_lock:
+        _plans[source] = plan
+    return plan
+
+
+def _condition_mask(condition: CompiledCondition, columns: Columns, rows) -> Any:
+    plan = _plan_for(condition)
+    if plan is not None:
+        try:
+            values, error = plan(columns, rows)
+            return values & ~error
+        except NotVectorizable:
+            pass
+
+    # Row-wise fallback, only for the rows that reached this node
+    return np.fromiter(
+        (condition(input_namespace(columns.row(i))) for i in rows.tolist()),
+        dtype=bool,
+        count=len(rows),
+    )
+
+
+def evaluate_columns(compiled: CompiledTree, columns: Dict[str, Sequence]) -> List[int]:
+    """
+    Return the final node index for every row, in row order.
+    """
+    if np is None:
+        return _evaluate_rows(compiled, columns)
+
+    table = Columns(columns)
+    first_child = compiled.first_child
+    next_sibling = compiled.next_sibling
+    conditions = compiled.conditions
+
+    final = np.zeros(table.row_count, dtype=np.int64)
+    stack = [(0, np.arange(table.row_count))]
+    while stack:
+        check_budget()
+        node, rows = stack.pop()
+        remaining = rows
+        child = first_child[node]
+        # Same first-match rule as traverse_tree, applied to a set of rows
+        while child >= 0 and remaining.size:
+            condition = conditions[child]
+            if condition is None:
+                stack.append((child, remaining))
+                remaining = remaining[:0]
+                break
+            mask = _condition_mask(condition, table, remaining)
+            if mask.any():
+                stack.append((child, remaining[mask]))
+                remaining = remaining[~mask]
+            child = next_sibling[child]
+        # Leaves, and rows no child accepted, stop here
+        final[remaining] = node
+
+    return final.tolist()
+
+
+def _evaluate_rows(compiled: CompiledTree, columns: Dict[str, Sequence]) -> List[int]:
+    names = list(columns)
+    row_count = len(columns[names[0]]) if names else 0
+    final = []
+    for i in range(row_count):
+        row = {name: columns[name][i] for name in names if columns[name][i] is not MISSING}
+        final.append(compiled.traverse_indices(input_namespace(row))[-1])
+    return final
+
+
+def score_columns(compiled: CompiledTree, columns: Dict[str, Sequence]) -> List[str]:
+    """
+    Return the final node_id for every row, in row order.
+    """
+    node_ids = compiled.node_ids
+    return [node_ids[i] for i in evaluate_columns(compiled, columns)]
+
+
+def rows_to_columns(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """
+    Turn a list of input dicts into columns, using MISSING for absent fields.
+    """
+    names = []
+    seen = set()
+    for row in rows:
+        for name in row:
+            if name not in seen:
+                seen.add(name)
+                names.append(name)
+    return {name: [row.get(name, MISSING) for row in rows] for name in names}
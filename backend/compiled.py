@@ -0,0 +1,510 @@
+import hashlib
+from array import array
+from typing import Any, Collection, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from models import Node
+from conditions import CompiledCondition, compile_condition, input_namespace
+from dispatch import MIN_RUN_LENGTH, build_runs
+from layers import ChunkedList, DictOverlay
+
+
+# The arrays and lists a patch may change, with their array typecodes
+_LAYERED = {
+    "nodes": None,
+    "node_ids": None,
+    "conditions": None,
+    "dispatch": None,
+    "first_child": "i",
+    "next_sibling": "i",
+    "parent": "i",
+    "depth": "i",
+    "_digests": None,
+}
+
+
+class CompiledTree:
+    """
+    Flattened, array-backed form of a decision tree for the traversal hot path.
+
+    Nodes are stored in preorder; index 0 is the root. Structure lives in two
+    int arrays: `first_child[i]` and `next_sibling[i]`, with -1 meaning none.
+    `conditions[i]` is the compiled condition guarding entry into node i, or
+    None when the node is entered unconditionally.
+
+    `dispatch[i]` is set when child i starts a run of siblings that can be
+    matched with a single lookup (see `dispatch.py`).
+
+    `parent[i]` is the index of node i's parent (-1 for the root) and
+    `depth[i]` its distance from the root. Node ids are indexed on
+    construction; ids need not be unique, and `duplicate_ids` lists the ones
+    that are not.
+
+    Trees edited through `patches.py` keep every node at its index: removed
+    nodes stay behind, listed in `removed`, and added nodes go at the end.
+    `relocated` holds the nodes whose subtrees are therefore no longer laid
+    out contiguously in preorder; use `preorder()` rather than index order
+    to visit the nodes of such a tree. A patched tree shares most of its
+    arrays and lists with the tree it was patched from, through the layers
+    of `layers.py`; each flat array or list is built on first use.
+
+    Trees loaded from a snapshot (see `snapshot.py`) hold read-only
+    memoryviews of the mapped file in place of the four int arrays; `copy()`
+    gives a tree with arrays of its own.
+    """
+
+    def __init__(
+        self,
+        nodes: List[Node],
+        first_child: array,
+        next_sibling: array,
+        conditions: List[Optional[CompiledCondition]],
+        parent: Optional[array] = None,
+        depth: Optional[array] = None,
+        id_index: Optional[Tuple[Dict[str, int], Dict[str, List[int]]]] = None,
+        digests: Optional[List[bytes]] = None,
+    ):
+        self.nodes = nodes
+        self.node_ids = [node.node_id for node in nodes]
+        self.first_child = first_child
+        self.next_sibling = next_sibling
+        self.conditions = conditions
+        self.dispatch: List[Optional[Any]] = [None] * len(nodes)
+        self.parent = parent if parent is not None else self._parents()
+        self.depth = depth if depth is not None else self._depths()
+        self._id_index = id_index if id_index is not None else self._build_id_index()
+        self._qualified_ids: Optional[List[str]] = None
+        self._digests: Optional[List[bytes]] = digests
+        self.removed: Set[int] = set()
+        self.relocated: Set[int] = set()
+        self._layers: Optional[Dict[str, Any]] = None
+        # The id index lists ids in preorder until a patch changes it
+        self._ids_in_preorder = True
+
+        for index in range(len(nodes)):
+            self.build_dispatch(index)
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for attributes that are not set: a patched tree's flat
+        # arrays and lists, until first used
+        layers = self.__dict__.get("_layers")
+        if layers is None or name not in layers:
+            raise AttributeError(f"'CompiledTree' object has no attribute '{name}'")
+        if name == "_id_index":
+            first, duplicates = layers[name]
+            value = (first.flatten(), duplicates)
+        else:
+            value = layers[name].flatten()
+        return self.__dict__.setdefault(name, value)
+
+    def _peek(self, name: str) -> Any:
+        # The flat form if built, else the layer, for the few reads that
+        # should not have to build it
+        value = self.__dict__.get(name)
+        if value is None and self._layers is not None:
+            return self._layers[name]
+        return value
+
+    def __len__(self) -> int:
+        # Counts removed nodes too: this is the range of valid indices
+        return len(self._peek("nodes"))
+
+    @property
+    def node_count(self) -> int:
+        return len(self) - len(self.removed)
+
+    def copy(self) -> "CompiledTree":
+        """
+        A copy whose arrays and lists can be changed without affecting this
+        tree. Nodes, conditions and lookup runs are shared, not copied.
+        """
+        clone = object.__new__(CompiledTree)
+        clone.__dict__.update(self.__dict__)
+        for name in ("nodes", "node_ids", "conditions", "dispatch"):
+            setattr(clone, name, list(getattr(self, name)))
+        for name in ("first_child", "next_sibling", "parent", "depth"):
+            setattr(clone, name, array("i", getattr(self, name)))
+        first, duplicates = self._id_index
+        clone._id_index = (dict(first), {node_id: list(positions) for node_id, positions in duplicates.items()})
+        clone._qualified_ids = None
+        clone._digests = list(self.subtree_hashes())
+        clone.removed = set(self.removed)
+        clone.relocated = set(self.relocated)
+        clone._layers = None
+        return clone
+
+    def layered_copy(self) -> "CompiledTree":
+        """
+        A copy for `patches.TreeEditor` to change, whose arrays, lists and id
+        index are copy-on-write layers over this tree's. It costs about one
+        pointer per CHUNK_SIZE nodes, and each change copies one chunk at
+        most. Call `freeze()` once done changing it.
+        """
+        layers = self._layers
+        clone = object.__new__(CompiledTree)
+        for name, typecode in _LAYERED.items():
+            if layers is not None:
+                layer = layers[name].copy()
+            else:
+                layer = ChunkedList(self.subtree_hashes() if name == "_digests" else getattr(self, name), typecode)
+            setattr(clone, name, layer)
+        if layers is not None:
+            first, duplicates = layers["_id_index"]
+            first = first.copy()
+        else:
+            first, duplicates = self._id_index
+            first = DictOverlay(first)
+        clone._id_index = (first, {node_id: list(positions) for node_id, positions in duplicates.items()})
+        clone._qualified_ids = None
+        clone.removed = set(self.removed)
+        clone.relocated = set(self.relocated)
+        clone._layers = None
+        clone._ids_in_preorder = False
+        return clone
+
+    def freeze(self) -> None:
+        """
+        Finish changing a tree from `layered_copy()`. Its flat arrays and
+        lists are built from the layers on first use, and later copies are
+        layered over these same layers.
+        """
+        self._layers = {name: self.__dict__.pop(name) for name in (*_LAYERED, "_id_index")}
+
+    def preorder(self) -> Sequence[int]:
+        """
+        Indices of the tree's nodes in preorder, leaving out removed nodes.
+        """
+        if not self.relocated:
+            return range(len(self.nodes))
+        order = []
+        stack = [0]
+        while stack:
+            index = stack.pop()
+            order.append(index)
+            # Reversed, so that the first child is popped first
+            stack.extend(reversed(self.children_of(index)))
+        return order
+
+    @property
+    def root(self) -> Node:
+        return self._peek("nodes")[0]
+
+    def _parents(self) -> array:
+        parent = array("i", [-1]) * len(self.nodes)
+        for index in range(len(self.nodes)):
+            child = self.first_child[index]
+            while child >= 0:
+                parent[child] = index
+                child = self.next_sibling[child]
+        return parent
+
+    def _depths(self) -> array:
+        # Parents come before their children in preorder
+        depth = array("i", [0]) * len(self.nodes)
+        parent = self.parent
+        for index in range(1, len(self.nodes)):
+            depth[index] = depth[parent[index]] + 1
+        return depth
+
+    def indices_of(self, node_id: str) -> List[int]:
+        """
+        Indices of every node with this id, in index order (ids need not be
+        unique).
+        """
+        first, duplicates = self._peek("_id_index")
+        if node_id in duplicates:
+            return list(duplicates[node_id])
+        position = first.get(node_id)
+        return [] if position is None else [position]
+
+    @property
+    def duplicate_ids(self) -> Dict[str, List[int]]:
+        """
+        The ids used by more than one node, with the indices of those nodes.
+        """
+        return self._peek("_id_index")[1]
+
+    @property
+    def qualified_ids(self) -> List[str]:
+        """
+        Node ids made unique, indexed like `nodes`. Every node with a repeated
+        id gets "<parent id>/<id>" instead (the root keeps its id), and a
+        "#2", "#3", ... suffix if that is still taken.
+        """
+        if self._qualified_ids is None:
+            first, duplicates = self._id_index
+            ids = list(self.node_ids)
+            taken = {node_id for node_id in first if node_id not in duplicates}
+            for node_id, positions in duplicates.items():
+                for position in positions:
+                    parent = self.parent[position]
+                    base = f"{self.node_ids[parent]}/{node_id}" if parent >= 0 else node_id
+                    qualified = base
+                    suffix = 2
+                    while qualified in taken:
+                        qualified = f"{base}#{suffix}"
+                        suffix += 1
+                    taken.add(qualified)
+                    ids[position] = qualified
+            self._qualified_ids = ids
+        return self._qualified_ids
+
+    def display_ids(self, qualify_duplicates: bool = False) -> List[str]:
+        return self.qualified_ids if qualify_duplicates and self.duplicate_ids else self.node_ids
+
+    def unvisited_ids(self, visited: Collection[int], qualify_duplicates: bool = False) -> List[str]:
+        """
+        Ids of the nodes whose indices are not in `visited`, in preorder. Without
+        `qualify_duplicates`, an id counts as visited when any node with it was.
+        """
+        if qualify_duplicates:
+            ids = self.qualified_ids
+            return [ids[index] for index in self.preorder() if index not in visited]
+        node_ids = self.node_ids
+        reached = {node_ids[index] for index in visited}
+        if self._ids_in_preorder:
+            return [node_id for node_id in self._id_index[0] if node_id not in reached]
+        return [node_id for node_id in dict.fromkeys(node_ids[index] for index in self.preorder()) if node_id not in reached]
+
+    def _build_id_index(self) -> Tuple[Dict[str, int], Dict[str, List[int]]]:
+        # One int per id, plus lists only for the (rare) repeated ids
+        first: Dict[str, int] = {}
+        for position, node_id in enumerate(self.node_ids):
+            first.setdefault(node_id, position)
+        duplicates: Dict[str, List[int]] = {}
+        if len(first) < len(self.node_ids):
+            for position, node_id in enumerate(self.node_ids):
+                if first[node_id] != position:
+                    duplicates.setdefault(node_id, [first[node_id]]).append(position)
+        return first, duplicates
+
+    def path_to(self, index: int) -> List[int]:
+        """
+        Indices from the root down to node `index`.
+        """
+        path = []
+        while index >= 0:
+            path.append(index)
+            index = self.parent[index]
+        path.reverse()
+        return path
+
+    def iter_children(self, index: int) -> Iterator[int]:
+        child = self.first_child[index]
+        while child >= 0:
+            yield child
+            child = self.next_sibling[child]
+
+    def children_of(self, index: int) -> List[int]:
+        children = []
+        child = self.first_child[index]
+        while child >= 0:
+            children.append(child)
+            child = self.next_sibling[child]
+        return children
+
+    def build_dispatch(self, index: int) -> None:
+        """
+        (Re)build the lookup runs among the children of node `index`.
+        """
+        first = self.first_child[index]
+        if first < 0:
+            return
+
+        # Cheap count first; most nodes have too few children to bother
+        count = 0
+        child = first
+        while child >= 0 and count < MIN_RUN_LENGTH:
+            count += 1
+            child = self.next_sibling[child]
+        if count < MIN_RUN_LENGTH:
+            return
+
+        children = self.children_of(index)
+        for child in children:
+            self.dispatch[child] = None
+        for start, run in build_runs(children, self.conditions):
+            self.dispatch[start] = run
+
+    def subtree_hashes(self) -> List[bytes]:
+        """
+        Content digest of every subtree, indexed like `nodes`. A node's digest
+        covers its own fields and its children's digests in order, so equal
+        subtrees hash equally wherever they appear. Computed on first use; do
+        not modify the returned list.
+        """
+        if self._digests is None:
+            digests: List[bytes] = [b""] * len(self.nodes)
+            # Walking preorder backwards sees all children before the node itself
+            for index in reversed(self.preorder()):
+                digests[index] = self.node_digest(index, digests)
+            self._digests = digests
+        return self._digests
+
+    def root_digest(self) -> bytes:
+        """
+        The whole tree's digest, `subtree_hashes()[0]`, without building a
+        patched tree's list of digests.
+        """
+        digests = self._peek("_digests")
+        return digests[0] if digests is not None else self.subtree_hashes()[0]
+
+    def node_digest(self, index: int, digests: List[bytes]) -> bytes:
+        """
+        The digest of node `index`'s subtree, given its children's in `digests`.
+        """
+        node = self.nodes[index]
+        h = hashlib.sha256()
+        for field in (node.node_id, node.text, node.condition):
+            if field is None:
+                h.update(b"\x00")
+            else:
+                data = field.encode("utf-8")
+                h.update(b"\x01%d:" % len(data))
+                h.update(data)
+        child = self.first_child[index]
+        while child >= 0:
+            h.update(digests[child])
+            child = self.next_sibling[child]
+        return h.digest()
+
+    def traverse_indices(self, namespace: Dict[str, Any]) -> List[int]:
+        """
+        Walk the tree iteratively for one input namespace (see
+        `conditions.input_namespace`) and return the visited node indices.
+        """
+        path = [0]
+        self.descend(namespace, 0, path)
+        return path
+
+    def descend(
+        self,
+        namespace: Dict[str, Any],
+        current: int,
+        path: List[int],
+        stops: Optional[List[Any]] = None,
+    ) -> int:
+        """
+        Continue a traversal from node `current`, appending visited indices to
+        `path`. Returns -1 once no child matches, or, when `stops` is given,
+        the first entered node whose `stops` entry is set, so the caller can
+        decide how to go on from there.
+        """
+        first_child = self.first_child
+        next_sibling = self.next_sibling
+        conditions = self.conditions
+        dispatch = self.dispatch
+
+        while True:
+            child = first_child[current]
+            # Take the first child whose condition holds
+            while child >= 0:
+                run = dispatch[child]
+                if run is not None:
+                    matched = run.match(namespace)
+                    if matched is not None:
+                        # The lookup decided the whole run at once
+                        if matched >= 0:
+                            child = matched
+                            break
+                        child = run.after
+                        continue
+                condition = conditions[child]
+                if condition is None or condition(namespace):
+                    break
+                child = next_sibling[child]
+            if child < 0:
+                return -1
+            path.append(child)
+            if stops is not None and stops[child] is not None:
+                return child
+            current = child
+
+    def traverse(self, inputs: Dict[str, Any]) -> tuple[List[str], List[Node], Node]:
+        """
+        Same contract as `engine.traverse_tree`: node_id path, node objects
+        and the final node.
+        """
+        indices = self.traverse_indices(input_namespace(inputs))
+        nodes = self.nodes
+        visited_nodes = [nodes[i] for i in indices]
+        return [node.node_id for node in visited_nodes], visited_nodes, visited_nodes[-1]
+
+
+class WrappedTree:
+    """
+    Base for the classes that traverse a compiled tree their own way, such
+    as `memo.MemoizedTree`. Offers the traversal methods of CompiledTree;
+    subclasses implement `traverse_indices`.
+    """
+
+    __slots__ = ("compiled",)
+
+    def __init__(self, compiled: CompiledTree):
+        self.compiled = compiled
+
+    @property
+    def nodes(self) -> List[Node]:
+        return self.compiled.nodes
+
+    @property
+    def node_ids(self) -> List[str]:
+        return self.compiled.node_ids
+
+    def __len__(self) -> int:
+        return len(self.compiled)
+
+    def traverse_indices(self, namespace: Dict[str, Any]) -> List[int]:
+        raise NotImplementedError
+
+    def traverse(self, inputs: Dict[str, Any]) -> tuple[List[str], List[Node], Node]:
+        indices = self.traverse_indices(input_namespace(inputs))
+        nodes = self.compiled.nodes
+        visited_nodes = [nodes[i] for i in indices]
+        return [node.node_id for node in visited_nodes], visited_nodes, visited_nodes[-1]
+
+
+def compile_tree(root: Node) -> CompiledTree:
+    """
+    Flatten a tree into a CompiledTree. Uses an explicit stack, so arbitrarily
+    deep trees do not hit the recursion limit. Parents, depths and the node id
+    index are filled in during the same pass.
+    """
+    nodes: List[Node] = []
+    first_child = array("i")
+    next_sibling = array("i")
+    conditions: List[Optional[CompiledCondition]] = []
+    last_child = array("i")
+    parents = array("i")
+    depths = array("i")
+    first_index: Dict[str, int] = {}
+    duplicates: Dict[str, List[int]] = {}
+
+    # (node, parent index); children are pushed in reverse so they pop in order
+    stack = [(root, -1)]
+    while stack:
+        node, parent = stack.pop()
+        index = len(nodes)
+        nodes.append(node)
+        first_child.append(-1)
+        next_sibling.append(-1)
+        last_child.append(-1)
+        parents.append(parent)
+        depths.append(depths[parent] + 1 if parent >= 0 else 0)
+        conditions.append(compile_condition(node.condition) if node.condition else None)
+
+        if parent >= 0:
+            previous = last_child[parent]
+            if previous < 0:
+                first_child[parent] = index
+            else:
+                next_sibling[previous] = index
+            last_child[parent] = index
+
+        first = first_index.setdefault(node.node_id, index)
+        if first != index:
+            duplicates.setdefault(node.node_id, [first]).append(index)
+
+        for child in reversed(node.children):
+            stack.append((child, index))
+
+    return CompiledTree(nodes, first_child, next_sibling, conditions, parents, depths, (first_index, duplicates))
@@ -0,0 +1,212 @@
+import ast
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple, Union
+
+from lru import LRUCache
+from sandbox import BudgetExceeded, ConditionValidationError, compile_expression
+
+
+# Conditions are compiled once and reused; this bounds how many distinct
+# condition strings are kept around at any time.
+DEFAULT_CACHE_SIZE = 4096
+
+# Evaluation errors are logged here, with the condition, error type and
+# message as record attributes
+logger = logging.getLogger("treejack.conditions")
+
+
+def _validate(tree: ast.Expression) -> None:
+    """
+    Reject dunder names and attributes, the usual way out of a restricted
+    environment (e.g. "input.__class__.__bases__"), even as field names.
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and node.attr.startswith("__"):
+            raise ConditionValidationError(f"access to '{node.attr}' is not allowed")
+        if isinstance(node, ast.Name) and node.id.startswith("__"):
+            raise ConditionValidationError(f"name '{node.id}' is not allowed")
+
+
+class _Missing:
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "MISSING"
+
+
+# Placeholder for "the input has no such field"
+MISSING = _Missing()
+
+
+class InputView:
+    """
+    Read-only attribute access to an input dict, so "input.age" reads
+    inputs["age"]. Missing keys raise AttributeError like a missing attribute.
+    """
+
+    __slots__ = ("_values",)
+
+    def __init__(self, values: Dict[str, Any]):
+        object.__setattr__(self, "_values", values)
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(f"input has no field '{name}'") from None
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("input is read-only")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("input is read-only")
+
+    def __repr__(self) -> str:
+        return f"InputView({self._values!r})"
+
+
+def input_namespace(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the evaluation namespace for one input. Build it once per traversal
+    and pass it to every condition evaluated on that input.
+    """
+    return {"input": InputView(inputs)}
+
+
+def input_value(namespace: Dict[str, Any], name: str) -> Any:
+    """
+    Read a field straight from a namespace built by `input_namespace`,
+    returning MISSING if the input does not have it.
+    """
+    return namespace["input"]._values.get(name, MISSING)
+
+
+class ErrorCounts:
+    """
+    How many evaluation errors of each type were reported.
+    """
+
+    def __init__(self):
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, error_type: str) -> None:
+        with self._lock:
+            self._counts[error_type] += 1
+
+    def info(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+condition_errors = ErrorCounts()
+
+
+class CompiledCondition:
+    """
+    A condition string parsed and compiled once, by `sandbox.compile_expression`,
+    into `code`: a function of the input dict.
+
+    If the condition could not be compiled, `error` holds the reason and the
+    condition always evaluates to False. Errors raised while evaluating make
+    it False too; both are reported through `report_error`.
+    """
+
+    __slots__ = ("source", "code", "error")
+
+    def __init__(self, source: str):
+        self.source = source
+        self.code = None
+        self.error: Optional[str] = None
+
+        try:
+            tree = ast.parse(source, mode="eval")
+            _validate(tree)
+            self.code = compile_expression(tree)
+        except (SyntaxError, ValueError, RecursionError) as e:
+            self.error = str(e)
+
+    def __call__(self, namespace: Dict[str, Any]) -> bool:
+        """
+        Evaluate against a namespace built by `input_namespace`.
+        """
+        if self.code is None:
+            self.report_error(self.error)
+            return False
+
+        try:
+            return True if self.code(namespace["input"]._values) else False
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            # Missing field, type mismatch, a sandbox limit, etc.
+            self.report_error(e)
+            return False
+
+    def outcome(self, namespace: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+        """
+        Like calling the condition, but also returns the error message (or
+        None) instead of only reporting it.
+        """
+        if self.code is None:
+            error = self.error
+            self.report_error(error)
+            return False, error
+        try:
+            return (True if self.code(namespace["input"]._values) else False), None
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            self.report_error(e)
+            return False, str(e)
+
+    def report_error(self, error: Union[str, Exception]) -> None:
+        """
+        Log an evaluation error, or the reason the condition is invalid.
+        """
+        if isinstance(error, str):
+            error_type, message = "InvalidCondition", error
+        else:
+            error_type, message = type(error).__name__, str(error)
+        condition_errors.add(error_type)
+        logger.warning(
+            "Error evaluating condition '%s': %s", self.source, message,
+            extra={"condition": self.source, "error_type": error_type, "error": message},
+        )
+
+    def evaluate(self, inputs: Dict[str, Any]) -> bool:
+        return self(input_namespace(inputs))
+
+
+class ConditionCache(LRUCache):
+    """
+    Bounded LRU cache of compiled conditions keyed by condition text.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        super().__init__(maxsize)
+
+    def get(self, source: str) -> CompiledCondition:
+        compiled = self.lookup(source)
+        if compiled is None:
+            # Compile outside the lock; a racing thread may compile the same
+            # text twice, which is harmless.
+            compiled = CompiledCondition(source)
+            self.store(source, compiled)
+        return compiled
+
+
+condition_cache = ConditionCache()
+
+
+def compile_condition(condition: str) -> CompiledCondition:
+    """
+    Return the compiled form of a condition, compiling it on first use.
+    """
+    return condition_cache.get(condition)
@@ -0,0 +1,79 @@
+import threading
+import uuid
+from typing import Any, Dict, List, Optional
+
+from compiled import CompiledTree
+from conditions import input_namespace
+from lru import LRUCache
+from sandbox import check_budget
+
+
+# How many coverage sessions to keep per worker
+DEFAULT_SESSION_LIMIT = 128
+
+
+class CoverageSession:
+    """
+    Per-node hit counts for a tree, accumulated over batches of samples.
+
+    Each sample is traversed once, when it is added; later batches only
+    evaluate the new samples. With `qualify_duplicates`, nodes that share an
+    id are reported under their qualified ids, so each gets its own entry.
+    """
+
+    def __init__(self, compiled: CompiledTree, session_id: Optional[str] = None, qualify_duplicates: bool = False):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.compiled = compiled
+        self.qualify_duplicates = qualify_duplicates
+        self.samples = 0
+        self.hits = [0] * len(compiled)
+        self._lock = threading.Lock()
+
+    def add_samples(self, sample_inputs: List[Dict[str, Any]]) -> None:
+        traverse_indices = self.compiled.traverse_indices
+        hits = [0] * len(self.hits)
+        for inputs in sample_inputs:
+            check_budget()
+            for index in traverse_indices(input_namespace(inputs)):
+                hits[index] += 1
+
+        with self._lock:
+            self.samples += len(sample_inputs)
+            self.hits = [total + new for total, new in zip(self.hits, hits)]
+
+    def unreachable_nodes(self) -> List[str]:
+        """
+        Nodes no sample has reached yet, like `engine.detect_unreachable_nodes`.
+        """
+        visited = {i for i, count in enumerate(self.hits) if count}
+        return self.compiled.unvisited_ids(visited, self.qualify_duplicates)
+
+    def report(self) -> Dict[str, Any]:
+        node_ids = self.compiled.display_ids(self.qualify_duplicates)
+        hits = self.hits
+        return {
+            "session_id": self.session_id,
+            "samples": self.samples,
+            "node_hits": [{"node_id": node_ids[i], "hits": hits[i]} for i in self.compiled.preorder()],
+            "unreachable_nodes": self.unreachable_nodes(),
+        }
+
+
+class CoverageSessions(LRUCache):
+    """
+    Bounded LRU of open coverage sessions.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_SESSION_LIMIT):
+        super().__init__(maxsize)
+
+    def create(self, compiled: CompiledTree, qualify_duplicates: bool = False) -> CoverageSession:
+        session = CoverageSession(compiled, qualify_duplicates=qualify_duplicates)
+        self.store(session.session_id, session)
+        return session
+
+    def get(self, session_id: str) -> Optional[CoverageSession]:
+        return self.lookup(session_id)
+
+
+coverage_sessions = CoverageSessions()
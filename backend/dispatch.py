@@ -0,0 +1,177 @@
+"""
+Lookup tables for runs of sibling conditions that test the same field.
+
+Wide nodes often branch on `input.x == 'A'`, `input.x == 'B'`, ... or on
+ascending thresholds `input.x < 10`, `input.x < 20`, ... Checking those one by
+one costs O(k). A run of such siblings is replaced by a hash lookup (equality)
+or a bisect over the sorted thresholds (ranges), giving the same first match.
+Values the table cannot handle exactly (unhashable, non-numeric, NaN) make
+the traversal fall back to checking the run's conditions one by one. So do
+inputs without the field: every condition in the run then raises, and the
+scan reports each error, as it would without the table.
+"""
+import ast
+import math
+from bisect import bisect_left, bisect_right
+from typing import Any, List, Optional, Sequence, Tuple
+
+from conditions import CompiledCondition, MISSING, input_value
+from fields import condition_reads, input_field
+
+
+# Runs shorter than this are cheaper to scan than to look up
+MIN_RUN_LENGTH = 4
+
+_ORDERING = {ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">="}
+_FLIPPED = {"<": ">", "<=": ">=", ">": "<", ">=": "<="}
+
+
+def _literal(node: ast.AST) -> Tuple[bool, Any]:
+    if isinstance(node, ast.Constant) and isinstance(node.value, (str, int, float, bool)):
+        return True, node.value
+    if (
+        isinstance(node, ast.UnaryOp)
+        and isinstance(node.op, ast.USub)
+        and isinstance(node.operand, ast.Constant)
+        and type(node.operand.value) in (int, float)
+    ):
+        return True, -node.operand.value
+    return False, None
+
+
+def split_condition(condition: Optional[CompiledCondition]) -> Optional[Tuple[str, str, Any]]:
+    """
+    Return (field, op, constant) for a condition of the form
+    `input.field <op> constant` (either way round), else None.
+    """
+    if condition is None or condition.code is None:
+        return None
+    node = condition_reads(condition.source).tree.body
+    if not isinstance(node, ast.Compare) or len(node.ops) != 1:
+        return None
+
+    op = node.ops[0]
+    if isinstance(op, ast.Eq):
+        symbol = "=="
+    elif type(op) in _ORDERING:
+        symbol = _ORDERING[type(op)]
+    else:
+        return None
+
+    field, (found, value) = input_field(node.left), _literal(node.comparators[0])
+    if field is None:
+        field, (found, value) = input_field(node.comparators[0]), _literal(node.left)
+        symbol = _FLIPPED.get(symbol, symbol)
+    if field is None or not found:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return field, symbol, value
+
+
+class EqualityRun:
+    """
+    Siblings `input.field == c1`, `input.field == c2`, ... as one dict lookup.
+    """
+
+    __slots__ = ("field", "table", "after")
+
+    def __init__(self, field: str, children: Sequence[int], values: Sequence[Any], after: int):
+        self.field = field
+        self.after = after
+        self.table = {}
+        for child, value in zip(children, values):
+            # The first sibling with a given value wins, as in a linear scan
+            self.table.setdefault(value, child)
+
+    def match(self, namespace) -> Optional[int]:
+        """
+        The matching child, -1 when no sibling in the run matches, or None
+        when the run has to be checked condition by condition.
+        """
+        value = input_value(namespace, self.field)
+        if value is MISSING:
+            # Every condition would raise; the scan reports the errors
+            return None
+        try:
+            return self.table.get(value, -1)
+        except TypeError:
+            return None
+
+
+class RangeRun:
+    """
+    Siblings `input.field < t1`, `input.field < t2`, ... with thresholds in
+    scan order (ascending for < and <=, descending for > and >=), as a bisect.
+    """
+
+    __slots__ = ("field", "op", "thresholds", "children", "after")
+
+    def __init__(self, field: str, op: str, children: Sequence[int], values: Sequence[Any], after: int):
+        self.field = field
+        self.op = op
+        self.children = list(children)
+        self.after = after
+        # Keep thresholds ascending; for > and >= that means negating them
+        self.thresholds = list(values) if op in ("<", "<=") else [-value for value in values]
+
+    def match(self, namespace) -> Optional[int]:
+        value = input_value(namespace, self.field)
+        if value is MISSING:
+            return None
+        if type(value) not in (int, float, bool) or value != value:
+            # Strings raise, NaN never compares True; let the scan decide
+            return None
+
+        op = self.op
+        if op == "<":
+            position = bisect_right(self.thresholds, value)
+        elif op == "<=":
+            position = bisect_left(self.thresholds, value)
+        elif op == ">":
+            position = bisect_right(self.thresholds, -value)
+        else:
+            position = bisect_left(self.thresholds, -value)
+        return self.children[position] if position < len(self.children) else -1
+
+
+def _is_threshold(value: Any) -> bool:
+    return type(value) in (int, float)
+
+
+def _monotonic(op: str, values: List[Any]) -> bool:
+    pairs = zip(values, values[1:])
+    if op in ("<", "<="):
+        return all(a < b for a, b in pairs)
+    return all(a > b for a, b in pairs)
+
+
+def build_runs(children: List[int], conditions: List[Optional[CompiledCondition]]) -> List[Tuple[int, Any]]:
+    """
+    Find lookup runs among one node's children (given in order).
+    Returns (first child of the run, run) pairs.
+    """
+    parts = [split_condition(conditions[child]) for child in children]
+    runs = []
+    start = 0
+    while start < len(children):
+        part = parts[start]
+        end = start + 1
+        if part is not None:
+            field, op, _ = part
+            while end < len(children) and parts[end] is not None and parts[end][:2] == (field, op):
+                end += 1
+
+        if part is not None and end - start >= MIN_RUN_LENGTH:
+            run_children = children[start:end]
+            values = [parts[i][2] for i in range(start, end)]
+            next_child = children[end] if end < len(children) else -1
+            if op == "==":
+                try:
+                    runs.append((children[start], EqualityRun(field, run_children, values, next_child)))
+                except TypeError:
+                    pass
+            elif all(_is_threshold(value) for value in values) and _monotonic(op, values):
+                runs.append((children[start], RangeRun(field, op, run_children, values, next_child)))
+        start = end
+    return runs
@@ -1,5 +1,8 @@
 from typing import List, Dict, Any, Optional
 from models import Node
+from conditions import compile_condition, input_namespace
+from compiled import CompiledTree, compile_tree
+from sandbox import check_budget
 
 
 def evaluate_condition(condition: str, inputs: Dict[str, Any]) -> bool:
@@ -14,67 +17,86 @@ def evaluate_condition(condition: str, inputs: Dict[str, Any]) -> bool:
     if not condition:
         return True
     
-    # Create a safe evaluation environment with only the input data
-    eval_globals = {}
-    eval_locals = {"input": type('input', (), inputs)}
-    
-    try:
-        # Evaluate the condition in the restricted environment
-        result = eval(condition, eval_globals, eval_locals)
-        return bool(result)
-    except Exception as e:
-        # If there's an error evaluating (missing variable, syntax error, etc)
-        print(f"Error evaluating condition '{condition}': {str(e)}")
-        return False
+    # Conditions are parsed and compiled once, then served from the cache
+    return compile_condition(condition).evaluate(inputs)
 
 
 def traverse_tree(node: Node, inputs: Dict[str, Any]) -> tuple[List[str], List[Node], Node]:
     """
-    Recursively traverse the decision tree based on input values.
+    Traverse the decision tree based on input values.
     Returns the path of node_ids that were visited, list of node objects, and the final node.
+
+    For repeated traversals of the same tree, compile it once with
+    `compiled.compile_tree` and call `CompiledTree.traverse` instead.
     """
-    # Start with the current node
+    # Build the input accessor once and share it across every condition
+    namespace = input_namespace(inputs)
+    
+    # Walk down iteratively, appending to a single path buffer
     path = [node.node_id]
     visited_nodes = [node]
     
-    # Base case: leaf node (no children)
-    if not node.children:
-        return path, visited_nodes, node
-    
-    # Check each child node
-    for child in node.children:
-        # If the child has no condition, or its condition evaluates to True
-        if child.condition is None or evaluate_condition(child.condition, inputs):
-            # Recursively traverse this valid child
-            child_path, child_visited, final_node = traverse_tree(child, inputs)
-            
-            # Return the combined path
-            return path + child_path, visited_nodes + child_visited, final_node
+    while node.children:
+        # Take the first child with no condition, or whose condition evaluates to True
+        for child in node.children:
+            if not child.condition or compile_condition(child.condition)(namespace):
+                break
+        else:
+            # If no valid child path was found, stop at this node
+            break
+        
+        node = child
+        path.append(node.node_id)
+        visited_nodes.append(node)
     
-    # If no valid child path was found, return just this node
     return path, visited_nodes, node
 
 
-def detect_unreachable_nodes(tree: Node, sample_inputs: List[Dict[str, Any]]) -> List[str]:
+def detect_unreachable_nodes(
+    tree: Node,
+    sample_inputs: List[Dict[str, Any]],
+    qualify_duplicates: bool = False,
+) -> List[str]:
     """
     Detect nodes that are unreachable given a set of sample inputs.
-    Returns a list of unreachable node_ids.
+    Returns a list of unreachable node_ids, in preorder. Nodes sharing an id
+    are reported together unless `qualify_duplicates` is set, in which case
+    each is reported on its own under its qualified id (see
+    `CompiledTree.qualified_ids`).
     """
-    # Collect all node_ids in the tree
-    all_nodes = set()
-    
-    def collect_nodes(node):
-        all_nodes.add(node.node_id)
-        for child in node.children:
-            collect_nodes(child)
+    compiled = compile_tree(tree)
     
-    collect_nodes(tree)
-    
-    # Collect nodes visited with sample inputs
-    visited_nodes = set()
+    # Collect nodes visited with sample inputs, stopping once every node is covered
+    visited = set()
     for inputs in sample_inputs:
-        path, _, _ = traverse_tree(tree, inputs)
-        visited_nodes.update(path)
+        check_budget()
+        visited.update(compiled.traverse_indices(input_namespace(inputs)))
+        if len(visited) == len(compiled):
+            return []
     
     # Return nodes that were never visited
-    return list(all_nodes - visited_nodes) 
\ No newline at end of file
+    return compiled.unvisited_ids(visited, qualify_duplicates)
+
+
+def simulate_batch(compiled: CompiledTree, rows: List[Dict[str, Any]], final_only: bool = False) -> List[Dict[str, Any]]:
+    """
+    Traverse a compiled tree once per input row.
+    Returns one result per row, in order, with the final node_id and, unless
+    `final_only` is set, the path of node_ids.
+    """
+    node_ids = compiled.node_ids
+    traverse_indices = compiled.traverse_indices
+    results = []
+    
+    for inputs in rows:
+        check_budget()
+        indices = traverse_indices(input_namespace(inputs))
+        if final_only:
+            results.append({"final_node_id": node_ids[indices[-1]]})
+        else:
+            results.append({
+                "final_node_id": node_ids[indices[-1]],
+                "path": [node_ids[i] for i in indices],
+            })
+    
+    return results
@@ -0,0 +1,79 @@
+"""
+What a condition reads from its input.
+
+Memoization keys subtrees on the fields their conditions read, code
+generation binds those fields to locals, path search tries values for them,
+and the lookup tables and the static analysis look for `input.<field>`
+comparisons. They all start from `condition_reads`, which parses each
+condition text once.
+"""
+import ast
+from functools import lru_cache
+from typing import Any, FrozenSet, Optional, Tuple
+
+
+def input_field(node: ast.AST) -> Optional[str]:
+    """
+    The field name if `node` is `input.<field>`, else None.
+    """
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "input":
+        return node.attr
+    return None
+
+
+class ConditionReads:
+    """
+    A parsed condition and what it reads.
+
+    `tree` is the parsed expression, None if the text does not parse. It is
+    shared by every caller, so it must not be modified. `fields` are the
+    names read as `input.<field>`; `plain` is False when `input` is also
+    used any other way, so that `fields` may not be all the condition
+    reads. `other_names` is set when the condition names anything besides
+    `input`, such as a builtin. `constants` are its int, float and str
+    constants, in order.
+    """
+
+    __slots__ = ("tree", "fields", "plain", "other_names", "constants")
+
+    def __init__(
+        self,
+        tree: Optional[ast.Expression],
+        fields: FrozenSet[str],
+        plain: bool,
+        other_names: bool,
+        constants: Tuple[Any, ...],
+    ):
+        self.tree = tree
+        self.fields = fields
+        self.plain = plain
+        self.other_names = other_names
+        self.constants = constants
+
+
+@lru_cache(maxsize=4096)
+def condition_reads(source: str) -> ConditionReads:
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError:
+        return ConditionReads(None, frozenset(), True, False, ())
+
+    fields = set()
+    field_reads = 0
+    input_reads = 0
+    other_names = False
+    constants = []
+    for node in ast.walk(tree):
+        field = input_field(node)
+        if field is not None:
+            fields.add(field)
+            field_reads += 1
+        elif isinstance(node, ast.Name):
+            if node.id == "input":
+                input_reads += 1
+            else:
+                other_names = True
+        elif isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)):
+            constants.append(node.value)
+    # Each input.<field> also walks its `input` Name
+    return ConditionReads(tree, frozenset(fields), input_reads == field_reads, other_names, tuple(constants))
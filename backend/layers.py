@@ -0,0 +1,190 @@
+"""
+Copy-on-write forms of a compiled tree's arrays, lists and id index, for
+`patches.py`.
+
+A patch changes a handful of nodes. Copying every array and list of the
+tree for it would cost as much as compiling afresh. Instead the patched
+tree holds layers over the original's:
+- `ChunkedList` splits a sequence into chunks of CHUNK_SIZE items. A copy
+  shares every chunk and only copies one the first time it is written.
+  Chunks never written read straight through to the flat sequence the
+  list was made from.
+- `DictOverlay` keeps the changes to a dict next to the unchanged original.
+  Copies take the changes along, and fold them into a new dict once there
+  are more than about the square root of its size.
+
+Neither is fast to read from in a loop. The traversal hot path wants flat
+arrays, so `CompiledTree` builds those from the layers on first use (see
+`CompiledTree.freeze`). Flattening untouched layers costs nothing, as they
+give back the sequence they were made from. The flat sequences are never
+modified once built, so they can be shared this way.
+"""
+from array import array
+from math import isqrt
+from typing import Any, Dict, Iterable, Iterator, List, MutableSequence, Optional, Sequence, Set
+
+
+CHUNK_SHIFT = 10
+CHUNK_SIZE = 1 << CHUNK_SHIFT
+CHUNK_MASK = CHUNK_SIZE - 1
+
+# Changes a DictOverlay carries along before they are folded in
+MIN_OVERLAY_CHANGES = 64
+
+_DELETED = object()
+
+
+class ChunkedList:
+    """
+    A list (or, with a typecode, an array) made of copy-on-write chunks.
+
+    `_chunks[i]` is None while chunk i still reads from `_base`. `_owned`
+    holds the chunks this list has copied, and so may change in place;
+    every other chunk may be shared with other lists.
+    """
+
+    __slots__ = ("_base", "_typecode", "_chunks", "_owned", "_length")
+
+    def __init__(self, base: Sequence[Any], typecode: Optional[str] = None):
+        self._base = base
+        self._typecode = typecode
+        self._chunks: List[Optional[MutableSequence[Any]]] = [None] * -(-len(base) >> CHUNK_SHIFT)
+        self._owned: Set[int] = set()
+        self._length = len(base)
+
+    def copy(self) -> "ChunkedList":
+        """
+        A list sharing all of this one's chunks. Costs one pointer per chunk.
+        """
+        clone = object.__new__(ChunkedList)
+        clone._base = self._base
+        clone._typecode = self._typecode
+        clone._chunks = list(self._chunks)
+        clone._owned = set()
+        clone._length = self._length
+        # Shared now, so this list must copy them before writing, too
+        self._owned = set()
+        return clone
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: int) -> Any:
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("index out of range")
+        chunk = self._chunks[index >> CHUNK_SHIFT]
+        if chunk is None:
+            return self._base[index]
+        return chunk[index & CHUNK_MASK]
+
+    def __setitem__(self, index: int, value: Any) -> None:
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("assignment index out of range")
+        self._writable(index >> CHUNK_SHIFT)[index & CHUNK_MASK] = value
+
+    def __iter__(self) -> Iterator[Any]:
+        for position in range(len(self._chunks)):
+            yield from self._chunk(position)
+
+    def append(self, value: Any) -> None:
+        position = self._length >> CHUNK_SHIFT
+        if position == len(self._chunks):
+            self._chunks.append(array(self._typecode) if self._typecode else [])
+            self._owned.add(position)
+        self._writable(position).append(value)
+        self._length += 1
+
+    def extend(self, values: Iterable[Any]) -> None:
+        for value in values:
+            self.append(value)
+
+    def flatten(self) -> MutableSequence[Any]:
+        """
+        The items as one array or list. Gives back the sequence this list was
+        made from, without copying, if nothing has changed since.
+        """
+        if self._length == len(self._base) and all(chunk is None for chunk in self._chunks):
+            return self._base
+        flat: MutableSequence[Any] = array(self._typecode) if self._typecode else []
+        for position in range(len(self._chunks)):
+            flat.extend(self._chunk(position))
+        return flat
+
+    def _chunk(self, position: int) -> Sequence[Any]:
+        chunk = self._chunks[position]
+        if chunk is None:
+            start = position << CHUNK_SHIFT
+            return self._base[start:start + CHUNK_SIZE]
+        return chunk
+
+    def _writable(self, position: int) -> MutableSequence[Any]:
+        if position not in self._owned:
+            source = self._chunk(position)
+            chunk = array(self._typecode, source) if self._typecode else list(source)
+            self._chunks[position] = chunk
+            self._owned.add(position)
+        return self._chunks[position]
+
+
+class DictOverlay:
+    """
+    A dict as its changes over a base dict, which is never modified.
+    Deleted keys are kept in `changes` as a marker.
+    """
+
+    __slots__ = ("base", "changes")
+
+    def __init__(self, base: Dict[Any, Any], changes: Optional[Dict[Any, Any]] = None):
+        self.base = base
+        self.changes = {} if changes is None else changes
+
+    def copy(self) -> "DictOverlay":
+        if len(self.changes) > max(MIN_OVERLAY_CHANGES, isqrt(len(self.base))):
+            return DictOverlay(self.flatten())
+        return DictOverlay(self.base, dict(self.changes))
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        if key in self.changes:
+            value = self.changes[key]
+        else:
+            value = self.base.get(key, _DELETED)
+        return default if value is _DELETED else value
+
+    def __getitem__(self, key: Any) -> Any:
+        value = self.get(key, _DELETED)
+        if value is _DELETED:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key, _DELETED) is not _DELETED
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self.changes[key] = value
+
+    def __delitem__(self, key: Any) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self.changes[key] = _DELETED
+
+    def setdefault(self, key: Any, default: Any) -> Any:
+        value = self.get(key, _DELETED)
+        if value is _DELETED:
+            self.changes[key] = value = default
+        return value
+
+    def flatten(self) -> Dict[Any, Any]:
+        """
+        The base with the changes applied, as a new dict.
+        """
+        merged = dict(self.base)
+        for key, value in self.changes.items():
+            if value is _DELETED:
+                merged.pop(key, None)
+            else:
+                merged[key] = value
+        return merged
@@ -0,0 +1,82 @@
+"""
+The bounded LRU map behind the engine's caches and registries.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class LRUCache:
+    """
+    Bounded map that drops its least recently used entries once it holds
+    more than `maxsize`, counting lookup hits and misses.
+
+    Thread-safe. `_lock` is reentrant, so subclasses can hold it to update
+    state of their own together with the entries.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def lookup(self, key: Hashable) -> Optional[Any]:
+        """
+        The value stored under `key`, now the most recently used, or None.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def store(self, key: Hashable, value: Any) -> List[Tuple[Hashable, Any]]:
+        """
+        Store `value` as the most recently used entry. Returns the (key,
+        value) pairs evicted to make room, least recently used first.
+        """
+        evicted = []
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                evicted.append(self._entries.popitem(last=False))
+        return evicted
+
+    def discard(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            return self._entries.pop(key, None)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def values(self) -> List[Any]:
+        """
+        The values held, least recently used first.
+        """
+        with self._lock:
+            return list(self._entries.values())
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
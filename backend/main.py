@@ -1,15 +1,57 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Body, Query
+from fastapi.exception_handlers import http_exception_handler, request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List, Any
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from pydantic import ValidationError
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from typing import Dict, List, Any, Literal
 
-from models import InputPayload, PathResult, DecisionTree
-from engine import traverse_tree, detect_unreachable_nodes
+from models import (
+    InputPayload, PathResult, CompactPathResult, DecisionTree, TreeInputPayload, TreeRegistration,
+    BatchInputPayload, BatchResult, TreeBatchInputPayload,
+    CoverageRequest, CoverageSamples, CoverageReport, TreeProfileReport,
+    OptimizeRequest, OptimizationReport, ResolvedPathResult,
+    TreeNodeView, ChildrenPage, NodeSearchResult, TreePatch, PatchResult, TreePathPage, TestInputs,
+)
+from engine import detect_unreachable_nodes, simulate_batch
+from compiled import compile_tree
+from conditions import condition_cache, condition_errors
+from sandbox import BudgetExceeded, TimeBudgetMiddleware, request_budget_seconds
+from registry import tree_registry
+from patches import PatchError
+from memo import subtree_cache
+from codegen import tree_functions
+from coverage import coverage_sessions
+from analysis import static_unreachable_nodes
+from profiling import tree_profiles
+from resolvers import feature_resolvers, traverse_async
+from optimizer import reorder, visit_counts
+from metrics import MetricsMiddleware, render_metrics
+from views import children_page, find_node, node_view
+from paths import path_page, test_inputs
+from records import decode_input_values, decode_object, decode_sample_inputs, decode_tree
+from responses import CachedJSON, FastJSONResponse, model_response
+from streaming import NDJSONStreamingResponse, iter_lines, score_stream
+from startup import resident_memory, snapshot_path, startup_report, warm_start
 from tree_examples import example_trees
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Compile every tree before taking requests, not on the first one for each
+    warm_start(tree_registry, example_trees, snapshot_path)
+    yield
+    # Patched trees are written lazily; do not lose them on a clean shutdown
+    tree_registry.flush()
+
 app = FastAPI(
     title="TreeJack API",
     description="API for visualizing and traversing decision trees",
     version="1.0.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
 )
 
 # Add CORS middleware to allow frontend access
@@ -21,6 +63,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency histograms for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Bound the time any request spends evaluating conditions
+app.add_middleware(TimeBudgetMiddleware, seconds=request_budget_seconds)
+
+@app.exception_handler(BudgetExceeded)
+def budget_exceeded(request: Request, exc: BudgetExceeded):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+# Trees are validated as nested models, which pydantic gives up on below
+# about 250 levels (and the json module below about a thousand)
+TREE_TOO_DEEP = "Tree too deep to validate; /simulate/compact and /detect-unreachable/compact take trees of any depth"
+
+def too_deep(errors: List[Dict[str, Any]]) -> bool:
+    return any(
+        error["type"] == "recursion_loop" or (error["type"] == "json_invalid" and "recursion limit" in error["msg"])
+        for error in errors
+    )
+
+@app.exception_handler(RequestValidationError)
+async def validation_error(request: Request, exc: RequestValidationError):
+    if too_deep(exc.errors()):
+        return JSONResponse(status_code=422, content={"detail": TREE_TOO_DEEP})
+    return await request_validation_exception_handler(request, exc)
+
+@app.exception_handler(StarletteHTTPException)
+async def http_error(request: Request, exc: StarletteHTTPException):
+    # FastAPI's own answer when the json module gives up on the body
+    if isinstance(exc.__cause__, RecursionError):
+        return JSONResponse(status_code=422, content={"detail": TREE_TOO_DEEP})
+    return await http_exception_handler(request, exc)
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to TreeJack API"}
@@ -32,47 +107,508 @@ def simulate_tree(payload: InputPayload) -> PathResult:
     Returns the path of nodes that were visited.
     """
     try:
-        path, visited_nodes, final_node = traverse_tree(payload.tree.root, payload.input_values)
-        return PathResult(
+        path, visited_nodes, final_node = compile_tree(payload.tree.root).traverse(payload.input_values)
+        return model_response(PathResult(
             path=path,
             visited_nodes=visited_nodes,
             final_node=final_node
-        )
+        ))
+    except BudgetExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing tree: {str(e)}")
 
-@app.get("/examples")
-def get_examples() -> Dict[str, DecisionTree]:
+def simulate_compact(body: bytes) -> CompactPathResult:
+    try:
+        data = decode_object(body)
+        root, _ = decode_tree(data.get("tree"))
+        input_values = decode_input_values(data)
+        path, visited_nodes, final_node = compile_tree(root).traverse(input_values)
+        return model_response(CompactPathResult(
+            path=path,
+            visited_nodes=[node.summary() for node in visited_nodes],
+            final_node=final_node.summary()
+        ))
+    except BudgetExceeded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing tree: {str(e)}")
+
+@app.post("/simulate/compact")
+async def simulate_tree_compact(request: Request) -> CompactPathResult:
+    """
+    Same request as /simulate, for large trees: the tree is decoded without
+    model validation, to any depth, and visited nodes come back as node_id
+    and text only, without their subtrees.
+    """
+    return await run_in_threadpool(simulate_compact, await request.body())
+
+@app.post("/simulate/batch", response_model_exclude_none=True)
+def simulate_tree_batch(payload: BatchInputPayload) -> BatchResult:
+    """
+    Simulate one tree against many input rows.
+    Returns the final node (and path, unless final_only is set) per row, in order.
+    """
+    try:
+        compiled = compile_tree(payload.tree.root)
+        return {"results": simulate_batch(compiled, payload.input_values, payload.final_only)}
+    except BudgetExceeded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing tree: {str(e)}")
+
+@app.post("/simulate/stream")
+async def simulate_tree_stream(request: Request, final_only: bool = False):
+    """
+    Stream NDJSON: the first line is the tree, every following line is one
+    input_values object. Results stream back as NDJSON, one line per row.
+    """
+    lines = iter_lines(request.stream())
+    try:
+        tree = DecisionTree.model_validate_json(await lines.__anext__())
+    except StopAsyncIteration:
+        raise HTTPException(status_code=400, detail="Expected the tree on the first line")
+    except ValidationError as e:
+        if too_deep(e.errors()):
+            raise HTTPException(status_code=422, detail=TREE_TOO_DEEP)
+        raise HTTPException(status_code=400, detail=f"Error processing tree: {str(e)}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Error processing tree: {str(e)}")
+    
+    compiled = compile_tree(tree.root)
+    return NDJSONStreamingResponse(score_stream(compiled, lines, final_only, first_line=2))
+
+# Example trees never change while the server runs: encode them once
+examples_json = CachedJSON(example_trees)
+sample_inputs_json = {name: CachedJSON(tree.sample_inputs or []) for name, tree in example_trees.items()}
+
+@app.get("/examples", response_model=Dict[str, DecisionTree])
+def get_examples(request: Request):
     """
     Return a list of example decision trees.
+    Sends an ETag; a matching If-None-Match gets 304 Not Modified.
     """
-    return example_trees
+    return examples_json.response(request)
 
-@app.get("/examples/{tree_name}/sample_inputs")
-def get_sample_inputs(tree_name: str) -> List[Dict[str, Any]]:
+@app.get("/examples/{tree_name}/sample_inputs", response_model=List[Dict[str, Any]])
+def get_sample_inputs(tree_name: str, request: Request):
     """
     Return sample inputs for a specific example tree.
     """
-    if tree_name not in example_trees:
+    if tree_name not in sample_inputs_json:
         raise HTTPException(status_code=404, detail=f"Tree '{tree_name}' not found")
-    
-    tree = example_trees[tree_name]
-    if hasattr(tree, 'sample_inputs') and tree.sample_inputs:
-        return tree.sample_inputs
-    else:
-        return []
+    return sample_inputs_json[tree_name].response(request)
 
 @app.post("/detect-unreachable")
-def find_unreachable_nodes(tree: DecisionTree, sample_inputs: List[Dict[str, Any]]):
+def find_unreachable_nodes(
+    tree: DecisionTree,
+    sample_inputs: List[Dict[str, Any]] = Body(default=[]),
+    mode: Literal["samples", "static"] = "samples",
+    qualify_duplicates: bool = False,
+):
     """
     Detect nodes in the tree that are unreachable with the given sample inputs.
+    With mode=static, no samples are needed: nodes are reported when their
+    conditions can never hold, along with the reason.
+    With qualify_duplicates, nodes sharing an id are reported separately, as
+    "<parent id>/<id>".
     """
     try:
-        unreachable = detect_unreachable_nodes(tree.root, sample_inputs)
-        return {"unreachable_nodes": unreachable}
+        return unreachable_report(tree.root, sample_inputs, mode, qualify_duplicates)
+    except BudgetExceeded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error detecting unreachable nodes: {str(e)}")
+
+def unreachable_report(root, sample_inputs: List[Dict[str, Any]], mode: str, qualify_duplicates: bool = False) -> Dict[str, Any]:
+    if mode == "static":
+        details = static_unreachable_nodes(compile_tree(root), qualify_duplicates)
+        return {
+            "unreachable_nodes": [detail["node_id"] for detail in details],
+            "details": details,
+        }
+    return {"unreachable_nodes": detect_unreachable_nodes(root, sample_inputs, qualify_duplicates)}
+
+def detect_unreachable_compact(body: bytes, mode: str, qualify_duplicates: bool = False) -> Dict[str, Any]:
+    try:
+        data = decode_object(body)
+        root, _ = decode_tree(data.get("tree"))
+        return unreachable_report(root, decode_sample_inputs(data), mode, qualify_duplicates)
+    except BudgetExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error detecting unreachable nodes: {str(e)}")
 
+@app.post("/detect-unreachable/compact")
+async def find_unreachable_nodes_compact(
+    request: Request,
+    mode: Literal["samples", "static"] = "samples",
+    qualify_duplicates: bool = False,
+):
+    """
+    Same request and response as /detect-unreachable, with the tree decoded
+    without model validation, to any depth.
+    """
+    return await run_in_threadpool(detect_unreachable_compact, await request.body(), mode, qualify_duplicates)
+
+@app.post("/trees")
+def register_tree(tree: DecisionTree) -> TreeRegistration:
+    """
+    Register a tree once and return its content-addressed id, along with any
+    node ids the tree uses more than once.
+    """
+    try:
+        entry = tree_registry.register(tree)
+        return TreeRegistration(
+            tree_id=entry.tree_id,
+            node_count=entry.compiled.node_count,
+            duplicate_ids=list(entry.compiled.duplicate_ids),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error registering tree: {str(e)}")
+
+def get_registered_tree(tree_id: str):
+    entry = tree_registry.get(tree_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Tree '{tree_id}' not registered")
+    return entry
+
+@app.post("/trees/{tree_id}/patch")
+def patch_tree(tree_id: str, patch: TreePatch) -> PatchResult:
+    """
+    Apply add/remove/move/edit operations to a registered tree and register
+    the result. Only the edited nodes and their ancestors are recompiled.
+    Node indices stay valid unless the result says the tree was renumbered.
+    """
+    entry = get_registered_tree(tree_id)
+    try:
+        patched, added, renumbered = tree_registry.patch(entry, patch.operations)
+    except PatchError as e:
+        raise HTTPException(status_code=400, detail=f"Error patching tree: {str(e)}")
+    return PatchResult(
+        tree_id=patched.tree_id,
+        previous_tree_id=tree_id,
+        node_count=patched.compiled.node_count,
+        duplicate_ids=list(patched.compiled.duplicate_ids),
+        added=added,
+        renumbered=renumbered,
+    )
+
+def tree_traversal(tree_id: str, entry, endpoint: str):
+    # Profiled trees check every condition themselves, so they skip the subtree cache
+    profile = tree_profiles.get(tree_id)
+    if profile is not None:
+        return profile.traversal()
+    # A generated function walks the whole tree faster than memoized lookups
+    if tree_functions.enabled:
+        return tree_functions.traversal(entry.compiled)
+    return subtree_cache.traversal(tree_id, entry.compiled, endpoint)
+
+@app.get("/trees/{tree_id}")
+def get_tree(tree_id: str) -> DecisionTree:
+    """
+    Return a registered tree.
+    """
+    return get_registered_tree(tree_id).tree
+
+def get_node_index(entry, index: int) -> int:
+    if not 0 <= index < len(entry.compiled) or index in entry.compiled.removed:
+        raise HTTPException(status_code=404, detail=f"Node index {index} not found")
+    return index
+
+@app.get("/trees/{tree_id}/nodes/{index}", response_model_exclude_none=True)
+def get_tree_node(
+    tree_id: str,
+    index: int,
+    depth: int = Query(default=1, ge=0, le=10),
+    limit: int = Query(default=100, ge=1, le=1000),
+) -> TreeNodeView:
+    """
+    Return one node of a registered tree (index 0 is the root) with up to
+    `depth` levels of children, at most `limit` children per node.
+    """
+    entry = get_registered_tree(tree_id)
+    return node_view(entry.compiled, get_node_index(entry, index), depth, limit)
+
+@app.get("/trees/{tree_id}/nodes/{index}/children", response_model_exclude_none=True)
+def get_tree_node_children(
+    tree_id: str,
+    index: int,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=1000),
+    depth: int = Query(default=0, ge=0, le=10),
+) -> ChildrenPage:
+    """
+    Return a page of a node's children, each with `depth` further levels.
+    """
+    entry = get_registered_tree(tree_id)
+    return children_page(entry.compiled, get_node_index(entry, index), offset, limit, depth)
+
+@app.get("/trees/{tree_id}/find/{node_id}", response_model_exclude_none=True)
+def find_tree_node(tree_id: str, node_id: str) -> NodeSearchResult:
+    """
+    Find every node with this id and return the path from the root to each.
+    """
+    entry = get_registered_tree(tree_id)
+    matches = find_node(entry.compiled, node_id)
+    if not matches:
+        raise HTTPException(status_code=404, detail=f"Node '{node_id}' not found")
+    return {"node_id": node_id, "matches": matches}
+
+@app.get("/trees/{tree_id}/paths")
+def get_tree_paths(
+    tree_id: str,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=1000),
+    inner_ends: bool = False,
+) -> TreePathPage:
+    """
+    Return a page of the tree's root-to-leaf paths, in preorder, each with
+    the constraints along it and an input that takes it. Paths the static
+    analysis proves impossible are left out. With `inner_ends`, paths that
+    end at an inner node because no child matched are included.
+    """
+    entry = get_registered_tree(tree_id)
+    return path_page(entry.compiled, offset, limit, inner_ends)
+
+@app.get("/trees/{tree_id}/test-inputs")
+def get_tree_test_inputs(
+    tree_id: str,
+    limit: int = Query(default=1000, ge=1, le=10000),
+    inner_ends: bool = False,
+) -> TestInputs:
+    """
+    Synthesize one input per path, for up to `limit` paths, in the
+    `sample_inputs` format. Together they cover every reachable leaf unless
+    the result is truncated or lists uncovered paths.
+    """
+    entry = get_registered_tree(tree_id)
+    return test_inputs(entry.compiled, limit, inner_ends)
+
+@app.post("/trees/{tree_id}/simulate")
+def simulate_registered_tree(tree_id: str, payload: TreeInputPayload) -> PathResult:
+    """
+    Simulate a traversal of a registered tree with the given inputs.
+    """
+    entry = get_registered_tree(tree_id)
+    try:
+        traversal = tree_traversal(tree_id, entry, "trees_simulate")
+        path, visited_nodes, final_node = traversal.traverse(payload.input_values)
+        return model_response(PathResult(
+            path=path,
+            visited_nodes=visited_nodes,
+            final_node=final_node
+        ))
+    except BudgetExceeded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing tree: {str(e)}")
+
+@app.post("/trees/{tree_id}/simulate/async")
+async def simulate_registered_tree_async(tree_id: str, payload: TreeInputPayload) -> ResolvedPathResult:
+    """
+    Simulate a registered tree, fetching input fields the conditions need but
+    the request lacks from the registered feature resolvers, without
+    blocking the worker while lookups are in flight.
+    """
+    entry = get_registered_tree(tree_id)
+    try:
+        indices, features = await traverse_async(entry.compiled, payload.input_values, feature_resolvers.resolvers())
+        visited_nodes = [entry.compiled.nodes[i] for i in indices]
+        return model_response(ResolvedPathResult(
+            path=[node.node_id for node in visited_nodes],
+            visited_nodes=visited_nodes,
+            final_node=visited_nodes[-1],
+            resolved=features.resolved,
+            resolver_errors=features.errors
+        ))
+    except BudgetExceeded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing tree: {str(e)}")
+
+@app.post("/trees/{tree_id}/simulate/batch", response_model_exclude_none=True)
+def simulate_registered_tree_batch(tree_id: str, payload: TreeBatchInputPayload) -> BatchResult:
+    """
+    Simulate a registered tree against many input rows.
+    """
+    entry = get_registered_tree(tree_id)
+    try:
+        traversal = tree_traversal(tree_id, entry, "trees_simulate_batch")
+        return {"results": simulate_batch(traversal, payload.input_values, payload.final_only)}
+    except BudgetExceeded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing tree: {str(e)}")
+
+@app.post("/trees/{tree_id}/simulate/stream")
+async def simulate_registered_tree_stream(tree_id: str, request: Request, final_only: bool = False):
+    """
+    Stream NDJSON input rows against a registered tree; results stream back as NDJSON.
+    """
+    entry = get_registered_tree(tree_id)
+    traversal = tree_traversal(tree_id, entry, "trees_simulate_stream")
+    return NDJSONStreamingResponse(score_stream(traversal, iter_lines(request.stream()), final_only))
+
+@app.post("/trees/{tree_id}/profile")
+def start_profiling(tree_id: str):
+    """
+    Start profiling a registered tree: from now on its traversals record
+    per-node evaluation counts, match rates and time. Restarting resets the
+    numbers.
+    """
+    entry = get_registered_tree(tree_id)
+    try:
+        tree_profiles.start(tree_id, entry.compiled)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"tree_id": tree_id, "profiling": True}
+
+def get_tree_profile(tree_id: str):
+    profile = tree_profiles.get(tree_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Tree '{tree_id}' is not being profiled")
+    return profile
+
+@app.get("/trees/{tree_id}/profile")
+def get_profile(tree_id: str) -> TreeProfileReport:
+    """
+    Return the profile collected so far, slowest conditions first.
+    """
+    return get_tree_profile(tree_id).report()
+
+@app.delete("/trees/{tree_id}/profile")
+def stop_profiling(tree_id: str) -> TreeProfileReport:
+    """
+    Stop profiling a tree and return its final profile.
+    """
+    report = get_tree_profile(tree_id).report()
+    tree_profiles.stop(tree_id)
+    return report
+
+@app.post("/trees/{tree_id}/optimize")
+def optimize_tree(tree_id: str, payload: OptimizeRequest = Body(default=OptimizeRequest())) -> OptimizationReport:
+    """
+    Reorder sibling checks by how often each branch is taken, where the
+    siblings' conditions are provably mutually exclusive, so results are
+    unchanged. Branch frequencies come from the given sample_inputs, else
+    from the tree's profile if it is being profiled, else from the tree's
+    own sample_inputs. The reordered tree is registered under a new id.
+    """
+    entry = get_registered_tree(tree_id)
+    compiled = entry.compiled
+    profile = tree_profiles.get(tree_id)
+    costs = None
+    try:
+        if payload.sample_inputs is not None:
+            source, visits = "sample_inputs", visit_counts(compiled, payload.sample_inputs)
+        elif profile is not None:
+            source, visits = "profile", list(profile.visits)
+            costs = [
+                time_ns / evaluations if evaluations else None
+                for time_ns, evaluations in zip(profile.time_ns, profile.evaluations)
+            ]
+        else:
+            samples = [sample.get("input_values", sample) for sample in entry.tree.sample_inputs]
+            source, visits = "tree_sample_inputs", visit_counts(compiled, samples)
+        if not visits[0]:
+            raise ValueError("no traversals to learn branch frequencies from")
+
+        reordering = reorder(compiled, visits, costs)
+        tree = entry.tree.model_copy(update={"root": reordering.build_root()})
+        optimized = tree_registry.register(tree)
+    except BudgetExceeded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error optimizing tree: {str(e)}")
+
+    return OptimizationReport(
+        tree_id=optimized.tree_id,
+        source=source,
+        traversals=visits[0],
+        reordered_nodes=reordering.changed,
+        expected_evaluations_before=reordering.before,
+        expected_evaluations_after=reordering.after,
+    )
+
+@app.post("/coverage")
+def start_coverage(payload: CoverageRequest) -> CoverageReport:
+    """
+    Open a coverage session for a tree (inline or by registered tree_id) and
+    return per-node hit counts for the given samples.
+    """
+    if payload.tree_id is not None:
+        compiled = get_registered_tree(payload.tree_id).compiled
+    elif payload.tree is not None:
+        compiled = compile_tree(payload.tree.root)
+    else:
+        raise HTTPException(status_code=400, detail="Provide either tree or tree_id")
+    
+    try:
+        session = coverage_sessions.create(compiled, payload.qualify_duplicates)
+        session.add_samples(payload.sample_inputs)
+        return session.report()
+    except BudgetExceeded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error computing coverage: {str(e)}")
+
+def get_coverage_session(session_id: str):
+    session = coverage_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Coverage session '{session_id}' not found")
+    return session
+
+@app.get("/coverage/{session_id}")
+def get_coverage(session_id: str) -> CoverageReport:
+    """
+    Return the current coverage of a session.
+    """
+    return get_coverage_session(session_id).report()
+
+@app.post("/coverage/{session_id}/samples")
+def add_coverage_samples(session_id: str, payload: CoverageSamples) -> CoverageReport:
+    """
+    Add samples to a coverage session; only the new samples are evaluated.
+    """
+    session = get_coverage_session(session_id)
+    try:
+        session.add_samples(payload.sample_inputs)
+        return session.report()
+    except BudgetExceeded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error computing coverage: {str(e)}")
+
+def engine_stats():
+    return {
+        "condition_cache": condition_cache.info(),
+        "tree_registry": tree_registry.info(),
+        "coverage_sessions": coverage_sessions.info(),
+        "subtree_cache": subtree_cache.info(),
+        "codegen": tree_functions.info(),
+        "condition_errors": condition_errors.info(),
+        "profiles": tree_profiles.info(),
+        "startup": startup_report.info(),
+        "process": resident_memory(),
+    }
+
+@app.get("/stats")
+def get_stats():
+    """
+    Return engine cache statistics, what start-up loaded and how long it
+    took, and this worker's resident memory.
+    """
+    return engine_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Prometheus metrics: request latency histograms per route, and the
+    numbers from /stats as gauges.
+    """
+    return PlainTextResponse(render_metrics(engine_stats()), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -0,0 +1,238 @@
+"""
+Memoized subtree results.
+
+Below any node, the traversal only depends on the input fields that the
+conditions in that subtree read. For large enough subtrees we key a cache on
+the subtree's content digest plus the values of just those fields, and store
+the rest of the path. Repeated inputs (or inputs that differ only in fields
+the subtree ignores) then skip the whole subtree, and identical subtrees,
+in the same tree or in different trees, share entries.
+
+Subtrees whose conditions use `input` other than as `input.<field>` are never
+memoized, since we cannot tell what they read.
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from compiled import CompiledTree, WrappedTree
+from conditions import CompiledCondition, input_value
+from fields import condition_reads
+from lru import LRUCache
+
+
+# Entries kept across all trees; 0 turns memoization off
+DEFAULT_SUBTREE_CACHE_SIZE = 0
+
+# Smaller subtrees are cheaper to walk than to look up
+MIN_SUBTREE_SIZE = 8
+
+
+def condition_fields(condition: Optional[CompiledCondition]) -> Optional[frozenset]:
+    """
+    The input fields a condition reads, or None if that cannot be determined.
+    """
+    if condition is None or condition.code is None:
+        # Unconditional, or never compiled and always False
+        return frozenset()
+    reads = condition_reads(condition.source)
+    # Every use of `input` must be a plain field access
+    return reads.fields if reads.plain else None
+
+
+class MemoPlan:
+    """
+    Where to memoize in one compiled tree: `fields[i]` is the sorted tuple of
+    fields read below node i when i is a memo point, else None.
+    """
+
+    __slots__ = ("compiled", "fields", "digests")
+
+    def __init__(self, compiled: CompiledTree, min_size: int = MIN_SUBTREE_SIZE):
+        self.compiled = compiled
+        self.digests = compiled.subtree_hashes()
+
+        count = len(compiled)
+        first_child = compiled.first_child
+        next_sibling = compiled.next_sibling
+        below: List[Optional[frozenset]] = [None] * count
+        sizes = [1] * count
+        self.fields: List[Optional[Tuple[str, ...]]] = [None] * count
+
+        # Children come after their parent in preorder, as in subtree_hashes
+        for index in reversed(compiled.preorder()):
+            fields: Optional[set] = set()
+            child = first_child[index]
+            while child >= 0:
+                sizes[index] += sizes[child]
+                read = condition_fields(compiled.conditions[child])
+                if fields is not None:
+                    if read is None or below[child] is None:
+                        fields = None
+                    else:
+                        fields |= read
+                        fields |= below[child]
+                child = next_sibling[child]
+            below[index] = None if fields is None else frozenset(fields)
+            # Cached offsets assume the subtree is stored contiguously, as
+            # compile_tree lays it out; edited trees may break that
+            if fields is not None and sizes[index] >= min_size and index not in compiled.relocated:
+                self.fields[index] = tuple(sorted(fields))
+
+
+class SubtreeCache(LRUCache):
+    """
+    Bounded LRU of subtree results, shared by all trees.
+
+    Entries are (path offsets below the subtree root, seconds the walk took,
+    owning tree). They remember which tree stored them so `invalidate` can
+    drop a tree's entries and plan when it changes or goes away. Lookups are
+    also counted per endpoint; `seconds_saved` adds up how long each hit's
+    walk took when it was first stored, so it is an estimate.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_SUBTREE_CACHE_SIZE, min_size: int = MIN_SUBTREE_SIZE):
+        super().__init__(maxsize)
+        self.min_size = min_size
+        self._by_tree: Dict[str, set] = {}
+        self._plans: Dict[str, MemoPlan] = {}
+        self._endpoints: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def traversal(self, tree_key: str, compiled: CompiledTree, endpoint: str):
+        """
+        What to traverse for `endpoint`: a MemoizedTree over `compiled`, or
+        `compiled` itself when memoization is off. Both offer the same
+        traversal methods.
+        """
+        if not self.enabled:
+            return compiled
+        with self._lock:
+            plan = self._plans.get(tree_key)
+        if plan is None or plan.compiled is not compiled:
+            plan = MemoPlan(compiled, self.min_size)
+            with self._lock:
+                self._plans[tree_key] = plan
+        return MemoizedTree(plan, self, tree_key, endpoint)
+
+    def lookup_path(self, key: Tuple, endpoint: str) -> Optional[Tuple[int, ...]]:
+        with self._lock:
+            stats = self._endpoint_stats(endpoint)
+            entry = self.lookup(key)
+            if entry is None:
+                stats["misses"] += 1
+                return None
+            stats["hits"] += 1
+            stats["seconds_saved"] += entry[1]
+            return entry[0]
+
+    def store_path(self, key: Tuple, offsets: Tuple[int, ...], seconds: float, tree_key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                return
+            self._by_tree.setdefault(tree_key, set()).add(key)
+            for old_key, (_, _, owner) in self.store(key, (offsets, seconds, tree_key)):
+                self._by_tree[owner].discard(old_key)
+
+    def invalidate(self, tree_key: str) -> None:
+        """
+        Forget everything stored for a tree, and its plan.
+        """
+        with self._lock:
+            self._plans.pop(tree_key, None)
+            for key in self._by_tree.pop(tree_key, ()):
+                self.discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            self._by_tree.clear()
+            self._plans.clear()
+            self._endpoints.clear()
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {}
+            for endpoint, stats in self._endpoints.items():
+                lookups = stats["hits"] + stats["misses"]
+                endpoints[endpoint] = {
+                    "hits": int(stats["hits"]),
+                    "misses": int(stats["misses"]),
+                    "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+                    "seconds_saved": stats["seconds_saved"],
+                }
+            return {
+                **super().info(),
+                "trees": len(self._plans),
+                "endpoints": endpoints,
+            }
+
+    def _endpoint_stats(self, endpoint: str) -> Dict[str, float]:
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = {"hits": 0, "misses": 0, "seconds_saved": 0.0}
+        return stats
+
+
+class MemoizedTree(WrappedTree):
+    """
+    Traverses a compiled tree, reusing cached results at the plan's memo
+    points.
+    """
+
+    __slots__ = ("plan", "cache", "tree_key", "endpoint")
+
+    def __init__(self, plan: MemoPlan, cache: SubtreeCache, tree_key: str, endpoint: str):
+        super().__init__(plan.compiled)
+        self.plan = plan
+        self.cache = cache
+        self.tree_key = tree_key
+        self.endpoint = endpoint
+
+    def traverse_indices(self, namespace: Dict[str, Any]) -> List[int]:
+        plan = self.plan
+        compiled = plan.compiled
+        memo_fields = plan.fields
+        cache = self.cache
+
+        path = [0]
+        node = 0
+        # (path position after the memo point, memo point, key, start time)
+        pending = []
+        while True:
+            fields = memo_fields[node]
+            if fields is not None:
+                key = (plan.digests[node], tuple(_keyed(input_value(namespace, field)) for field in fields))
+                try:
+                    offsets = cache.lookup_path(key, self.endpoint)
+                except TypeError:
+                    # Unhashable field values (lists, objects): walk as usual
+                    offsets = key = None
+                if offsets is not None:
+                    path.extend([node + offset for offset in offsets])
+                    break
+                if key is not None:
+                    pending.append((len(path), node, key, time.perf_counter()))
+            node = compiled.descend(namespace, node, path, memo_fields)
+            if node < 0:
+                break
+
+        if pending:
+            finished = time.perf_counter()
+            for position, start, key, started in pending:
+                offsets = tuple(index - start for index in path[position:])
+                cache.store_path(key, offsets, finished - started, self.tree_key)
+        return path
+
+
+def _keyed(value: Any) -> Tuple[type, Any]:
+    # 1, 1.0 and True are equal but conditions can tell them apart
+    return type(value), value
+
+
+subtree_cache = SubtreeCache(
+    maxsize=int(os.environ.get("TREEJACK_SUBTREE_CACHE_SIZE", DEFAULT_SUBTREE_CACHE_SIZE)),
+)
@@ -0,0 +1,151 @@
+"""
+Prometheus-style metrics in the text exposition format.
+
+Request latency is recorded by MetricsMiddleware into a histogram labelled
+by route template (so /trees/{tree_id}/simulate is one series, not one per
+tree), method and status. Cache statistics are read from the same numbers
+as /stats when the metrics are rendered.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+# Upper bounds in seconds, as in the Prometheus client defaults
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+PREFIX = "treejack"
+
+
+class Histogram:
+    """
+    A labelled histogram with cumulative buckets.
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # labels -> (per-bucket counts with a final +Inf bucket, sum)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][position] += 1
+            series[1][0] += value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = sorted((labels, list(counts), total[0]) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            base = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f'{self.name}_bucket{{{base},le="{le}"}} {cumulative}'
+            yield f"{self.name}_sum{{{base}}} {total}"
+            yield f"{self.name}_count{{{base}}} {cumulative}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_latency = Histogram(
+    f"{PREFIX}_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response.",
+    ("route", "method", "status"),
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that times every HTTP request into `request_latency`.
+    Requests that match no route are labelled "unmatched".
+    """
+
+    def __init__(self, app: ASGIApp, histogram: Histogram = request_latency, exclude: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.histogram = histogram
+        self.exclude = set(exclude)
+        self._routes: Dict[Any, str] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_and_record(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            # The router has filled in the matched endpoint by now
+            route = self._route_path(scope)
+            if route not in self.exclude:
+                self.histogram.observe((route, scope["method"], str(status[0])), time.perf_counter() - started)
+
+    def _route_path(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._routes.get(endpoint)
+        if path is None:
+            path = "unmatched"
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    path = route.path
+                    break
+            self._routes[endpoint] = path
+        return path
+
+
+def _gauges(prefix: str, stats: Dict[str, Any], labels: str = "") -> Iterator[Tuple[str, str, float]]:
+    # Numbers become samples; nested dicts keyed by name become labelled series
+    for key, value in stats.items():
+        if isinstance(value, bool) or value is None:
+            continue
+        if isinstance(value, (int, float)):
+            yield f"{prefix}_{key}", labels, value
+        elif isinstance(value, dict) and value and all(isinstance(inner, dict) for inner in value.values()):
+            for name, inner in value.items():
+                label = f'{key.rstrip("s")}="{_escape(str(name))}"'
+                yield from _gauges(prefix, inner, f"{labels},{label}" if labels else label)
+
+
+def render_metrics(stats: Dict[str, Dict[str, Any]], histograms: Sequence[Histogram] = (request_latency,)) -> str:
+    """
+    The exposition text for the histograms plus every number in `stats`
+    (the /stats payload), as gauges named treejack_<section>_<key>.
+    """
+    lines: List[str] = []
+    for histogram in histograms:
+        lines.extend(histogram.render())
+
+    samples: Dict[str, List[Tuple[str, float]]] = {}
+    for section, section_stats in stats.items():
+        for name, labels, value in _gauges(f"{PREFIX}_{section}", section_stats):
+            samples.setdefault(name, []).append((labels, value))
+    for name, series in samples.items():
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in series:
+            lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -1,4 +1,4 @@
-from typing import List, Dict, Optional, Any, Union
+from typing import List, Dict, Optional, Any, Union, Literal
 from pydantic import BaseModel, Field
 
 
@@ -22,4 +22,230 @@ class InputPayload(BaseModel):
 class PathResult(BaseModel):
     path: List[str]
     visited_nodes: List[Node]
-    final_node: Node 
\ No newline at end of file
+    final_node: Node 
+
+class ResolvedPathResult(PathResult):
+    resolved: Dict[str, Any] = Field(default_factory=dict)
+    resolver_errors: Dict[str, str] = Field(default_factory=dict)
+
+
+class CompactNode(BaseModel):
+    node_id: str
+    text: str
+
+
+class CompactPathResult(BaseModel):
+    path: List[str]
+    visited_nodes: List[CompactNode]
+    final_node: CompactNode
+
+
+class BatchInputPayload(BaseModel):
+    tree: DecisionTree
+    input_values: List[Dict[str, Any]] = Field(default_factory=list)
+    final_only: bool = False
+
+
+class BatchRowResult(BaseModel):
+    final_node_id: str
+    path: Optional[List[str]] = None
+
+
+class BatchResult(BaseModel):
+    results: List[BatchRowResult]
+
+
+class TreeInputPayload(BaseModel):
+    input_values: Dict[str, Any] = Field(default_factory=dict)
+
+
+class TreeRegistration(BaseModel):
+    tree_id: str
+    node_count: int
+    duplicate_ids: List[str] = Field(default_factory=list)
+
+
+class TreeBatchInputPayload(BaseModel):
+    input_values: List[Dict[str, Any]] = Field(default_factory=list)
+    final_only: bool = False
+
+
+class CoverageRequest(BaseModel):
+    tree: Optional[DecisionTree] = None
+    tree_id: Optional[str] = None
+    sample_inputs: List[Dict[str, Any]] = Field(default_factory=list)
+    qualify_duplicates: bool = False
+
+
+class CoverageSamples(BaseModel):
+    sample_inputs: List[Dict[str, Any]] = Field(default_factory=list)
+
+
+class NodeHits(BaseModel):
+    node_id: str
+    hits: int
+
+
+class CoverageReport(BaseModel):
+    session_id: str
+    samples: int
+    node_hits: List[NodeHits]
+    unreachable_nodes: List[str]
+
+
+class NodeProfile(BaseModel):
+    node_id: str
+    condition: Optional[str] = None
+    visits: int
+    evaluations: int
+    matches: int
+    errors: int
+    match_rate: Optional[float] = None
+    total_time_us: float
+    mean_time_us: Optional[float] = None
+
+
+class TreeProfileReport(BaseModel):
+    traversals: int
+    profiling_seconds: float
+    nodes: List[NodeProfile]
+
+
+class OptimizeRequest(BaseModel):
+    sample_inputs: Optional[List[Dict[str, Any]]] = None
+
+
+class OptimizationReport(BaseModel):
+    tree_id: str
+    source: str
+    traversals: int
+    reordered_nodes: List[str]
+    expected_evaluations_before: float
+    expected_evaluations_after: float
+
+
+class TreeNodeView(BaseModel):
+    index: int
+    node_id: str
+    text: str
+    condition: Optional[str] = None
+    child_count: int
+    children: Optional[List["TreeNodeView"]] = None
+
+
+class ChildrenPage(BaseModel):
+    index: int
+    offset: int
+    limit: int
+    total: int
+    next_offset: Optional[int] = None
+    children: List[TreeNodeView]
+
+
+class NodeLocation(BaseModel):
+    index: int
+    depth: int
+    qualified_id: str
+    path: List[TreeNodeView]
+
+
+class NodeSearchResult(BaseModel):
+    node_id: str
+    matches: List[NodeLocation]
+
+
+class AddNodeOperation(BaseModel):
+    op: Literal["add"]
+    parent: int
+    # Among the parent's current children; None appends
+    position: Optional[int] = Field(default=None, ge=0)
+    node: Node
+
+
+class RemoveNodeOperation(BaseModel):
+    op: Literal["remove"]
+    index: int
+
+
+class MoveNodeOperation(BaseModel):
+    op: Literal["move"]
+    index: int
+    parent: int
+    position: Optional[int] = Field(default=None, ge=0)
+
+
+class EditNodeOperation(BaseModel):
+    # Only the fields given are changed; a null condition removes it
+    op: Literal["edit"]
+    index: int
+    node_id: Optional[str] = None
+    text: Optional[str] = None
+    condition: Optional[str] = None
+
+
+class TreePatch(BaseModel):
+    operations: List[Union[AddNodeOperation, RemoveNodeOperation, MoveNodeOperation, EditNodeOperation]] = Field(
+        default_factory=list, discriminator="op"
+    )
+
+
+class PatchResult(BaseModel):
+    tree_id: str
+    previous_tree_id: str
+    node_count: int
+    duplicate_ids: List[str] = Field(default_factory=list)
+    # Index of each added node, in the order of the add operations
+    added: List[int] = Field(default_factory=list)
+    # Set when the tree was compiled afresh and indices changed
+    renumbered: bool = False
+
+
+class NumberConstraint(BaseModel):
+    # Null bounds are unbounded
+    min: Optional[Union[int, float]] = None
+    min_inclusive: bool = False
+    max: Optional[Union[int, float]] = None
+    max_inclusive: bool = False
+    excluded: List[Union[int, float]] = Field(default_factory=list)
+
+
+class StringConstraint(BaseModel):
+    # Null allows any string not excluded
+    allowed: Optional[List[str]] = None
+    excluded: List[str] = Field(default_factory=list)
+
+
+class FieldConstraint(BaseModel):
+    field: str
+    # Null when no number (or string) is allowed
+    numbers: Optional[NumberConstraint] = None
+    strings: Optional[StringConstraint] = None
+    # Whether the field may be missing, null, a list or an object
+    other: bool
+
+
+class TreePath(BaseModel):
+    index: int
+    qualified_id: str
+    # False when the path ends at an inner node none of whose children match
+    leaf: bool
+    path: List[str]
+    constraints: List[FieldConstraint]
+    input_values: Dict[str, Any]
+    # Whether input_values was checked to end at this node
+    verified: bool
+
+
+class TreePathPage(BaseModel):
+    offset: int
+    limit: int
+    next_offset: Optional[int] = None
+    paths: List[TreePath]
+
+
+class TestInputs(BaseModel):
+    sample_inputs: List[Dict[str, Any]]
+    # Paths no input was found for
+    uncovered: List[str]
+    # Set when there were more paths than the limit
+    truncated: bool
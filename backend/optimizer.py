@@ -0,0 +1,168 @@
+"""
+Branch reordering driven by observed match frequencies.
+
+Siblings are checked in order and the first match wins, so a rarely taken
+branch listed first costs an evaluation on almost every traversal. When two
+siblings' conditions can never both hold (proved with the constraint
+domains of `analysis.py`), swapping them cannot change which child any input
+takes. The optimizer keeps every pair it cannot prove exclusive in its
+original order and, within that, puts the siblings most likely to match per
+unit of evaluation cost first.
+
+Visit counts come from sample inputs (`visit_counts`) or from a profile of
+live traffic, which also supplies per-condition costs.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+from models import Node
+from analysis import apply_formula, condition_formula
+from compiled import CompiledTree
+from conditions import CompiledCondition, input_namespace
+from sandbox import check_budget
+
+
+# Wider nodes are left alone: the pairwise proofs grow quadratically, and
+# such nodes usually use the lookup tables of dispatch.py anyway
+MAX_REORDER_CHILDREN = 64
+
+
+def visit_counts(compiled: CompiledTree, sample_inputs: Sequence[Dict[str, Any]]) -> List[int]:
+    """
+    How many of the samples visit each node.
+    """
+    visits = [0] * len(compiled)
+    for inputs in sample_inputs:
+        check_budget()
+        for index in compiled.traverse_indices(input_namespace(inputs)):
+            visits[index] += 1
+    return visits
+
+
+def mutually_exclusive(first: Optional[CompiledCondition], second: Optional[CompiledCondition]) -> bool:
+    """
+    True when no input can make both conditions evaluate True.
+    """
+    # Conditions that do not compile are always False
+    if (first is not None and first.code is None) or (second is not None and second.code is None):
+        return True
+    if first is None or second is None:
+        return False
+    both = apply_formula({}, condition_formula(first.source), True)
+    return both is None or apply_formula(both, condition_formula(second.source), True) is None
+
+
+def expected_evaluations(compiled: CompiledTree, orders: Dict[int, List[int]], visits: Sequence[int]) -> float:
+    """
+    Condition evaluations per traversal implied by `visits`, if the children
+    of each node in `orders` were checked in the given order (others keep
+    theirs). Siblings past the one an input takes are never evaluated.
+    """
+    if not visits[0]:
+        return 0.0
+    conditions = compiled.conditions
+    total = 0
+    for parent in range(len(compiled)):
+        remaining = visits[parent]
+        if not remaining:
+            continue
+        children = orders.get(parent)
+        if children is None:
+            children = compiled.children_of(parent)
+        for child in children:
+            if remaining <= 0:
+                break
+            if conditions[child] is not None:
+                total += remaining
+            remaining -= visits[child]
+    return total / visits[0]
+
+
+class Reordering:
+    """
+    New child orders for the nodes the optimizer changed, with the expected
+    evaluations per traversal before and after.
+    """
+
+    def __init__(self, compiled: CompiledTree, orders: Dict[int, List[int]], before: float, after: float):
+        self.compiled = compiled
+        self.orders = orders
+        self.before = before
+        self.after = after
+
+    @property
+    def changed(self) -> List[str]:
+        node_ids = self.compiled.node_ids
+        return [node_ids[parent] for parent in sorted(self.orders)]
+
+    def build_root(self) -> Node:
+        """
+        A copy of the tree with the new child orders.
+        """
+        compiled = self.compiled
+        rebuilt: List[Optional[Node]] = [None] * len(compiled)
+        # Children come after their parent in preorder
+        for index in reversed(compiled.preorder()):
+            children = self.orders.get(index) or compiled.children_of(index)
+            rebuilt[index] = compiled.nodes[index].model_copy(
+                update={"children": [rebuilt[child] for child in children]}
+            )
+        return rebuilt[0]
+
+
+def _order_children(
+    children: List[int],
+    conditions: List[Optional[CompiledCondition]],
+    visits: Sequence[int],
+    costs: Optional[Sequence[float]],
+) -> List[int]:
+    # Pairs we cannot prove exclusive keep their relative order
+    blocked = {
+        (earlier, later)
+        for position, earlier in enumerate(children)
+        for later in children[position + 1:]
+        if not mutually_exclusive(conditions[earlier], conditions[later])
+    }
+
+    def score(child: int) -> float:
+        if conditions[child] is None:
+            return float("inf")
+        cost = costs[child] if costs is not None and costs[child] else 1.0
+        return visits[child] / cost
+
+    order = []
+    pending = list(children)
+    while pending:
+        ready = [
+            child for position, child in enumerate(pending)
+            if not any((earlier, child) in blocked for earlier in pending[:position])
+        ]
+        # max() keeps the earliest of equal scores, so ties stay in place
+        best = max(ready, key=score)
+        order.append(best)
+        pending.remove(best)
+    return order
+
+
+def reorder(compiled: CompiledTree, visits: Sequence[int], costs: Optional[Sequence[float]] = None) -> Reordering:
+    """
+    Reorder siblings by observed match frequency (divided by `costs`, per
+    node, when given) wherever that provably leaves every result unchanged.
+    """
+    conditions = compiled.conditions
+    orders: Dict[int, List[int]] = {}
+    for parent in range(len(compiled)):
+        if not visits[parent]:
+            continue
+        children = compiled.children_of(parent)
+        if len(children) < 2 or len(children) > MAX_REORDER_CHILDREN:
+            continue
+        if any(compiled.dispatch[child] is not None for child in children):
+            # Table lookups do not depend on sibling order
+            continue
+        order = _order_children(children, conditions, visits, costs)
+        if order != children:
+            orders[parent] = order
+
+    before = expected_evaluations(compiled, {}, visits)
+    after = expected_evaluations(compiled, orders, visits)
+    return Reordering(compiled, orders, before, after)
@@ -0,0 +1,197 @@
+"""
+Multi-process batch scoring.
+
+Input rows are split into chunks and scored across a ProcessPoolExecutor so
+batch work is not limited to one core by the GIL. The tree is sent to each
+worker once, when the worker starts, as the flat arrays and node fields of
+its compiled form, and compiled there; chunks only carry input rows.
+Results come back in input order. Nothing on the way is recursive, so
+trees of any depth can be scored.
+"""
+import os
+from array import array
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from models import Node
+from compiled import CompiledTree, compile_tree
+from conditions import input_namespace
+from engine import simulate_batch
+from records import NodeRecord
+from streaming import score_row
+
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Set in each worker process by _init_worker
+_worker_tree: Optional[CompiledTree] = None
+
+
+# (node_id, text, condition) of each node, first_child, next_sibling
+TreePayload = Tuple[List[Tuple[str, str, Optional[str]]], array, array]
+
+
+def _tree_payload(compiled: CompiledTree) -> TreePayload:
+    fields = [(node.node_id, node.text, node.condition) for node in compiled.nodes]
+    return fields, compiled.first_child, compiled.next_sibling
+
+
+def _payload_root(payload: TreePayload) -> NodeRecord:
+    fields, first_child, next_sibling = payload
+    # Children come after their parent in preorder, so build nodes backwards
+    records: List[Optional[NodeRecord]] = [None] * len(fields)
+    for index in range(len(fields) - 1, -1, -1):
+        children = []
+        child = first_child[index]
+        while child >= 0:
+            children.append(records[child])
+            child = next_sibling[child]
+        records[index] = NodeRecord(*fields[index], children)
+    return records[0]
+
+
+def _init_worker(payload: TreePayload) -> None:
+    global _worker_tree
+    _worker_tree = compile_tree(_payload_root(payload))
+
+
+def _score_chunk(rows: List[Dict[str, Any]], final_only: bool) -> List[Dict[str, Any]]:
+    return simulate_batch(_worker_tree, rows, final_only)
+
+
+def _visit_chunk(rows: List[Dict[str, Any]]) -> List[int]:
+    visited = set()
+    for inputs in rows:
+        visited.update(_worker_tree.traverse_indices(input_namespace(inputs)))
+    return sorted(visited)
+
+
+def _score_lines_chunk(first_line: int, lines: List[str], final_only: bool) -> List[str]:
+    return [
+        score_row(_worker_tree, line, line_number, final_only)
+        for line_number, line in enumerate(lines, start=first_line)
+        if line.strip()
+    ]
+
+
+def default_workers() -> int:
+    return int(os.environ.get("TREEJACK_WORKERS") or os.cpu_count() or 1)
+
+
+def chunked(items: Iterable[Any], chunk_size: int) -> Iterator[List[Any]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def ordered_map(pool: Executor, fn: Callable, arguments: Iterable[Tuple], max_pending: int) -> Iterator[Any]:
+    """
+    Like Executor.map, but keeps at most `max_pending` tasks in flight, so a
+    long input stream is never read into memory all at once.
+    """
+    pending = deque()
+    for args in arguments:
+        pending.append(pool.submit(fn, *args))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class ParallelScorer:
+    """
+    A process pool with one tree preloaded in every worker. `compiled` is
+    the tree as compiled here, indexed like the workers' copies.
+
+    Use as a context manager; the pool is shut down on exit.
+    """
+
+    def __init__(self, root: Node, workers: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.workers = workers or default_workers()
+        self.chunk_size = chunk_size
+        self.compiled = compile_tree(root)
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(_tree_payload(self.compiled),),
+        )
+
+    def __enter__(self) -> "ParallelScorer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._pool.shutdown()
+
+    def _map(self, fn: Callable, arguments: Iterable[Tuple]) -> Iterator[Any]:
+        return ordered_map(self._pool, fn, arguments, max_pending=self.workers * 2)
+
+    def simulate_batch(self, rows: Iterable[Dict[str, Any]], final_only: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Same results as `engine.simulate_batch`, yielded in input order.
+        """
+        chunks = ((chunk, final_only) for chunk in chunked(rows, self.chunk_size))
+        for results in self._map(_score_chunk, chunks):
+            yield from results
+
+    def visited_indices(self, sample_inputs: Iterable[Dict[str, Any]]) -> set:
+        """
+        Indices of every node visited by at least one sample.
+        """
+        visited = set()
+        chunks = ((chunk,) for chunk in chunked(sample_inputs, self.chunk_size))
+        for chunk_visited in self._map(_visit_chunk, chunks):
+            visited.update(chunk_visited)
+        return visited
+
+    def score_lines(self, lines: Iterable[str], final_only: bool = False) -> Iterator[str]:
+        """
+        Parallel counterpart of `streaming.score_lines`.
+        """
+        def chunks():
+            line_number = 1
+            for chunk in chunked(lines, self.chunk_size):
+                yield line_number, chunk, final_only
+                line_number += len(chunk)
+
+        for results in self._map(_score_lines_chunk, chunks()):
+            yield from results
+
+
+def parallel_simulate_batch(
+    root: Node,
+    rows: List[Dict[str, Any]],
+    final_only: bool = False,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> List[Dict[str, Any]]:
+    """
+    Score `rows` across a process pool. Returns one result per row, in order.
+    """
+    with ParallelScorer(root, workers, chunk_size) as scorer:
+        return list(scorer.simulate_batch(rows, final_only))
+
+
+def parallel_detect_unreachable_nodes(
+    root: Node,
+    sample_inputs: List[Dict[str, Any]],
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    qualify_duplicates: bool = False,
+) -> List[str]:
+    """
+    Same result as `engine.detect_unreachable_nodes`, with samples traversed
+    across a process pool.
+    """
+    with ParallelScorer(root, workers, chunk_size) as scorer:
+        visited = scorer.visited_indices(sample_inputs)
+
+    return scorer.compiled.unvisited_ids(visited, qualify_duplicates)
@@ -0,0 +1,296 @@
+"""
+Incremental edits to a compiled tree.
+
+A patch is a list of operations (add, remove or move a node, or edit its
+fields), applied in order. Nodes are addressed by index, as in `views.py`.
+Each operation sees the tree as the previous ones left it. Indices stay
+stable across edits: removed nodes keep their slot, unused, and added
+nodes take new indices at the end. So an index in a patch means the same
+node it meant before the patch. The exception is when removed nodes come
+to outnumber the rest. The tree is then compiled afresh, and the result
+says it was renumbered.
+
+The patched tree is a copy; the original stays valid for requests still
+using it. Its arrays, lists and id index are copy-on-write layers over the
+original's (see `layers.py`), so a patch copies the chunks it writes to,
+not the whole tree. Everything else is limited to the edited nodes and
+their ancestors:
+- compiling conditions
+- lookup runs (rebuilt only for parents whose children changed)
+- subtree digests
+- the Node objects, where ancestors are copied so their `children` lists
+  match
+
+Memoized subtree results are keyed by digest, so edited subtrees simply
+get new keys; unchanged subtrees keep hitting the same entries.
+"""
+from bisect import insort
+from typing import List, Optional, Sequence, Set, Tuple, Union
+
+from models import AddNodeOperation, EditNodeOperation, MoveNodeOperation, Node, RemoveNodeOperation
+from compiled import CompiledTree, compile_tree
+from conditions import compile_condition
+
+
+Operation = Union[AddNodeOperation, RemoveNodeOperation, MoveNodeOperation, EditNodeOperation]
+
+
+class PatchError(ValueError):
+    """
+    Raised when an operation cannot be applied, e.g. a removed node's index.
+    """
+
+
+class TreeEditor:
+    """
+    Applies operations to a copy of a compiled tree; `finish` returns it.
+    """
+
+    def __init__(self, compiled: CompiledTree):
+        self.tree = compiled.layered_copy()
+        # Nodes whose own fields or children changed
+        self.changed: Set[int] = set()
+        # Parents whose children changed, so their lookup runs are stale
+        self.regroup: Set[int] = set()
+
+    def apply(self, operation: Operation) -> Optional[int]:
+        """
+        Apply one operation. Returns the new node's index for "add".
+        """
+        if isinstance(operation, AddNodeOperation):
+            return self.add(operation.parent, operation.node, operation.position)
+        if isinstance(operation, RemoveNodeOperation):
+            self.remove(operation.index)
+        elif isinstance(operation, MoveNodeOperation):
+            self.move(operation.index, operation.parent, operation.position)
+        else:
+            fields = {name: getattr(operation, name) for name in ("node_id", "text", "condition") if name in operation.model_fields_set}
+            self.edit(operation.index, **fields)
+        return None
+
+    def add(self, parent: int, node: Node, position: Optional[int] = None) -> int:
+        """
+        Add `node` and its children under `parent`, at `position` among its
+        children (None appends).
+        """
+        tree = self.tree
+        self._check(parent)
+        added = compile_tree(node)
+        base = len(tree.nodes)
+        depth = tree.depth[parent] + 1
+
+        for offset in range(len(added)):
+            tree.first_child.append(_shift(added.first_child[offset], base))
+            tree.next_sibling.append(_shift(added.next_sibling[offset], base))
+            tree.parent.append(_shift(added.parent[offset], base))
+            tree.depth.append(added.depth[offset] + depth)
+        tree.nodes.extend(added.nodes)
+        tree.node_ids.extend(added.node_ids)
+        tree.conditions.extend(added.conditions)
+        tree.dispatch.extend([None] * len(added))
+        tree._digests.extend(added.subtree_hashes())
+        for offset in range(len(added)):
+            # Runs refer to child indices, so they are rebuilt with the shift
+            tree.build_dispatch(base + offset)
+            self._index_id(base + offset)
+
+        self._link(base, parent, position)
+        self.changed.add(base)
+        return base
+
+    def remove(self, index: int) -> None:
+        """
+        Remove node `index` and everything below it.
+        """
+        tree = self.tree
+        self._check(index)
+        if index == 0:
+            raise PatchError("the root cannot be removed")
+        parent = tree.parent[index]
+        self._unlink(index)
+        for node in self._subtree(index):
+            tree.removed.add(node)
+            tree.dispatch[node] = None
+            self._unindex_id(node)
+        self._touch(parent)
+
+    def move(self, index: int, parent: int, position: Optional[int] = None) -> None:
+        """
+        Move node `index`, with everything below it, under `parent`.
+        """
+        tree = self.tree
+        self._check(index)
+        self._check(parent)
+        if index == 0:
+            raise PatchError("the root cannot be moved")
+        if index in tree.path_to(parent):
+            raise PatchError(f"node {parent} is below node {index}")
+
+        previous = tree.parent[index]
+        self._unlink(index)
+        self._touch(previous)
+        self._link(index, parent, position)
+        change = tree.depth[parent] + 1 - tree.depth[index]
+        if change:
+            for node in self._subtree(index):
+                tree.depth[node] += change
+
+    def edit(self, index: int, **fields) -> None:
+        """
+        Change any of `node_id`, `text` and `condition` of node `index`.
+        """
+        tree = self.tree
+        self._check(index)
+        if fields.get("node_id", "") is None or fields.get("text", "") is None:
+            raise PatchError("node_id and text cannot be null")
+
+        node = tree.nodes[index]
+        if "node_id" in fields and fields["node_id"] != node.node_id:
+            self._unindex_id(index)
+            tree.node_ids[index] = fields["node_id"]
+            self._index_id(index)
+        if "condition" in fields and fields["condition"] != node.condition:
+            condition = fields["condition"]
+            tree.conditions[index] = compile_condition(condition) if condition else None
+            if index:
+                self.regroup.add(tree.parent[index])
+        tree.nodes[index] = node.model_copy(update=fields)
+        self.changed.add(index)
+
+    def finish(self) -> CompiledTree:
+        """
+        Bring lookup runs, Node objects and digests up to date, and return
+        the patched tree.
+        """
+        tree = self.tree
+        for parent in self.regroup:
+            if parent in tree.removed:
+                continue
+            for child in tree.iter_children(parent):
+                tree.dispatch[child] = None
+            tree.build_dispatch(parent)
+
+        # Every changed node and its ancestors, deepest first, so children
+        # are done before their parents
+        stale: Set[int] = set()
+        for index in self.changed:
+            while index >= 0 and index not in stale and index not in tree.removed:
+                stale.add(index)
+                index = tree.parent[index]
+        nodes = tree.nodes
+        digests = tree._digests
+        for index in sorted(stale, key=tree.depth.__getitem__, reverse=True):
+            children = [nodes[child] for child in tree.iter_children(index)]
+            nodes[index] = nodes[index].model_copy(update={"children": children})
+            digests[index] = tree.node_digest(index, digests)
+        tree.freeze()
+        return tree
+
+    def _check(self, index: int) -> None:
+        if not 0 <= index < len(self.tree) or index in self.tree.removed:
+            raise PatchError(f"node {index} not found")
+
+    def _touch(self, parent: int) -> None:
+        # Its children changed: stale runs, and its subtree (and every
+        # enclosing one) is no longer contiguous in preorder
+        self.changed.add(parent)
+        self.regroup.add(parent)
+        tree = self.tree
+        index = parent
+        while index >= 0 and index not in tree.relocated:
+            tree.relocated.add(index)
+            index = tree.parent[index]
+
+    def _link(self, index: int, parent: int, position: Optional[int]) -> None:
+        tree = self.tree
+        previous = -1
+        child = tree.first_child[parent]
+        count = 0
+        while child >= 0 and (position is None or count < position):
+            previous = child
+            child = tree.next_sibling[child]
+            count += 1
+        tree.next_sibling[index] = child
+        if previous < 0:
+            tree.first_child[parent] = index
+        else:
+            tree.next_sibling[previous] = index
+        tree.parent[index] = parent
+        self._touch(parent)
+
+    def _unlink(self, index: int) -> None:
+        tree = self.tree
+        parent = tree.parent[index]
+        child = tree.first_child[parent]
+        if child == index:
+            tree.first_child[parent] = tree.next_sibling[index]
+        else:
+            while tree.next_sibling[child] != index:
+                child = tree.next_sibling[child]
+            tree.next_sibling[child] = tree.next_sibling[index]
+        tree.next_sibling[index] = -1
+        tree.parent[index] = -1
+
+    def _subtree(self, index: int) -> List[int]:
+        nodes = []
+        stack = [index]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(self.tree.iter_children(node))
+        return nodes
+
+    def _index_id(self, index: int) -> None:
+        first, duplicates = self.tree._id_index
+        node_id = self.tree.node_ids[index]
+        existing = first.setdefault(node_id, index)
+        if existing == index:
+            return
+        positions = duplicates.setdefault(node_id, [existing])
+        insort(positions, index)
+        first[node_id] = positions[0]
+
+    def _unindex_id(self, index: int) -> None:
+        first, duplicates = self.tree._id_index
+        node_id = self.tree.node_ids[index]
+        positions = duplicates.get(node_id)
+        if positions is None:
+            del first[node_id]
+            return
+        positions.remove(index)
+        first[node_id] = positions[0]
+        if len(positions) == 1:
+            del duplicates[node_id]
+
+
+def _shift(index: int, base: int) -> int:
+    return index + base if index >= 0 else -1
+
+
+def apply_patch(
+    compiled: CompiledTree,
+    operations: Sequence[Operation],
+) -> Tuple[CompiledTree, List[int], bool]:
+    """
+    The tree with `operations` applied, the index of each added node (-1 if
+    a later operation removed it), and whether the tree was renumbered.
+    `compiled` itself is left unchanged.
+    """
+    editor = TreeEditor(compiled)
+    added = []
+    for position, operation in enumerate(operations):
+        try:
+            index = editor.apply(operation)
+        except PatchError as e:
+            raise PatchError(f"operation {position} ({operation.op}): {e}") from None
+        if index is not None:
+            added.append(index)
+
+    tree = editor.finish()
+    added = [-1 if index in tree.removed else index for index in added]
+    if len(tree.removed) <= tree.node_count:
+        return tree, added, False
+
+    # Mostly removed nodes: lay the tree out afresh, in preorder
+    renumber = {index: position for position, index in enumerate(tree.preorder())}
+    return compile_tree(tree.root), [renumber.get(index, -1) for index in added], True
@@ -0,0 +1,175 @@
+"""
+Path enumeration and test-input synthesis.
+
+`iter_paths` yields every root-to-leaf path in preorder, each with the
+constraints that hold along it: the path's own conditions and the negation
+of every earlier sibling's, as in `analysis.find_unreachable`. Paths the
+analysis proves impossible are skipped. A traversal can also end at an inner
+node none of whose children match; those paths are included on request.
+The walk is a generator over an explicit stack that holds the pending
+siblings on the current branch, so memory grows with depth times fan-out,
+not with the number of paths.
+
+`synthesize_input` picks one value per constrained field. Conditions the
+analysis does not understand constrain nothing, so every input is run
+through the tree and only counts when it ends where its path does. When it
+does not, `fit_input` tries values for the fields those conditions read,
+keeping each change that gets the traversal further along the path. Each
+input ends at exactly one node, so one input per path is also the fewest
+that cover every path.
+"""
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from analysis import Domains, child_domains
+from compiled import CompiledTree
+from conditions import MISSING, input_namespace
+from fields import condition_reads
+from sandbox import check_budget
+
+
+# Traversals `fit_input` may spend on one path
+MAX_FIT_TRAVERSALS = 256
+
+# Tried for every field, besides the constants in the conditions
+_FIT_VALUES = (0, 1, -1, 1_000_000_000, -1_000_000_000, True, False, "x")
+
+
+def iter_paths(compiled: CompiledTree, inner_ends: bool = False) -> Iterator[Tuple[int, Domains]]:
+    """
+    (index of the node the path ends at, domains along the path) for every
+    path the analysis cannot rule out, in preorder. With `inner_ends`, also
+    paths that end at an inner node because no child matched.
+    """
+    first_child = compiled.first_child
+    stack: List[Tuple[int, Domains]] = [(0, {})]
+    while stack:
+        check_budget()
+        node, domains = stack.pop()
+        if first_child[node] < 0:
+            yield node, domains
+            continue
+        branches, rest = child_domains(compiled, node, domains)
+        if rest is not None and inner_ends:
+            # No child may match, which ends the traversal here
+            yield node, rest
+        for child, entered, _ in reversed(branches):
+            if entered is not None:
+                stack.append((child, entered))
+
+
+def synthesize_input(domains: Domains) -> Dict[str, Any]:
+    """
+    Input values meeting `domains`. Fields that are best left out are.
+    """
+    inputs = {}
+    for field in sorted(domains):
+        value = domains[field].example()
+        if value is not MISSING:
+            inputs[field] = value
+    return inputs
+
+
+def _progress(compiled: CompiledTree, inputs: Dict[str, Any], target: List[int]) -> int:
+    # How far along `target` the traversal for `inputs` gets, one more if it ends there
+    visited = compiled.traverse_indices(input_namespace(inputs))
+    steps = 0
+    for step, expected in zip(visited, target):
+        if step != expected:
+            return steps
+        steps += 1
+    return steps + (len(visited) == len(target))
+
+
+def fit_input(compiled: CompiledTree, domains: Domains, index: int) -> Optional[Dict[str, Any]]:
+    """
+    An input that ends at node `index`, starting from `synthesize_input`,
+    or None if none was found within MAX_FIT_TRAVERSALS traversals.
+    """
+    inputs = synthesize_input(domains)
+    target = compiled.path_to(index)
+    goal = len(target) + 1
+    best = _progress(compiled, inputs, target)
+    if best == goal:
+        return inputs
+
+    # Fields the analysis left free, read by conditions on the path or by
+    # earlier siblings of its nodes
+    fields = set()
+    constants = []
+    for node in target[:-1]:
+        for child in compiled.iter_children(node):
+            condition = compiled.conditions[child]
+            if condition is not None and condition.code is not None:
+                reads = condition_reads(condition.source)
+                fields |= reads.fields
+                constants.extend(reads.constants)
+    # Distinct by type too: True == 1 and 1.0 == 1, but conditions can tell them apart
+    candidates = list({(type(value), value): value for value in _FIT_VALUES + tuple(constants)}.values())
+
+    budget = MAX_FIT_TRAVERSALS
+    for field in sorted(fields - domains.keys()):
+        for value in candidates:
+            if budget == 0:
+                return None
+            budget -= 1
+            trial = dict(inputs)
+            trial[field] = value
+            progress = _progress(compiled, trial, target)
+            if progress > best:
+                inputs, best = trial, progress
+                if best == goal:
+                    return inputs
+    return None
+
+
+def path_entry(compiled: CompiledTree, index: int, domains: Domains) -> Dict[str, Any]:
+    inputs = fit_input(compiled, domains, index)
+    return {
+        "index": index,
+        "qualified_id": compiled.qualified_ids[index],
+        "leaf": compiled.first_child[index] < 0,
+        "path": [compiled.node_ids[step] for step in compiled.path_to(index)],
+        "constraints": [{"field": field, **domains[field].describe()} for field in sorted(domains)],
+        # The unverified guess when no input was found
+        "input_values": synthesize_input(domains) if inputs is None else inputs,
+        "verified": inputs is not None,
+    }
+
+
+def path_page(compiled: CompiledTree, offset: int, limit: int, inner_ends: bool = False) -> Dict[str, Any]:
+    """
+    Paths `offset` to `offset + limit`, each with its constraints and an
+    input for it. Earlier paths are enumerated again to skip them, but
+    nothing past the page is.
+    """
+    page = list(islice(iter_paths(compiled, inner_ends), offset, offset + limit + 1))
+    return {
+        "offset": offset,
+        "limit": limit,
+        "next_offset": offset + limit if len(page) > limit else None,
+        "paths": [path_entry(compiled, index, domains) for index, domains in page[:limit]],
+    }
+
+
+def test_inputs(compiled: CompiledTree, limit: int, inner_ends: bool = False) -> Dict[str, Any]:
+    """
+    One verified input per path, for up to `limit` paths, named by the
+    qualified id of the node it ends at: the `sample_inputs` format. Paths
+    no input could be found for are listed under `uncovered`.
+    """
+    qualified_ids = compiled.qualified_ids
+    sample_inputs = []
+    uncovered = []
+    paths = iter_paths(compiled, inner_ends)
+    for index, domains in islice(paths, limit):
+        inputs = fit_input(compiled, domains, index)
+        if inputs is not None:
+            sample_inputs.append({"name": qualified_ids[index], "input_values": inputs})
+        else:
+            uncovered.append(qualified_ids[index])
+    return {
+        "sample_inputs": sample_inputs,
+        "uncovered": uncovered,
+        "truncated": next(paths, None) is not None,
+    }
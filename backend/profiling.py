@@ -0,0 +1,164 @@
+"""
+Opt-in per-node profiling of tree traversals.
+
+A TreeProfile counts, for every node of a compiled tree, how often its
+condition was evaluated, how often it matched or raised, and the time spent
+evaluating it. Profiled traversals check siblings one by one, without the
+lookup tables of `dispatch.py` or the subtree cache, so every condition gets
+its own numbers; results are the same as an ordinary traversal.
+
+Profiling is enabled per registered tree; trees that are not being profiled
+pay nothing beyond one dict lookup per request.
+"""
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional
+
+from compiled import CompiledTree, WrappedTree
+
+
+# How many trees may be profiled at once
+DEFAULT_PROFILE_LIMIT = 32
+
+
+class TreeProfile:
+    """
+    Accumulated per-node statistics for one compiled tree.
+    """
+
+    def __init__(self, compiled: CompiledTree):
+        self.compiled = compiled
+        count = len(compiled)
+        self.traversals = 0
+        self.visits = array("q", bytes(8 * count))
+        self.evaluations = array("q", bytes(8 * count))
+        self.matches = array("q", bytes(8 * count))
+        self.errors = array("q", bytes(8 * count))
+        self.time_ns = array("q", bytes(8 * count))
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def traversal(self) -> "ProfiledTree":
+        return ProfiledTree(self)
+
+    def record(self, path: List[int], evaluated: List[tuple]) -> None:
+        """
+        Add one traversal: the visited indices and (index, matched, failed,
+        nanoseconds) for every condition evaluated.
+        """
+        with self._lock:
+            self.traversals += 1
+            for index in path:
+                self.visits[index] += 1
+            for index, matched, failed, elapsed in evaluated:
+                self.evaluations[index] += 1
+                self.matches[index] += matched
+                self.errors[index] += failed
+                self.time_ns[index] += elapsed
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Per-node statistics, slowest conditions (by total time) first.
+        """
+        nodes = self.compiled.nodes
+        with self._lock:
+            rows = []
+            for index in self.compiled.preorder():
+                node = nodes[index]
+                evaluations = self.evaluations[index]
+                rows.append({
+                    "node_id": node.node_id,
+                    "condition": node.condition or None,
+                    "visits": self.visits[index],
+                    "evaluations": evaluations,
+                    "matches": self.matches[index],
+                    "errors": self.errors[index],
+                    "match_rate": self.matches[index] / evaluations if evaluations else None,
+                    "total_time_us": self.time_ns[index] / 1000,
+                    "mean_time_us": self.time_ns[index] / 1000 / evaluations if evaluations else None,
+                })
+            traversals = self.traversals
+        rows.sort(key=lambda row: row["total_time_us"], reverse=True)
+        return {
+            "traversals": traversals,
+            "profiling_seconds": time.time() - self.started,
+            "nodes": rows,
+        }
+
+
+class ProfiledTree(WrappedTree):
+    """
+    Traverses a compiled tree while recording into a TreeProfile.
+    """
+
+    __slots__ = ("profile",)
+
+    def __init__(self, profile: TreeProfile):
+        super().__init__(profile.compiled)
+        self.profile = profile
+
+    def traverse_indices(self, namespace: Dict[str, Any]) -> List[int]:
+        compiled = self.compiled
+        first_child = compiled.first_child
+        next_sibling = compiled.next_sibling
+        conditions = compiled.conditions
+        clock = time.perf_counter_ns
+
+        path = [0]
+        evaluated = []
+        current = 0
+        while True:
+            child = first_child[current]
+            while child >= 0:
+                condition = conditions[child]
+                if condition is None:
+                    break
+                started = clock()
+                matched, error = condition.outcome(namespace)
+                evaluated.append((child, matched, error is not None, clock() - started))
+                if matched:
+                    break
+                child = next_sibling[child]
+            if child < 0:
+                break
+            path.append(child)
+            current = child
+
+        self.profile.record(path, evaluated)
+        return path
+
+
+class TreeProfiles:
+    """
+    The registered trees currently being profiled, by tree id.
+    """
+
+    def __init__(self, limit: int = DEFAULT_PROFILE_LIMIT):
+        self.limit = limit
+        self._profiles: Dict[str, TreeProfile] = {}
+        self._lock = threading.Lock()
+
+    def start(self, tree_id: str, compiled: CompiledTree) -> TreeProfile:
+        """
+        Start (or restart, from zero) profiling a tree.
+        """
+        with self._lock:
+            if tree_id not in self._profiles and len(self._profiles) >= self.limit:
+                raise ValueError(f"at most {self.limit} trees can be profiled at once")
+            profile = self._profiles[tree_id] = TreeProfile(compiled)
+            return profile
+
+    def stop(self, tree_id: str) -> Optional[TreeProfile]:
+        with self._lock:
+            return self._profiles.pop(tree_id, None)
+
+    def get(self, tree_id: str) -> Optional[TreeProfile]:
+        return self._profiles.get(tree_id)
+
+    def info(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._profiles), "limit": self.limit}
+
+
+tree_profiles = TreeProfiles()
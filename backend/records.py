@@ -0,0 +1,228 @@
+"""
+Lightweight tree decoding for the compact endpoints.
+
+Validating a large tree through the recursive pydantic `Node` model costs far
+more than traversing it. `decode_tree` checks the same shape (node_id and
+text strings, optional condition string, children list) in one iterative pass
+over the parsed JSON and builds slotted NodeRecord objects, which
+`compile_tree` accepts in place of `Node`.
+
+The json module parses recursively and gives up on trees nested about a
+thousand levels deep. `decode_object` then parses the body again with
+`loads`, which keeps open objects and arrays on a stack instead.
+"""
+import json
+import re
+from json.decoder import scanstring
+from json.scanner import NUMBER_RE
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+
+class TreeDecodeError(ValueError):
+    """
+    Raised when a request body does not have the shape of a tree payload.
+    """
+
+
+class NodeRecord:
+    """
+    A tree node with the fields of `models.Node`, without validation overhead.
+    """
+
+    __slots__ = ("node_id", "text", "condition", "children")
+
+    def __init__(self, node_id: str, text: str, condition: Optional[str], children: List["NodeRecord"]):
+        self.node_id = node_id
+        self.text = text
+        self.condition = condition
+        self.children = children
+
+    def summary(self) -> Dict[str, str]:
+        return {"node_id": self.node_id, "text": self.text}
+
+
+# A node's location is "tree.root" or (parent location, index among children);
+# it is only rendered as text when reporting an error
+Location = Union[str, Tuple[Any, int]]
+
+
+def _where(location: Location) -> str:
+    positions = []
+    while not isinstance(location, str):
+        location, position = location
+        positions.append(f".children[{position}]")
+    return location + "".join(reversed(positions))
+
+
+def _field(data: Dict[str, Any], name: str, location: Location, optional: bool = False) -> Optional[str]:
+    value = data.get(name)
+    if value is None and optional:
+        return None
+    if not isinstance(value, str):
+        raise TreeDecodeError(f"{_where(location)}.{name}: expected a string")
+    return value
+
+
+def decode_node(data: Any, location: str = "root") -> NodeRecord:
+    """
+    Build NodeRecords from a parsed JSON node. Uses an explicit stack, so deep
+    trees do not hit the recursion limit.
+    """
+    # (parsed node, its location, list to append its record to)
+    root: List[NodeRecord] = []
+    stack: List[Tuple[Any, Location, List[NodeRecord]]] = [(data, location, root)]
+    while stack:
+        data, location, siblings = stack.pop()
+        if not isinstance(data, dict):
+            raise TreeDecodeError(f"{_where(location)}: expected an object")
+        children = data.get("children", [])
+        if not isinstance(children, list):
+            raise TreeDecodeError(f"{_where(location)}.children: expected a list")
+
+        record = NodeRecord(
+            _field(data, "node_id", location),
+            _field(data, "text", location),
+            _field(data, "condition", location, optional=True),
+            [],
+        )
+        siblings.append(record)
+        # Pushed in reverse so children are decoded, and appended, in order
+        for position in range(len(children) - 1, -1, -1):
+            stack.append((children[position], (location, position), record.children))
+    return root[0]
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_NUMBER = re.compile(NUMBER_RE.pattern)
+_CONSTANTS = {
+    "null": None,
+    "true": True,
+    "false": False,
+    "NaN": float("nan"),
+    "Infinity": float("inf"),
+    "-Infinity": float("-inf"),
+}
+
+
+def _skip(text: str, position: int) -> int:
+    return _WHITESPACE.match(text, position).end()
+
+
+def _key(text: str, position: int) -> Tuple[str, int]:
+    # The key and ':' of an object member starting at `position`
+    if text[position:position + 1] != '"':
+        raise json.JSONDecodeError("Expecting property name enclosed in double quotes", text, position)
+    key, position = scanstring(text, position + 1)
+    position = _skip(text, position)
+    if text[position:position + 1] != ":":
+        raise json.JSONDecodeError("Expecting ':' delimiter", text, position)
+    return key, _skip(text, position + 1)
+
+
+def loads(body: Union[str, bytes]) -> Any:
+    """
+    Parse JSON like `json.loads`, to any depth. Objects and arrays still
+    being parsed are kept on a stack rather than in nested calls. Slower
+    than `json.loads`; only used once that has given up.
+    """
+    text = body if isinstance(body, str) else body.decode(json.detect_encoding(body), "surrogatepass")
+    # The open containers, each with the key its next value goes under
+    stack: List[Tuple[Union[Dict[str, Any], List[Any]], Optional[str]]] = []
+    position = _skip(text, 0)
+    while True:
+        char = text[position:position + 1]
+        if char == "{":
+            position = _skip(text, position + 1)
+            if text[position:position + 1] != "}":
+                key, position = _key(text, position)
+                stack.append(({}, key))
+                continue
+            value, position = {}, position + 1
+        elif char == "[":
+            position = _skip(text, position + 1)
+            if text[position:position + 1] != "]":
+                stack.append(([], None))
+                continue
+            value, position = [], position + 1
+        elif char == '"':
+            value, position = scanstring(text, position + 1)
+        else:
+            for name, constant in _CONSTANTS.items():
+                if text.startswith(name, position):
+                    value, position = constant, position + len(name)
+                    break
+            else:
+                match = _NUMBER.match(text, position)
+                if match is None:
+                    raise json.JSONDecodeError("Expecting value", text, position)
+                integer, fraction, exponent = match.groups()
+                value = float(integer + (fraction or "") + (exponent or "")) if fraction or exponent else int(integer)
+                position = match.end()
+
+        # Add the value to its container, closing every container it completes
+        while True:
+            position = _skip(text, position)
+            if not stack:
+                if position != len(text):
+                    raise json.JSONDecodeError("Extra data", text, position)
+                return value
+            container, key = stack[-1]
+            if isinstance(container, list):
+                container.append(value)
+                close = "]"
+            else:
+                container[key] = value
+                close = "}"
+            char = text[position:position + 1]
+            if char == ",":
+                position = _skip(text, position + 1)
+                if close == "}":
+                    key, position = _key(text, position)
+                    stack[-1] = (container, key)
+                break
+            if char != close:
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, position)
+            stack.pop()
+            value, position = container, position + 1
+
+
+def decode_object(body: Union[str, bytes]) -> Dict[str, Any]:
+    try:
+        try:
+            data = json.loads(body)
+        except RecursionError:
+            data = loads(body)
+    except ValueError as e:
+        raise TreeDecodeError(f"invalid JSON: {e}")
+    if not isinstance(data, dict):
+        raise TreeDecodeError("expected a JSON object")
+    return data
+
+
+def _object_list(value: Any, location: str) -> List[Dict[str, Any]]:
+    if not isinstance(value, list) or not all(isinstance(row, dict) for row in value):
+        raise TreeDecodeError(f"{location}: expected a list of objects")
+    return value
+
+
+def decode_tree(data: Any) -> Tuple[NodeRecord, List[Dict[str, Any]]]:
+    """
+    Decode a parsed `DecisionTree` payload into its root record and sample inputs.
+    """
+    if not isinstance(data, dict):
+        raise TreeDecodeError("tree: expected an object")
+    if "root" not in data:
+        raise TreeDecodeError("tree.root: field required")
+    sample_inputs = _object_list(data.get("sample_inputs", []), "tree.sample_inputs")
+    return decode_node(data["root"], "tree.root"), sample_inputs
+
+
+def decode_input_values(data: Dict[str, Any]) -> Dict[str, Any]:
+    value = data.get("input_values", {})
+    if not isinstance(value, dict):
+        raise TreeDecodeError("input_values: expected an object")
+    return value
+
+
+def decode_sample_inputs(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return _object_list(data.get("sample_inputs", []), "sample_inputs")
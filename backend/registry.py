@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from models import DecisionTree
+from compiled import CompiledTree, compile_tree
+from lru import LRUCache
+from memo import subtree_cache
+from patches import Operation, apply_patch
+
+
+# How many compiled trees to keep in memory per worker
+DEFAULT_REGISTRY_SIZE = 256
+
+
+def tree_id_for(compiled: CompiledTree, tree: DecisionTree) -> str:
+    """
+    Content address of a tree: its root subtree digest combined with a digest
+    of its sample inputs.
+    """
+    samples = json.dumps(tree.sample_inputs, sort_keys=True, default=str).encode("utf-8")
+    h = hashlib.sha256(compiled.root_digest())
+    h.update(hashlib.sha256(samples).digest())
+    return h.hexdigest()[:32]
+
+
+class RegisteredTree:
+    """
+    A validated tree and its compiled form, as held by the registry.
+    `persisted` is False while a patched tree exists only in memory.
+    """
+
+    __slots__ = ("tree_id", "tree", "compiled", "persisted")
+
+    def __init__(self, tree_id: str, tree: DecisionTree, compiled: CompiledTree, persisted: bool = True):
+        self.tree_id = tree_id
+        self.tree = tree
+        self.compiled = compiled
+        self.persisted = persisted
+
+
+class TreeRegistry(LRUCache):
+    """
+    Content-addressed store of registered trees.
+
+    Holds at most `maxsize` compiled trees in memory, evicting the least
+    recently used. When `storage_dir` is set, every registered tree is also
+    written there as JSON, and trees missing from memory are reloaded from it,
+    so the registry survives restarts and evictions. Trees made by `patch`
+    are only written when evicted or on `flush`, since an editor may send a
+    patch per keystroke.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_REGISTRY_SIZE, storage_dir: Optional[str] = None):
+        super().__init__(maxsize)
+        self.storage_dir = storage_dir
+
+        if storage_dir:
+            os.makedirs(storage_dir, exist_ok=True)
+
+    def register(self, tree: DecisionTree) -> RegisteredTree:
+        """
+        Compile and store a tree, returning its entry. Registering the same
+        content twice returns the existing entry.
+        """
+        compiled = compile_tree(tree.root)
+        tree_id = tree_id_for(compiled, tree)
+
+        existing = self.get(tree_id)
+        if existing is not None:
+            return existing
+
+        entry = RegisteredTree(tree_id, tree, compiled)
+        self._store(entry)
+        if self.storage_dir:
+            self._persist(entry)
+        return entry
+
+    def patch(self, entry: RegisteredTree, operations: Sequence[Operation]) -> Tuple[RegisteredTree, List[int], bool]:
+        """
+        Register `entry`'s tree with `operations` applied. Returns the new
+        entry, plus the added nodes' indices and whether the tree was
+        renumbered, as from `patches.apply_patch`. The original entry is
+        left as it is.
+        """
+        compiled, added, renumbered = apply_patch(entry.compiled, operations)
+        tree = entry.tree.model_copy(update={"root": compiled.root})
+        tree_id = tree_id_for(compiled, tree)
+
+        existing = self.get(tree_id)
+        if existing is not None:
+            # Same content, e.g. after an undo, but maybe laid out differently
+            order = list(compiled.preorder())
+            existing_order = list(existing.compiled.preorder())
+            if order != existing_order:
+                position = {index: place for place, index in enumerate(order)}
+                added = [existing_order[position[index]] if index >= 0 else -1 for index in added]
+                renumbered = True
+            return existing, added, renumbered
+
+        patched = RegisteredTree(tree_id, tree, compiled, persisted=not self.storage_dir)
+        self._store(patched)
+        return patched, added, renumbered
+
+    def flush(self) -> None:
+        """
+        Write every patched tree still only held in memory.
+        """
+        pending = [entry for entry in self.values() if not entry.persisted]
+        for entry in pending:
+            self._persist(entry)
+
+    def get(self, tree_id: str) -> Optional[RegisteredTree]:
+        """
+        Return the entry for `tree_id`, reloading it from disk if it was
+        evicted, or None if the tree is unknown.
+        """
+        entry = self.lookup(tree_id)
+        if entry is not None:
+            return entry
+
+        tree = self._load(tree_id)
+        if tree is None:
+            return None
+
+        entry = RegisteredTree(tree_id, tree, compile_tree(tree.root))
+        self._store(entry)
+        return entry
+
+    def entries(self) -> List[RegisteredTree]:
+        """
+        The entries held in memory, least recently used first.
+        """
+        return self.values()
+
+    def preload(self, entries: Iterable[RegisteredTree]) -> int:
+        """
+        Hold `entries`, already stored, in memory as if just looked up.
+        Stops when the registry is full rather than evicting anything.
+        Returns how many were added.
+        """
+        added = 0
+        with self._lock:
+            for entry in entries:
+                if len(self._entries) >= self.maxsize:
+                    break
+                if entry.tree_id not in self._entries:
+                    self._entries[entry.tree_id] = entry
+                    added += 1
+        return added
+
+    def preload_stored(self) -> int:
+        """
+        Load trees from `storage_dir` into memory, most recently written
+        first, until the registry is full. Returns how many were loaded.
+        """
+        if not self.storage_dir:
+            return 0
+        stored = []
+        with os.scandir(self.storage_dir) as it:
+            for item in it:
+                tree_id, extension = os.path.splitext(item.name)
+                if extension == ".json" and tree_id.isalnum():
+                    stored.append((item.stat().st_mtime, tree_id))
+        stored.sort(reverse=True)
+
+        with self._lock:
+            room = self.maxsize - len(self._entries)
+            wanted = [tree_id for _, tree_id in stored if tree_id not in self._entries][:room]
+        entries = []
+        for tree_id in wanted:
+            tree = self._load(tree_id)
+            if tree is not None:
+                entries.append(RegisteredTree(tree_id, tree, compile_tree(tree.root)))
+        # Least recently written first, so the newest end up most recently used
+        return self.preload(reversed(entries))
+
+    def _store(self, entry: RegisteredTree) -> None:
+        for evicted, evicted_entry in self.store(entry.tree_id, entry):
+            # Its memoized subtree results go with it
+            subtree_cache.invalidate(evicted)
+            if not evicted_entry.persisted:
+                self._persist(evicted_entry)
+
+    def _path(self, tree_id: str) -> str:
+        return os.path.join(self.storage_dir, f"{tree_id}.json")
+
+    def _persist(self, entry: RegisteredTree) -> None:
+        # Write to a temporary file first so a crash never leaves a torn tree
+        path = self._path(entry.tree_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(entry.tree.model_dump_json())
+        os.replace(tmp_path, path)
+        entry.persisted = True
+
+    def _load(self, tree_id: str) -> Optional[DecisionTree]:
+        # Ids are hex digests; anything else cannot name a stored tree
+        if not self.storage_dir or not tree_id.isalnum():
+            return None
+        try:
+            with open(self._path(tree_id), encoding="utf-8") as f:
+                return DecisionTree.model_validate_json(f.read())
+        except FileNotFoundError:
+            return None
+
+
+tree_registry = TreeRegistry(
+    maxsize=int(os.environ.get("TREEJACK_REGISTRY_SIZE", DEFAULT_REGISTRY_SIZE)),
+    storage_dir=os.environ.get("TREEJACK_REGISTRY_DIR") or None,
+)
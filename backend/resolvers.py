@@ -0,0 +1,200 @@
+"""
+Async traversal with fields fetched on demand.
+
+Some conditions need features that are not in the request but can be looked
+up, e.g. from a feature store. `traverse_async` walks a compiled tree from an
+`async def` handler. Before choosing among a node's children, it finds the
+input fields their conditions read that the request does not have. It then
+fetches all of them at once, with each resolver called concurrently for its
+share. Fields are never fetched for branches the traversal does not reach.
+Values are cached per request, so a field is looked up at most once per
+traversal.
+
+A field no resolver can provide stays missing, with the usual meaning for
+conditions that read it.
+"""
+import asyncio
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Collection, Dict, List, Optional, Sequence, Tuple, Union
+
+from compiled import CompiledTree
+from conditions import input_namespace
+from memo import condition_fields
+
+
+class Resolver(ABC):
+    """
+    Fetches values for input fields. Subclasses implement `resolve`.
+
+    `fields` limits which fields the resolver is asked for (None means any);
+    `timeout` bounds each call, in seconds.
+    """
+
+    fields: Optional[Collection[str]] = None
+    timeout: Optional[float] = None
+
+    def provides(self, name: str) -> bool:
+        return self.fields is None or name in self.fields
+
+    @abstractmethod
+    async def resolve(self, names: Sequence[str], inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Return values for whichever of `names` this resolver knows. `inputs`
+        holds the request's fields (and anything resolved so far), e.g. for
+        an entity id to look features up by.
+        """
+
+
+class StubResolver(Resolver):
+    """
+    In-process resolver for tests and local runs: serves fields from a dict,
+    or from a function of the inputs, after an optional simulated delay.
+    """
+
+    def __init__(
+        self,
+        values: Union[Dict[str, Any], Callable[[Dict[str, Any]], Dict[str, Any]]],
+        delay: float = 0.0,
+        fields: Optional[Collection[str]] = None,
+    ):
+        self.values = values
+        self.delay = delay
+        self.fields = fields if fields is not None else (set(values) if isinstance(values, dict) else None)
+        self.calls: List[Tuple[str, ...]] = []
+
+    async def resolve(self, names: Sequence[str], inputs: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls.append(tuple(names))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        values = self.values(inputs) if callable(self.values) else self.values
+        return {name: values[name] for name in names if name in values}
+
+
+class RequestFeatures:
+    """
+    One request's inputs plus everything resolved for it. The dict is a copy
+    the resolvers fill in; the caller's inputs are left untouched.
+    """
+
+    def __init__(self, inputs: Dict[str, Any], resolvers: Sequence[Resolver]):
+        self.values = dict(inputs)
+        self.resolvers = list(resolvers)
+        self.resolved: Dict[str, Any] = {}
+        self.errors: Dict[str, str] = {}
+        self._attempted: set = set()
+
+    async def ensure(self, names: Sequence[str]) -> None:
+        """
+        Fetch whichever of `names` are missing and not yet attempted.
+        """
+        wanted = [name for name in names if name not in self.values and name not in self._attempted]
+        if not wanted:
+            return
+        self._attempted.update(wanted)
+
+        batches: Dict[int, List[str]] = {}
+        for name in wanted:
+            for position, resolver in enumerate(self.resolvers):
+                if resolver.provides(name):
+                    batches.setdefault(position, []).append(name)
+                    break
+        if not batches:
+            return
+
+        calls = [self._call(self.resolvers[position], names) for position, names in batches.items()]
+        for found in await asyncio.gather(*calls):
+            for name, value in found.items():
+                self.values[name] = value
+                self.resolved[name] = value
+
+    async def _call(self, resolver: Resolver, names: List[str]) -> Dict[str, Any]:
+        try:
+            found = await asyncio.wait_for(resolver.resolve(names, dict(self.values)), resolver.timeout)
+        except Exception as e:
+            # A failed lookup leaves its fields missing
+            message = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            for name in names:
+                self.errors[name] = message
+            return {}
+        return {name: value for name, value in found.items() if name in names}
+
+
+# Fields read by each node's children's conditions, per compiled tree
+_plans: "weakref.WeakKeyDictionary[CompiledTree, List[Optional[Tuple[str, ...]]]]" = weakref.WeakKeyDictionary()
+_plans_lock = threading.Lock()
+
+
+def child_fields(compiled: CompiledTree) -> List[Optional[Tuple[str, ...]]]:
+    """
+    For each node, the input fields its children's conditions read, or None
+    when they read none. Fields read in ways we cannot see (e.g. getattr)
+    are not included; those read as missing.
+    """
+    with _plans_lock:
+        plan = _plans.get(compiled)
+    if plan is not None:
+        return plan
+
+    plan = []
+    for index in range(len(compiled)):
+        fields = set()
+        for child in compiled.children_of(index):
+            fields |= condition_fields(compiled.conditions[child]) or frozenset()
+        plan.append(tuple(sorted(fields)) or None)
+    with _plans_lock:
+        _plans[compiled] = plan
+    return plan
+
+
+async def traverse_async(
+    compiled: CompiledTree,
+    inputs: Dict[str, Any],
+    resolvers: Sequence[Resolver],
+) -> Tuple[List[int], RequestFeatures]:
+    """
+    Traverse `compiled` for `inputs`, resolving missing fields level by level.
+    Returns the visited indices and the request's features (what was
+    resolved, and which lookups failed).
+    """
+    features = RequestFeatures(inputs, resolvers)
+    namespace = input_namespace(features.values)
+    plan = child_fields(compiled)
+
+    path = [0]
+    node = 0
+    while True:
+        fields = plan[node]
+        if fields is not None and resolvers:
+            await features.ensure(fields)
+        # Runs synchronously until it enters a node whose children need fields
+        node = compiled.descend(namespace, node, path, plan)
+        if node < 0:
+            return path, features
+
+
+class ResolverRegistry:
+    """
+    The resolvers the async endpoints use, in priority order: a field goes
+    to the first resolver that provides it.
+    """
+
+    def __init__(self):
+        self._resolvers: List[Resolver] = []
+        self._lock = threading.Lock()
+
+    def register(self, resolver: Resolver) -> None:
+        with self._lock:
+            self._resolvers.append(resolver)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._resolvers = []
+
+    def resolvers(self) -> List[Resolver]:
+        with self._lock:
+            return list(self._resolvers)
+
+
+feature_resolvers = ResolverRegistry()
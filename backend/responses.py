@@ -0,0 +1,95 @@
+"""
+Faster JSON responses.
+
+FastAPI normally turns a returned model into plain Python objects and then
+encodes those with the json module. For large trees that dominates request
+time. Here, pydantic models are serialized straight to bytes by pydantic's
+own serializer, other payloads go through orjson when it is installed, and
+static payloads are encoded once and served with an ETag.
+
+orjson is optional; without it the json module is used.
+"""
+import hashlib
+import json
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Encode plain JSON content (dicts, lists, strings, numbers) to bytes.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(content)
+        except TypeError:
+            # Integers beyond 64 bits, non-string keys and the like
+            pass
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse for content that is already plain JSON data, rendered
+    with orjson when available.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def model_response(model: BaseModel, exclude_none: bool = False) -> Response:
+    """
+    A response with the model serialized directly to JSON bytes.
+    """
+    return Response(model.model_dump_json(exclude_none=exclude_none), media_type="application/json")
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class CachedJSON:
+    """
+    A payload that never changes, encoded once. Clients that send back the
+    ETag in If-None-Match get a 304 with no body.
+    """
+
+    def __init__(self, content: Any):
+        if isinstance(content, BaseModel):
+            self.body = content.model_dump_json().encode("utf-8")
+        else:
+            self.body = dumps(_plain(content))
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+
+    def response(self, request: Request) -> Response:
+        # no-cache: clients may keep the body but must revalidate before reuse
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(self.body, media_type="application/json", headers=headers)
+
+
+def _plain(content: Any) -> Any:
+    # Models nested in dicts or lists, as in example_trees
+    if isinstance(content, BaseModel):
+        return content.model_dump(mode="json")
+    if isinstance(content, dict):
+        return {key: _plain(value) for key, value in content.items()}
+    if isinstance(content, list):
+        return [_plain(value) for value in content]
+    return content
@@ -0,0 +1,764 @@
+"""
+Restricted evaluation of condition expressions.
+
+Conditions are not passed to eval(). Their syntax tree is compiled into
+nested Python closures, and only a whitelisted subset is accepted:
+- field reads (`input.<field>`), constants, and list, tuple, set and dict
+  displays
+- comparisons, including `in`, `not in`, `is` and chains
+- `and`, `or`, `not` and conditional expressions
+- arithmetic and bitwise operators, subscripts and slices
+- calls to the builtins in ALLOWED_BUILTINS and the string, list and dict
+  methods in ALLOWED_METHODS
+Anything else (other names and attributes, lambdas, comprehensions,
+f-strings) is rejected when the condition is compiled. The condition is
+then invalid: always False, with the reason reported.
+
+Each evaluation has bounded cost. Without loops, MAX_NODES bounds how many
+operations one evaluation runs. Operations whose cost depends on their
+operands are checked before they run:
+- integers are capped at MAX_INT_BITS
+- strings and sequences they build are capped at MAX_SEQUENCE_LENGTH, as
+  is the text of str() and % formatting, and the constants folded when a
+  condition is compiled
+- sequences scanned by builtins, methods and membership tests are charged
+  against MAX_STEPS per evaluation
+A request's time budget (see `time_budget`) is checked between rows and by
+every charged operation.
+
+Each closure applies the same Python operation eval() would, so results
+and error messages are unchanged. Common forms get closures of their own;
+`input.age >= 18`, for one, is a single call that reads the field and
+compares.
+"""
+import ast
+import operator
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+# Syntax tree nodes in one condition
+MAX_NODES = 512
+
+# Largest integer an operation may produce
+MAX_INT_BITS = 4096
+
+# Longest string, list or tuple an operation may produce
+MAX_SEQUENCE_LENGTH = 1_000_000
+
+# Elements scanned per evaluation, by builtins, methods and membership tests
+MAX_STEPS = 1_000_000
+
+# Seconds a request may spend; 0 turns the budget off
+DEFAULT_REQUEST_BUDGET = 30.0
+
+
+class ConditionValidationError(ValueError):
+    """
+    Raised when a condition string parses but uses a construct we refuse to run.
+    """
+
+
+class EvaluationLimitError(Exception):
+    """
+    Raised when one evaluation would exceed a size or step limit. Like any
+    other evaluation error, it makes the condition False.
+    """
+
+
+class BudgetExceeded(Exception):
+    """
+    Raised when a request runs past its time budget. Unlike evaluation
+    errors, it is not turned into False: it aborts the request.
+    """
+
+
+# A compiled expression: input values -> value
+Evaluator = Callable[[Dict[str, Any]], Any]
+
+
+# Time budget of the current request
+
+class Budget:
+    __slots__ = ("seconds", "deadline")
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.renew()
+
+    def renew(self) -> None:
+        self.deadline = time.perf_counter() + self.seconds
+
+
+_budget: ContextVar[Optional[Budget]] = ContextVar("treejack_budget", default=None)
+
+
+@contextmanager
+def time_budget(seconds: float) -> Iterator[None]:
+    """
+    Give the code run inside `seconds` to finish; 0 means no limit.
+    """
+    token = _budget.set(Budget(seconds) if seconds > 0 else None)
+    try:
+        yield
+    finally:
+        _budget.reset(token)
+
+
+def check_budget() -> None:
+    """
+    Raise BudgetExceeded if the current request is out of time.
+    """
+    budget = _budget.get()
+    if budget is not None and time.perf_counter() > budget.deadline:
+        raise BudgetExceeded(f"request exceeded its time budget of {budget.seconds:g} s")
+
+
+def renew_budget() -> None:
+    """
+    Start the current budget over, for work done in independent units such
+    as the rows of a stream.
+    """
+    budget = _budget.get()
+    if budget is not None:
+        budget.renew()
+
+
+class TimeBudgetMiddleware:
+    """
+    Runs every HTTP request under `time_budget(seconds)`. Endpoints run in
+    worker threads get a copy of the context, so the budget goes with them.
+    """
+
+    def __init__(self, app: ASGIApp, seconds: float = DEFAULT_REQUEST_BUDGET):
+        self.app = app
+        self.seconds = seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.seconds <= 0:
+            await self.app(scope, receive, send)
+            return
+        with time_budget(self.seconds):
+            await self.app(scope, receive, send)
+
+
+request_budget_seconds = float(os.environ.get("TREEJACK_REQUEST_BUDGET", DEFAULT_REQUEST_BUDGET))
+
+
+# Step metering within one evaluation
+
+_meter = threading.local()
+
+
+def _charge(steps: int) -> None:
+    left = _meter.steps - steps
+    _meter.steps = left
+    if left < 0:
+        raise EvaluationLimitError(f"condition exceeded {MAX_STEPS} steps")
+    check_budget()
+
+
+def _size(value: Any) -> int:
+    return len(value) if isinstance(value, (str, list, tuple, dict, set, frozenset)) else 0
+
+
+# Checked operations
+
+def _int_limit(bits: int) -> None:
+    if bits > MAX_INT_BITS:
+        raise EvaluationLimitError(f"integer result would exceed {MAX_INT_BITS} bits")
+
+
+def _length_limit(length: int) -> None:
+    if length > MAX_SEQUENCE_LENGTH:
+        raise EvaluationLimitError(f"result would exceed {MAX_SEQUENCE_LENGTH} items")
+
+
+def _total_size(value: Any) -> int:
+    # Items in `value` and in every sequence it holds, however deep; a list
+    # repeated n times holds its items' items n times over. Stops counting
+    # past the limit, so it costs no more than building that much would
+    total = 0
+    stack = [value]
+    while stack and total <= MAX_SEQUENCE_LENGTH:
+        value = stack.pop()
+        if isinstance(value, str):
+            total += len(value)
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            total += len(value)
+            stack.extend(value)
+        elif isinstance(value, dict):
+            total += len(value)
+            stack.extend(value.keys())
+            stack.extend(value.values())
+    return total
+
+
+def _text_size(value: Any) -> int:
+    # At least len(repr(value)), for the values inputs and conditions hold;
+    # stops counting past the limit, as above
+    total = 0
+    stack = [value]
+    while stack and total <= MAX_SEQUENCE_LENGTH:
+        value = stack.pop()
+        if isinstance(value, str):
+            # Quotes, and escapes of up to ten characters (\U0001f600)
+            total += 2 + (2 * len(value) if value.isascii() and value.isprintable() else 10 * len(value))
+        elif isinstance(value, int):
+            total += value.bit_length() * 3 // 10 + 2
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            total += 2 + 2 * len(value)
+            stack.extend(value)
+        elif isinstance(value, dict):
+            total += 2 + 4 * len(value)
+            stack.extend(value.keys())
+            stack.extend(value.values())
+        else:
+            # Floats, None and the like
+            total += 32
+    return total
+
+
+def _multiply(left: Any, right: Any) -> Any:
+    if isinstance(left, int) and isinstance(right, int):
+        _int_limit(left.bit_length() + right.bit_length())
+    elif isinstance(left, (str, list, tuple)) and isinstance(right, int):
+        _length_limit(_total_size(left) * right)
+    elif isinstance(right, (str, list, tuple)) and isinstance(left, int):
+        _length_limit(_total_size(right) * left)
+    return left * right
+
+
+def _add(left: Any, right: Any) -> Any:
+    if isinstance(left, (str, list, tuple)) and isinstance(right, (str, list, tuple)):
+        _length_limit(len(left) + len(right))
+    return left + right
+
+
+def _power(left: Any, right: Any) -> Any:
+    if isinstance(left, int) and isinstance(right, int) and right > 0 and abs(left) > 1:
+        _int_limit(left.bit_length() * right)
+    return left ** right
+
+
+def _lshift(left: Any, right: Any) -> Any:
+    if isinstance(left, int) and isinstance(right, int) and right > 0 and left:
+        _int_limit(left.bit_length() + right)
+    return left << right
+
+
+# A printf-style conversion with a width or precision
+_SIZED_CONVERSION = re.compile(r"%(\([^)]*\))?[^a-zA-Z%(]*[0-9*]")
+
+
+def _modulo(left: Any, right: Any) -> Any:
+    if isinstance(left, str):
+        if _SIZED_CONVERSION.search(left):
+            # Widths and precisions can build arbitrarily long strings
+            raise EvaluationLimitError("string formatting with a width or precision is not allowed")
+        if isinstance(right, tuple):
+            # Each conversion formats one of the values
+            _length_limit(len(left) + _text_size(right))
+        else:
+            # Every conversion may format all of it, by key or whole
+            _length_limit(len(left) + left.count("%") * _text_size(right))
+    return left % right
+
+
+# Operators whose result size is at most the sum of their operands'; only
+# `+` can build sequences, and its result is checked too
+_BINARY = {
+    ast.Add: _add,
+    ast.Sub: operator.sub,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.RShift: operator.rshift,
+    ast.BitAnd: operator.and_,
+    ast.BitOr: operator.or_,
+    ast.BitXor: operator.xor,
+}
+
+_CHECKED_BINARY = {
+    ast.Mult: _multiply,
+    ast.Pow: _power,
+    ast.LShift: _lshift,
+    ast.Mod: _modulo,
+}
+
+_UNARY = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+    ast.Invert: operator.invert,
+    ast.Not: operator.not_,
+}
+
+_COMPARE = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+    ast.In: lambda left, right: left in right,
+    ast.NotIn: lambda left, right: left not in right,
+}
+
+
+_ORDERING = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+
+def _round(number: Any, ndigits: Any = None) -> Any:
+    if isinstance(ndigits, int) and abs(ndigits) > MAX_INT_BITS:
+        raise EvaluationLimitError("round() ndigits out of range")
+    return round(number) if ndigits is None else round(number, ndigits)
+
+
+def _str(value: Any = "") -> str:
+    if isinstance(value, (list, tuple, set, frozenset, dict)):
+        _length_limit(_text_size(value))
+    return str(value)
+
+
+ALLOWED_BUILTINS: Dict[str, Callable] = {
+    "len": len,
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "sum": sum,
+    "any": any,
+    "all": all,
+    "sorted": sorted,
+    "round": _round,
+    "int": int,
+    "float": float,
+    "str": _str,
+    "bool": bool,
+}
+
+ALLOWED_METHODS = frozenset([
+    # str
+    "lower", "upper", "casefold", "title", "capitalize", "swapcase",
+    "strip", "lstrip", "rstrip", "removeprefix", "removesuffix",
+    "startswith", "endswith", "find", "rfind", "count", "split", "rsplit",
+    "splitlines", "partition", "rpartition", "replace", "join",
+    "zfill", "center", "ljust", "rjust",
+    "isdigit", "isnumeric", "isdecimal", "isalpha", "isalnum", "isspace", "islower", "isupper",
+    # list and tuple
+    "index",
+    # dict
+    "get", "keys", "values", "items",
+])
+
+
+# Builtins and methods that take the same time whatever their arguments'
+# size; they are not charged steps
+_CONSTANT_TIME = frozenset(["len", "abs", "round", "int", "float", "bool", "get", "keys", "values", "items"])
+
+
+def _check_replace(receiver: Any, args: List[Any]) -> None:
+    if isinstance(receiver, str) and len(args) >= 2 and isinstance(args[0], str) and isinstance(args[1], str):
+        old, new = args[0], args[1]
+        count = len(receiver) + 1 if not old else receiver.count(old)
+        _length_limit(len(receiver) + count * max(len(new) - len(old), 0))
+
+
+def _check_width(receiver: Any, args: List[Any]) -> None:
+    if args and isinstance(args[0], int):
+        _length_limit(args[0])
+
+
+def _check_join(receiver: Any, args: List[Any]) -> None:
+    if isinstance(receiver, str) and len(args) == 1 and isinstance(args[0], (str, list, tuple, set, frozenset, dict)):
+        items = args[0]
+        joined = sum(len(item) for item in items if isinstance(item, str))
+        _length_limit(len(receiver) * max(len(items) - 1, 0) + joined)
+
+
+_METHOD_CHECKS = {
+    "replace": _check_replace,
+    "join": _check_join,
+    "zfill": _check_width,
+    "center": _check_width,
+    "ljust": _check_width,
+    "rjust": _check_width,
+}
+
+
+# Compilation
+
+def _read_field(name: str) -> Evaluator:
+    def read(values):
+        try:
+            return values[name]
+        except KeyError:
+            raise AttributeError(f"input has no field '{name}'") from None
+    return read
+
+
+def _compare_field(name: str, op: type, constant: Any) -> Evaluator:
+    # `input.<name> <op> <constant>`, the most common condition, in one call
+    message = f"input has no field '{name}'"
+    if op is ast.Eq:
+        def compare(values):
+            try:
+                return values[name] == constant
+            except KeyError:
+                raise AttributeError(message) from None
+    elif op is ast.NotEq:
+        def compare(values):
+            try:
+                return values[name] != constant
+            except KeyError:
+                raise AttributeError(message) from None
+    elif op is ast.Lt:
+        def compare(values):
+            try:
+                return values[name] < constant
+            except KeyError:
+                raise AttributeError(message) from None
+    elif op is ast.LtE:
+        def compare(values):
+            try:
+                return values[name] <= constant
+            except KeyError:
+                raise AttributeError(message) from None
+    elif op is ast.Gt:
+        def compare(values):
+            try:
+                return values[name] > constant
+            except KeyError:
+                raise AttributeError(message) from None
+    else:
+        def compare(values):
+            try:
+                return values[name] >= constant
+            except KeyError:
+                raise AttributeError(message) from None
+    return compare
+
+
+def _is_field(node: ast.AST) -> bool:
+    return isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "input"
+
+
+def _constant_items(node: ast.AST) -> Optional[tuple]:
+    # The elements of a list, tuple or set display made only of constants
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)) and all(isinstance(e, ast.Constant) for e in node.elts):
+        return tuple(e.value for e in node.elts)
+    return None
+
+
+class _Fold(ast.NodeTransformer):
+    """
+    Replaces operators on constants with their result, within the limits;
+    anything that raises is left to raise at evaluation time. The strings
+    it folds add up to MAX_SEQUENCE_LENGTH at most, as the compiled
+    condition keeps them; past that, they are built when evaluated.
+    """
+
+    def __init__(self):
+        self.folded = 0
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+        op = _BINARY.get(type(node.op)) or _CHECKED_BINARY.get(type(node.op))
+        if op is not None and isinstance(node.left, ast.Constant) and isinstance(node.right, ast.Constant):
+            try:
+                value = op(node.left.value, node.right.value)
+            except Exception:
+                return node
+            if isinstance(value, str):
+                if self.folded + len(value) > MAX_SEQUENCE_LENGTH:
+                    return node
+                self.folded += len(value)
+            if isinstance(value, (int, float, str)):
+                return ast.copy_location(ast.Constant(value), node)
+        return node
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> ast.AST:
+        self.generic_visit(node)
+        if isinstance(node.operand, ast.Constant) and not isinstance(node.op, ast.Not):
+            try:
+                value = _UNARY[type(node.op)](node.operand.value)
+            except Exception:
+                return node
+            return ast.copy_location(ast.Constant(value), node)
+        return node
+
+
+class _Compiler:
+    """
+    Turns a syntax tree into closures. `metered` is set when the result
+    charges steps, so each evaluation must start a new count.
+    """
+
+    def __init__(self):
+        self.metered = False
+
+    def compile(self, node: ast.AST) -> Evaluator:
+        method = getattr(self, "visit_" + type(node).__name__, None)
+        if method is None:
+            raise ConditionValidationError(f"{type(node).__name__} is not allowed in conditions")
+        return method(node)
+
+    def visit_Constant(self, node: ast.Constant) -> Evaluator:
+        value = node.value
+        if not isinstance(value, (int, float, str, type(None))):
+            raise ConditionValidationError(f"constant {value!r} is not allowed in conditions")
+        return lambda values: value
+
+    def visit_Name(self, node: ast.Name) -> Evaluator:
+        if node.id == "input":
+            raise ConditionValidationError("input can only be used as input.<field>")
+        raise ConditionValidationError(f"name '{node.id}' is not allowed in conditions")
+
+    def visit_Attribute(self, node: ast.Attribute) -> Evaluator:
+        if _is_field(node):
+            return _read_field(node.attr)
+        raise ConditionValidationError(f"attribute '{node.attr}' is not allowed in conditions")
+
+    def visit_List(self, node: ast.List) -> Evaluator:
+        items = _constant_items(node)
+        if items is not None:
+            # Nothing a condition can call mutates it, so it is built once
+            constant = list(items)
+            return lambda values: constant
+        elements = self.elements(node.elts)
+        return lambda values: [element(values) for element in elements]
+
+    def visit_Tuple(self, node: ast.Tuple) -> Evaluator:
+        items = _constant_items(node)
+        if items is not None:
+            return lambda values: items
+        elements = self.elements(node.elts)
+        return lambda values: tuple(element(values) for element in elements)
+
+    def visit_Set(self, node: ast.Set) -> Evaluator:
+        elements = self.elements(node.elts)
+        return lambda values: {element(values) for element in elements}
+
+    def visit_Dict(self, node: ast.Dict) -> Evaluator:
+        if any(key is None for key in node.keys):
+            raise ConditionValidationError("** is not allowed in conditions")
+        keys = self.elements(node.keys)
+        items = self.elements(node.values)
+        return lambda values: {key(values): item(values) for key, item in zip(keys, items)}
+
+    def elements(self, nodes: List[ast.AST]) -> List[Evaluator]:
+        if any(isinstance(node, ast.Starred) for node in nodes):
+            raise ConditionValidationError("* is not allowed in conditions")
+        return [self.compile(node) for node in nodes]
+
+    def visit_Subscript(self, node: ast.Subscript) -> Evaluator:
+        container = self.compile(node.value)
+        key = self.compile(node.slice)
+        return lambda values: container(values)[key(values)]
+
+    def visit_Slice(self, node: ast.Slice) -> Evaluator:
+        parts = [None if part is None else self.compile(part) for part in (node.lower, node.upper, node.step)]
+        return lambda values: slice(*[None if part is None else part(values) for part in parts])
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> Evaluator:
+        operand = self.compile(node.operand)
+        if isinstance(node.op, ast.Not):
+            return lambda values: not operand(values)
+        op = _UNARY[type(node.op)]
+        return lambda values: op(operand(values))
+
+    def visit_BinOp(self, node: ast.BinOp) -> Evaluator:
+        if type(node.op) not in _BINARY and type(node.op) not in _CHECKED_BINARY:
+            raise ConditionValidationError(f"{type(node.op).__name__} is not allowed in conditions")
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+        op = _BINARY.get(type(node.op))
+        numeric_operand = any(
+            isinstance(side, ast.Constant) and isinstance(side.value, (int, float)) for side in (node.left, node.right)
+        )
+        if isinstance(node.op, ast.Add) and numeric_operand:
+            # Numbers only, so nothing to check
+            op = operator.add
+        if op is None:
+            float_operand = any(
+                isinstance(side, ast.Constant) and isinstance(side.value, float) for side in (node.left, node.right)
+            )
+            if isinstance(node.op, ast.Mult) and float_operand:
+                # Nothing grows when multiplied by a float
+                op = operator.mul
+            else:
+                op = _CHECKED_BINARY[type(node.op)]
+        return lambda values: op(left(values), right(values))
+
+    def visit_BoolOp(self, node: ast.BoolOp) -> Evaluator:
+        operands = [self.compile(value) for value in node.values]
+        # a and b and c == a and (b and c), with the same short-circuiting
+        combined = operands[-1]
+        for operand in reversed(operands[:-1]):
+            if isinstance(node.op, ast.And):
+                combined = (lambda first, rest: lambda values: first(values) and rest(values))(operand, combined)
+            else:
+                combined = (lambda first, rest: lambda values: first(values) or rest(values))(operand, combined)
+        return combined
+
+    def visit_IfExp(self, node: ast.IfExp) -> Evaluator:
+        test = self.compile(node.test)
+        body = self.compile(node.body)
+        orelse = self.compile(node.orelse)
+        return lambda values: body(values) if test(values) else orelse(values)
+
+    def visit_Compare(self, node: ast.Compare) -> Evaluator:
+        if len(node.ops) == 1:
+            op, right_node = type(node.ops[0]), node.comparators[0]
+            if _is_field(node.left) and isinstance(right_node, ast.Constant) and op in _ORDERING:
+                return _compare_field(node.left.attr, op, right_node.value)
+            items = _constant_items(right_node)
+            if op in (ast.In, ast.NotIn) and items is not None:
+                return self.membership(self.compile(node.left), items, op is ast.NotIn)
+
+        operands = [self.compile(node.left)] + [self.compile(c) for c in node.comparators]
+        ops = []
+        for op in node.ops:
+            compare = _COMPARE[type(op)]
+            if isinstance(op, (ast.In, ast.NotIn)):
+                compare = self.metered_membership(compare)
+            ops.append(compare)
+
+        if len(ops) == 1:
+            left, right, compare = operands[0], operands[1], ops[0]
+            return lambda values: compare(left(values), right(values))
+
+        def chain(values):
+            left = operands[0](values)
+            for compare, operand in zip(ops, operands[1:]):
+                right = operand(values)
+                result = compare(left, right)
+                if not result:
+                    return result
+                left = right
+            return result
+        return chain
+
+    def membership(self, needle: Evaluator, items: tuple, negate: bool) -> Evaluator:
+        # `x in [constants]`: a set lookup, which finds the same elements
+        try:
+            lookup = frozenset(items)
+        except TypeError:
+            lookup = items
+
+        def contains(values):
+            value = needle(values)
+            try:
+                return (value in lookup) != negate
+            except TypeError:
+                # Unhashable values are compared with == like the list does
+                return (value in items) != negate
+        return contains
+
+    def metered_membership(self, compare: Callable[[Any, Any], bool]) -> Callable[[Any, Any], bool]:
+        self.metered = True
+
+        def metered(left, right):
+            if isinstance(right, (str, list, tuple)):
+                _charge(len(right))
+            return compare(left, right)
+        return metered
+
+    def visit_Call(self, node: ast.Call) -> Evaluator:
+        if any(keyword.arg is None for keyword in node.keywords):
+            raise ConditionValidationError("** is not allowed in conditions")
+        args = self.elements(node.args)
+        keywords = {keyword.arg: self.compile(keyword.value) for keyword in node.keywords}
+
+        func = node.func
+        if isinstance(func, ast.Name):
+            builtin = ALLOWED_BUILTINS.get(func.id)
+            if builtin is None:
+                raise ConditionValidationError(f"function '{func.id}' is not allowed in conditions")
+            metered = func.id not in _CONSTANT_TIME
+            self.metered |= metered
+            if not metered and not keywords and len(args) == 1:
+                # len(input.x) and the like
+                arg = args[0]
+                return lambda values: builtin(arg(values))
+
+            def call_builtin(values):
+                arguments = [arg(values) for arg in args]
+                if metered:
+                    _charge(sum(_size(argument) for argument in arguments) + 1)
+                return builtin(*arguments, **{keyword: value(values) for keyword, value in keywords.items()})
+            return call_builtin
+
+        if isinstance(func, ast.Attribute) and not _is_field(func) and func.attr in ALLOWED_METHODS:
+            receiver = self.compile(func.value)
+            name = func.attr
+            check = _METHOD_CHECKS.get(name)
+            metered = name not in _CONSTANT_TIME
+            self.metered |= metered
+
+            def call_method(values):
+                target = receiver(values)
+                method = getattr(target, name)
+                arguments = [arg(values) for arg in args]
+                if metered:
+                    _charge(_size(target) + sum(_size(argument) for argument in arguments) + 1)
+                if check is not None:
+                    check(target, arguments)
+                return method(*arguments, **{keyword: value(values) for keyword, value in keywords.items()})
+            return call_method
+
+        raise ConditionValidationError("only allowed builtins and methods can be called in conditions")
+
+
+def compile_expression(tree: ast.Expression) -> Evaluator:
+    """
+    Compile a parsed condition into an evaluator taking the input dict.
+    Raises ConditionValidationError for anything outside the subset.
+    """
+    size = sum(1 for _ in ast.walk(tree))
+    if size > MAX_NODES:
+        raise ConditionValidationError(f"condition has {size} syntax nodes, more than {MAX_NODES}")
+
+    compiler = _Compiler()
+    evaluator = compiler.compile(_Fold().visit(tree).body)
+    if not compiler.metered:
+        return evaluator
+
+    def metered(values):
+        _meter.steps = MAX_STEPS
+        return evaluator(values)
+    return metered
+
+
+def inlinable(tree: ast.Expression) -> bool:
+    """
+    Whether running the condition as plain Python needs none of the checks:
+    no calls, and no operators whose result can outgrow their operands.
+    Other modules may then inline it without changing what it does.
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            return False
+        if isinstance(node, ast.BinOp):
+            numeric_operand = [
+                isinstance(side, ast.Constant) and isinstance(side.value, (int, float)) for side in (node.left, node.right)
+            ]
+            float_operand = any(
+                isinstance(side, ast.Constant) and isinstance(side.value, float) for side in (node.left, node.right)
+            )
+            if isinstance(node.op, ast.Add) and not any(numeric_operand):
+                # Could join two sequences, which is checked
+                return False
+            if type(node.op) not in _BINARY and not (isinstance(node.op, ast.Mult) and float_operand):
+                return False
+        if isinstance(node, ast.Compare) and any(isinstance(op, (ast.In, ast.NotIn)) for op in node.ops):
+            # Membership tests are charged steps
+            return False
+    return True
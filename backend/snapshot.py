@@ -0,0 +1,199 @@
+"""
+Binary snapshots of compiled trees.
+
+A snapshot holds registered trees in their compiled form, so a worker can
+start serving them without parsing, validating and flattening JSON. The
+file is memory-mapped read-only: the structure arrays of a loaded tree are
+views of the mapping rather than copies, so every worker on a host shares
+one copy of them through the page cache. Node ids, texts and conditions
+still become Python objects in each worker, and conditions are compiled
+there.
+
+Layout: MAGIC, the length of the directory as 8 little-endian bytes, and
+the directory itself, JSON listing every tree's id, node count, sample
+inputs, the SHA-256 of its section and where the section starts, counted
+from the first 8-byte boundary after the directory. Each section holds, in native byte
+order and 8-byte aligned:
+- first_child, next_sibling, parent and depth, int32 per node
+- the end offsets of each node's id, text and condition in the string
+  data, uint32 per string
+- a byte per node, 1 if it has a condition
+- the subtree digests, 32 bytes per node
+- the string data, UTF-8
+A snapshot written on a machine with another byte order is refused.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+
+from models import DecisionTree, Node
+from compiled import CompiledTree, compile_tree
+from conditions import compile_condition
+from registry import RegisteredTree, tree_id_for
+
+
+MAGIC = b"TJSNAP01"
+
+_DIGEST_SIZE = 32
+_HEADER = struct.Struct("<Q")
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _padding(offset: int) -> bytes:
+    return b"\x00" * (_align(offset) - offset)
+
+
+def _section(compiled: CompiledTree) -> List[bytes]:
+    # The parts of one tree's section, each padded to the next 8-byte boundary
+    nodes = compiled.nodes
+    strings = bytearray()
+    ends = array("I")
+    flags = bytearray(len(nodes))
+    for index, node in enumerate(nodes):
+        for value in (node.node_id, node.text, node.condition or ""):
+            strings += value.encode("utf-8")
+            ends.append(len(strings))
+        if node.condition is not None:
+            flags[index] = 1
+
+    structure = array("i")
+    for name in ("first_child", "next_sibling", "parent", "depth"):
+        structure.extend(getattr(compiled, name))
+    parts = [structure.tobytes(), ends.tobytes(), bytes(flags), b"".join(compiled.subtree_hashes()), bytes(strings)]
+    return [part + _padding(len(part)) for part in parts]
+
+
+def write_snapshot(path: str, entries: Iterable[RegisteredTree]) -> int:
+    """
+    Write `entries` to a snapshot at `path`, replacing any file there, and
+    return its size in bytes.
+    """
+    directory: List[Dict[str, Any]] = []
+    sections: List[List[bytes]] = []
+    for entry in entries:
+        compiled = entry.compiled
+        if compiled.removed or compiled.relocated:
+            # Patched in place; sections are laid out in preorder
+            compiled = compile_tree(entry.tree.root)
+        sections.append(_section(compiled))
+        directory.append({
+            "tree_id": entry.tree_id,
+            "nodes": len(compiled),
+            "strings": len(sections[-1][-1]),
+            "sample_inputs": entry.tree.sample_inputs,
+            "checksum": hashlib.sha256(b"".join(sections[-1])).hexdigest(),
+        })
+
+    # Offsets count from the end of the directory
+    offset = 0
+    for item, parts in zip(directory, sections):
+        item["offset"] = offset
+        offset += sum(len(part) for part in parts)
+    encoded = json.dumps({"byteorder": sys.byteorder, "trees": directory}, default=str).encode("utf-8")
+
+    # Write to a temporary file first so readers never map a torn snapshot;
+    # workers starting together may all be writing one
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER.pack(len(encoded)))
+        f.write(encoded)
+        f.write(_padding(f.tell()))
+        for parts in sections:
+            for part in parts:
+                f.write(part)
+        written = f.tell()
+    os.replace(tmp_path, path)
+    return written
+
+
+def load_snapshot(path: str) -> List[RegisteredTree]:
+    """
+    Map the snapshot at `path` and return its trees, compiled. Raises
+    SnapshotError if the file is not a readable snapshot.
+    """
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise SnapshotError(f"{path}: empty file")
+    # The views handed out keep the mapping alive
+    view = memoryview(mapped)
+
+    start = len(MAGIC) + _HEADER.size
+    if len(view) < start or view[:len(MAGIC)] != MAGIC:
+        raise SnapshotError(f"{path}: not a snapshot")
+    (size,) = _HEADER.unpack_from(view, len(MAGIC))
+    try:
+        header = json.loads(bytes(view[start:start + size]))
+    except ValueError:
+        raise SnapshotError(f"{path}: unreadable directory")
+    if header.get("byteorder") != sys.byteorder:
+        raise SnapshotError(f"{path}: written with {header.get('byteorder')} byte order")
+    sections = view[_align(start + size):]
+    try:
+        return [_load_tree(sections, item, path) for item in header["trees"]]
+    except (KeyError, TypeError):
+        raise SnapshotError(f"{path}: malformed directory")
+
+
+def _load_tree(view: memoryview, item: Dict[str, Any], path: str) -> RegisteredTree:
+    count = item["nodes"]
+    offset = item["offset"]
+    sizes = [16 * count, 12 * count, count, _DIGEST_SIZE * count, item["strings"]]
+    if offset + sum(_align(size) for size in sizes) > len(view):
+        raise SnapshotError(f"{path}: truncated at tree {item['tree_id']}")
+    # The stored digests only vouch for each other; the checksum covers the data
+    section = view[offset:offset + sum(_align(size) for size in sizes)]
+    if hashlib.sha256(section).hexdigest() != item["checksum"]:
+        raise SnapshotError(f"{path}: tree {item['tree_id']} is corrupt")
+
+    parts: List[memoryview] = []
+    for size in sizes:
+        parts.append(view[offset:offset + size])
+        offset += _align(size)
+    structure = parts[0].cast("i")
+    first_child, next_sibling, parent, depth = (structure[k * count:(k + 1) * count] for k in range(4))
+    ends = parts[1].cast("I").tolist()
+    flags = parts[2]
+    digest_data = bytes(parts[3])
+    string_data = bytes(parts[4])
+
+    # Children come after their parent in preorder, so build nodes backwards
+    nodes: List[Optional[Node]] = [None] * count
+    conditions: List[Any] = [None] * count
+    for index in range(count - 1, -1, -1):
+        children = []
+        child = first_child[index]
+        while child >= 0:
+            children.append(nodes[child])
+            child = next_sibling[child]
+        position = 3 * index
+        begin = ends[position - 1] if position else 0
+        node_id = string_data[begin:ends[position]].decode("utf-8")
+        text = string_data[ends[position]:ends[position + 1]].decode("utf-8")
+        condition = None
+        if flags[index]:
+            condition = string_data[ends[position + 1]:ends[position + 2]].decode("utf-8")
+            if condition:
+                conditions[index] = compile_condition(condition)
+        nodes[index] = Node.model_construct(node_id=node_id, text=text, condition=condition, children=children)
+
+    digests = [digest_data[position:position + _DIGEST_SIZE] for position in range(0, len(digest_data), _DIGEST_SIZE)]
+    compiled = CompiledTree(nodes, first_child, next_sibling, conditions, parent, depth, digests=digests)
+    tree = DecisionTree.model_construct(root=nodes[0], sample_inputs=item["sample_inputs"])
+    if tree_id_for(compiled, tree) != item["tree_id"]:
+        raise SnapshotError(f"{path}: tree {item['tree_id']} does not match its id")
+    return RegisteredTree(item["tree_id"], tree, compiled)
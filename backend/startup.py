@@ -0,0 +1,156 @@
+"""
+Worker start-up.
+
+`warm_start` runs in every worker before it serves requests, so that no
+request pays for compiling a tree. It fills the registry from the snapshot
+at TREEJACK_SNAPSHOT if there is one (see `snapshot.py`), then from the
+registry's storage, then registers the example trees, which are stored like
+any other and can be used by tree_id. If the snapshot is missing,
+unreadable or lacks any tree the registry now holds, it is written afresh,
+so later workers map it instead of compiling. It also logs, once, each
+optional dependency that is not installed (see requirements-extras.txt),
+as the fast path it provides is then quietly skipped.
+
+`startup_report` records what start-up did and how long it took, and
+`resident_memory` how much memory the worker holds, for /stats.
+"""
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # Not on Windows
+    resource = None
+
+import columnar
+import responses
+from models import DecisionTree
+from codegen import tree_functions
+from registry import TreeRegistry
+from snapshot import SnapshotError, load_snapshot, write_snapshot
+
+
+logger = logging.getLogger("treejack.startup")
+
+# Optional dependencies and what runs without them
+_FALLBACKS = {
+    "numpy": "evaluate_columns traverses row by row",
+    "orjson": "responses are encoded with the json module",
+}
+
+
+class StartupReport:
+    """
+    What `warm_start` loaded, and how long it took.
+    """
+
+    def __init__(self):
+        self.seconds: Optional[float] = None
+        self.snapshot_trees = 0
+        self.stored_trees = 0
+        self.example_trees = 0
+        self.generated_trees = 0
+        self.snapshot_bytes: Optional[int] = None
+        self.missing_extras: List[str] = []
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "seconds": self.seconds,
+            "snapshot_trees": self.snapshot_trees,
+            "stored_trees": self.stored_trees,
+            "example_trees": self.example_trees,
+            "generated_trees": self.generated_trees,
+            # Set when this worker wrote the snapshot
+            "snapshot_bytes_written": self.snapshot_bytes,
+            "missing_extras": self.missing_extras,
+        }
+
+
+def missing_extras() -> List[str]:
+    """
+    The optional dependencies that are not installed.
+    """
+    installed = {"numpy": columnar.np is not None, "orjson": responses.orjson is not None}
+    return [name for name in _FALLBACKS if not installed[name]]
+
+
+startup_report = StartupReport()
+
+
+def warm_start(
+    registry: TreeRegistry,
+    examples: Dict[str, DecisionTree],
+    snapshot_path: Optional[str] = None,
+    report: StartupReport = startup_report,
+) -> StartupReport:
+    """
+    Compile every tree this worker will serve up front: the snapshot's,
+    the stored ones, and `examples`. Records what was done in `report`.
+    """
+    started = time.perf_counter()
+
+    report.missing_extras = missing_extras()
+    for name in report.missing_extras:
+        logger.warning("%s is not installed, so %s (pip install -r requirements-extras.txt)", name, _FALLBACKS[name])
+
+    snapshot_ids = set()
+    if snapshot_path and os.path.exists(snapshot_path):
+        try:
+            entries = load_snapshot(snapshot_path)
+        except (OSError, SnapshotError) as e:
+            logger.warning("Ignoring snapshot: %s", e)
+        else:
+            report.snapshot_trees = registry.preload(entries)
+            snapshot_ids = {entry.tree_id for entry in entries}
+
+    report.stored_trees = registry.preload_stored()
+    for tree in examples.values():
+        registry.register(tree)
+    report.example_trees = len(examples)
+
+    held = registry.entries()
+    if tree_functions.enabled:
+        # The most recently used trees, as many as the cache keeps
+        for entry in held[-tree_functions.maxsize:]:
+            tree_functions.traversal(entry.compiled)
+        report.generated_trees = min(len(held), tree_functions.maxsize)
+
+    if snapshot_path and any(entry.tree_id not in snapshot_ids for entry in held):
+        try:
+            report.snapshot_bytes = write_snapshot(snapshot_path, held)
+        except OSError as e:
+            logger.warning("Could not write snapshot: %s", e)
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def resident_memory() -> Dict[str, Optional[int]]:
+    """
+    This process's resident memory in bytes: all of it, the part shared
+    with other processes (mapped files, snapshots included), and the peak.
+    None where the platform does not say.
+    """
+    rss = shared = peak = None
+    try:
+        with open("/proc/self/statm") as f:
+            pages = f.read().split()
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        rss = int(pages[1]) * page_size
+        shared = int(pages[2]) * page_size
+    except (OSError, ValueError, IndexError):
+        # Not Linux
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in kilobytes, except on macOS
+        if sys.platform != "darwin":
+            peak *= 1024
+    return {"rss_bytes": rss, "shared_bytes": shared, "peak_rss_bytes": peak}
+
+
+snapshot_path = os.environ.get("TREEJACK_SNAPSHOT") or None
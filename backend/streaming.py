@@ -0,0 +1,94 @@
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, Union
+
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from compiled import CompiledTree
+from conditions import input_namespace
+from sandbox import BudgetExceeded, renew_budget
+
+
+def score_row(compiled: CompiledTree, line: Union[str, bytes], line_number: int, final_only: bool = False) -> str:
+    """
+    Score one NDJSON input line and return the NDJSON result line.
+    Lines that are not a JSON object, or that run out of time, produce an
+    error line instead of aborting the stream. Each line gets the request's
+    whole time budget.
+    """
+    try:
+        inputs = json.loads(line)
+        if not isinstance(inputs, dict):
+            raise ValueError("input row must be a JSON object")
+    except ValueError as e:
+        return json.dumps({"line": line_number, "error": str(e)}) + "\n"
+
+    node_ids = compiled.node_ids
+    renew_budget()
+    try:
+        indices = compiled.traverse_indices(input_namespace(inputs))
+    except BudgetExceeded as e:
+        return json.dumps({"line": line_number, "error": str(e)}) + "\n"
+    result: Dict[str, Any] = {"line": line_number, "final_node_id": node_ids[indices[-1]]}
+    if not final_only:
+        result["path"] = [node_ids[i] for i in indices]
+    return json.dumps(result) + "\n"
+
+
+def score_lines(compiled: CompiledTree, lines: Iterable[Union[str, bytes]], final_only: bool = False) -> Iterator[str]:
+    """
+    Score NDJSON input lines one at a time, yielding NDJSON result lines.
+    Blank lines are skipped but still counted, so `line` matches the input.
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if line.strip():
+            yield score_row(compiled, line, line_number, final_only)
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """
+    Split a stream of byte chunks into lines, holding at most one partial
+    line in memory.
+    """
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+async def score_stream(
+    compiled: CompiledTree,
+    lines: AsyncIterable[bytes],
+    final_only: bool = False,
+    first_line: int = 1,
+) -> AsyncIterator[str]:
+    """
+    Async counterpart of `score_lines` for request bodies. `first_line` is the
+    number reported for the first line consumed from `lines`.
+    """
+    line_number = first_line - 1
+    async for line in lines:
+        line_number += 1
+        if line.strip():
+            yield score_row(compiled, line, line_number, final_only)
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    Streams NDJSON while the request body is still being read.
+
+    StreamingResponse normally runs a disconnect listener that calls receive()
+    alongside the body iterator; here the body iterator consumes the request
+    stream itself, so the listener would swallow request chunks.
+    """
+
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,4 @@
+import logging
+
+# Random inputs make many conditions fail; their warnings are not under test
+logging.getLogger("treejack.conditions").disabled = True
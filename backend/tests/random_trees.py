@@ -0,0 +1,151 @@
+"""
+Seeded random trees, inputs and patches for the equivalence tests.
+
+Unlike `benchmarks.synthetic`, these trees aim at the corner cases: runs of
+same-field siblings (lookup tables), duplicate node ids, conditions that
+fail to compile or raise, nodes no child of which may match, and inputs
+with missing fields or values of the wrong type.
+"""
+import random
+from typing import Any, Dict, List, Optional
+
+from models import (
+    AddNodeOperation,
+    EditNodeOperation,
+    MoveNodeOperation,
+    Node,
+    RemoveNodeOperation,
+)
+from compiled import CompiledTree
+from patches import apply_patch
+
+
+FIELDS = ("x", "y", "z")
+KINDS = ("a", "b", "c", "d", "e")
+
+
+def random_condition(rng: random.Random) -> Optional[str]:
+    roll = rng.random()
+    field = rng.choice(FIELDS)
+    if roll < 0.15:
+        return None
+    if roll < 0.45:
+        return f"input.{field} {rng.choice(['<', '<=', '>', '>=', '==', '!='])} {rng.randint(-5, 15)}"
+    if roll < 0.55:
+        return f"input.kind == '{rng.choice(KINDS)}'"
+    if roll < 0.65:
+        return f"input.kind in ['{rng.choice(KINDS)}', '{rng.choice(KINDS)}']"
+    if roll < 0.75:
+        other = rng.choice(FIELDS)
+        return f"input.{field} > {rng.randint(0, 10)} and not input.{other} <= {rng.randint(0, 10)}"
+    if roll < 0.82:
+        return f"input.{field} * 2 + input.{rng.choice(FIELDS)} / 4 > {rng.randint(0, 20)}"
+    if roll < 0.88:
+        return f"input.flag == True or input.{field} == {rng.randint(0, 5)}"
+    if roll < 0.92:
+        return f"len(input.kind) > {rng.randint(0, 2)}"
+    if roll < 0.95:
+        # Never compiles: always False
+        return "input.x >"
+    return f"input.{field} < {rng.randint(0, 10)} if input.flag else input.{field} > {rng.randint(0, 10)}"
+
+
+def _run(rng: random.Random, count: int) -> List[Optional[str]]:
+    # Same-field siblings, which the lookup tables take over
+    field = rng.choice(FIELDS + ("kind",))
+    if field == "kind":
+        values = rng.sample(KINDS, min(count, len(KINDS)))
+        return [f"input.kind == '{value}'" for value in values]
+    if rng.random() < 0.5:
+        return [f"input.{field} == {value}" for value in rng.sample(range(-3, 12), count)]
+    op = rng.choice(["<", "<="])
+    return [f"input.{field} {op} {value}" for value in sorted(rng.sample(range(-3, 12), count))]
+
+
+def random_node(rng: random.Random, depth: int, counter: List[int]) -> Node:
+    counter[0] += 1
+    # Repeated ids now and then
+    node_id = f"n{counter[0]}" if rng.random() < 0.9 else f"dup{rng.randint(0, 3)}"
+    node = Node(node_id=node_id, text=f"Node {counter[0]}", condition=random_condition(rng))
+    if depth > 0 and rng.random() < 0.8:
+        count = rng.randint(1, 6)
+        if count >= 4 and rng.random() < 0.5:
+            conditions = _run(rng, count)
+        else:
+            conditions = [random_condition(rng) for _ in range(count)]
+        children = []
+        for condition in conditions:
+            child = random_node(rng, depth - 1, counter)
+            child.condition = condition
+            children.append(child)
+        node.children = children
+    return node
+
+
+def random_tree(seed: int, depth: int = 5) -> Node:
+    rng = random.Random(seed)
+    root = random_node(rng, depth, [0])
+    root.condition = None
+    return root
+
+
+def random_value(rng: random.Random, field: str) -> Any:
+    roll = rng.random()
+    if field == "kind":
+        return rng.choice(KINDS) if roll < 0.85 else rng.choice([None, 3, ""])
+    if field == "flag":
+        return rng.random() < 0.5 if roll < 0.9 else None
+    if roll < 0.7:
+        return rng.randint(-4, 14)
+    if roll < 0.85:
+        return rng.uniform(-4, 14)
+    return rng.choice([None, "7", True, False])
+
+
+def random_inputs(rng: random.Random, count: int) -> List[Dict[str, Any]]:
+    rows = []
+    for _ in range(count):
+        rows.append({
+            field: random_value(rng, field)
+            for field in FIELDS + ("kind", "flag")
+            if rng.random() < 0.9
+        })
+    return rows
+
+
+def random_operations(rng: random.Random, compiled: CompiledTree, count: int) -> list:
+    """
+    Up to `count` operations that are valid for `compiled` when applied in
+    order. Each is tried on its own against the tree the earlier ones left,
+    to pick indices that still exist.
+    """
+    operations = []
+    state = compiled
+    for _ in range(count):
+        alive = list(state.preorder())
+        kind = rng.choice(["add", "remove", "move", "edit", "edit"])
+        if kind == "add":
+            node = random_node(rng, rng.randint(0, 2), [1000 + len(state)])
+            operation = AddNodeOperation(op="add", parent=rng.choice(alive), position=rng.choice([None, 0, 1]), node=node)
+        elif kind == "remove" and len(alive) > 1:
+            operation = RemoveNodeOperation(op="remove", index=rng.choice(alive[1:]))
+        elif kind == "move" and len(alive) > 1:
+            index = rng.choice(alive[1:])
+            targets = [node for node in alive if index not in state.path_to(node)]
+            operation = MoveNodeOperation(op="move", index=index, parent=rng.choice(targets), position=rng.choice([None, 0, 1]))
+        else:
+            index = rng.choice(alive)
+            fields = {}
+            if rng.random() < 0.7:
+                fields["condition"] = random_condition(rng) if index else None
+            if rng.random() < 0.4:
+                fields["node_id"] = f"edited{rng.randint(0, 5)}"
+            if rng.random() < 0.3:
+                fields["text"] = "edited"
+            operation = EditNodeOperation(op="edit", index=index, **fields)
+        operations.append(operation)
+        state, _, renumbered = apply_patch(state, [operation])
+        if renumbered:
+            # Indices no longer line up with the original's
+            break
+    return operations
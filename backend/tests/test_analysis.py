@@ -0,0 +1,80 @@
+"""
+Soundness of the static reachability analysis: no input may reach a node
+it reports unreachable.
+"""
+import json
+import math
+import random
+
+import pytest
+
+from analysis import find_unreachable
+from compiled import compile_tree
+from conditions import input_namespace
+from models import AddNodeOperation, Node
+from patches import apply_patch
+from tests.random_trees import random_inputs, random_tree
+
+
+SPECIAL_VALUES = (math.nan, math.inf, -math.inf, 0, -0.0, 1e308, True, False)
+
+
+def with_special_values(rng, rows):
+    for row in rows:
+        for field in list(row):
+            if rng.random() < 0.1:
+                row[field] = rng.choice(SPECIAL_VALUES)
+    return rows
+
+
+def test_reported_nodes_are_never_reached():
+    reported = 0
+    for seed in range(150):
+        rng = random.Random(seed)
+        compiled = compile_tree(random_tree(seed))
+        unreachable = {index for index, _ in find_unreachable(compiled)}
+        reported += len(unreachable)
+        for inputs in with_special_values(rng, random_inputs(rng, 300)):
+            visited = compiled.traverse_indices(input_namespace(inputs))
+            assert not unreachable.intersection(visited), (seed, inputs)
+    # The trees must give the analysis something to find
+    assert reported > 50
+
+
+def tree(*conditions, parent=None):
+    children = [Node(node_id=f"c{position}", text="", condition=condition) for position, condition in enumerate(conditions)]
+    return Node(node_id="root", text="", children=[Node(node_id="p", text="", condition=parent, children=children)])
+
+
+@pytest.mark.parametrize("parent", [None, "input.x != 3", "not input.x < -100"])
+def test_nan_reaches_past_an_exhaustive_pair(parent):
+    root = tree("input.x < 5", "input.x >= 5", None, parent=parent)
+    compiled = compile_tree(root)
+    visited = compiled.traverse_indices(input_namespace(json.loads('{"x": NaN}')))
+    assert compiled.node_ids[visited[-1]] == "c2"
+    assert visited[-1] not in {index for index, _ in find_unreachable(compiled)}
+
+
+@pytest.mark.parametrize("conditions", [
+    ("input.x < 1e999", "input.x > 0"),
+    ("input.x < 5", "input.x == 1e999"),
+    ("input.x > -1e999", "input.x < 0"),
+])
+def test_infinite_constants_are_not_understood(conditions):
+    compiled = compile_tree(tree(*conditions))
+    assert find_unreachable(compiled) == []
+
+
+def test_patched_trees_report_in_preorder():
+    compiled = compile_tree(Node(node_id="root", text="", children=[
+        Node(node_id="a", text="", children=[Node(node_id="a1", text=""), Node(node_id="a2", text="")]),
+        Node(node_id="b", text=""),
+    ]))
+    patched, _, _ = apply_patch(compiled, [
+        AddNodeOperation(op="add", parent=0, position=0, node=Node(node_id="first", text="")),
+        AddNodeOperation(op="add", parent=1, position=0, node=Node(node_id="y", text="")),
+    ])
+    fresh = compile_tree(patched.root)
+    reported = [(patched.node_ids[index], reason) for index, reason in find_unreachable(patched)]
+    assert reported == [(fresh.node_ids[index], reason) for index, reason in find_unreachable(fresh)]
+    assert [node_id for node_id, _ in reported] == ["a", "y", "a1", "a2", "b"]
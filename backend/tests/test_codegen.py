@@ -0,0 +1,33 @@
+from codegen import CodegenCache
+from compiled import compile_tree
+from models import Node, RemoveNodeOperation
+from patches import apply_patch
+
+
+def make_root() -> Node:
+    return Node(node_id="r", text="r", children=[
+        Node(node_id="a", text="a", condition="input.x > 5"),
+        Node(node_id="b", text="b", condition="input.x > 1"),
+        Node(node_id="c", text="c"),
+    ])
+
+
+def test_patched_layout_does_not_share_code_with_fresh_compile():
+    patched, _, renumbered = apply_patch(compile_tree(make_root()), [RemoveNodeOperation(op="remove", index=2)])
+    assert not renumbered
+    cache = CodegenCache(maxsize=8)
+
+    # Same content, so same root digest, but "c" is at index 2 here and 3 in the patched tree
+    fresh = compile_tree(patched.root)
+    assert fresh.subtree_hashes()[0] == patched.subtree_hashes()[0]
+    assert cache.traversal(fresh).traverse({"x": 3})[0] == ["r", "c"]
+    assert cache.traversal(patched).traverse({"x": 3})[0] == ["r", "c"]
+    assert cache.traversal(patched).traverse({"x": 9})[0] == ["r", "a"]
+
+
+def test_same_layout_shares_code():
+    cache = CodegenCache(maxsize=8)
+    cache.traversal(compile_tree(make_root()))
+    cache.traversal(compile_tree(make_root()))
+    assert cache.info()["misses"] == 1
+    assert cache.info()["hits"] == 1
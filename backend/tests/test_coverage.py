@@ -0,0 +1,90 @@
+"""
+Coverage sessions: hit counts that add up across batches, unreachable
+nodes per id or per qualified id, and the LRU bound on open sessions.
+"""
+from fastapi.testclient import TestClient
+
+from compiled import compile_tree
+from coverage import CoverageSessions
+from main import app
+from tree_examples import example_trees
+
+
+client = TestClient(app)
+
+# loan_application uses "loan_rejected" twice, under different parents
+LOAN = example_trees["loan_application"]
+APPROVED = {"annual_income": 50000, "credit_score": 750}
+LOW_CREDIT = {"annual_income": 50000, "credit_score": 600}
+LOW_INCOME = {"annual_income": 20000, "credit_score": 750}
+
+
+def start(samples, qualify_duplicates=False):
+    response = client.post("/coverage", json={
+        "tree": LOAN.model_dump(),
+        "sample_inputs": samples,
+        "qualify_duplicates": qualify_duplicates,
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+def hits(report):
+    return {row["node_id"]: row["hits"] for row in report["node_hits"]}
+
+
+def test_batches_add_up():
+    report = start([APPROVED, APPROVED])
+    session_id = report["session_id"]
+    assert report["samples"] == 2
+    assert report["unreachable_nodes"] == ["credit_score_low", "loan_rejected", "income_too_low"]
+
+    response = client.post(f"/coverage/{session_id}/samples", json={"sample_inputs": [LOW_CREDIT]})
+    report = response.json()
+    assert report["samples"] == 3
+    assert [row["node_id"] for row in report["node_hits"]] == [
+        "start", "income_check", "credit_score_check", "loan_approved",
+        "credit_score_low", "loan_rejected", "income_too_low", "loan_rejected",
+    ]
+    assert [row["hits"] for row in report["node_hits"]] == [3, 3, 2, 2, 1, 1, 0, 0]
+    # One loan_rejected was reached, so the id was
+    assert report["unreachable_nodes"] == ["income_too_low"]
+    assert client.get(f"/coverage/{session_id}").json() == report
+
+
+def test_duplicates_qualified():
+    report = start([LOW_CREDIT], qualify_duplicates=True)
+    assert hits(report) == {
+        "start": 1, "income_check": 1, "credit_score_check": 0, "loan_approved": 0,
+        "credit_score_low": 1, "credit_score_low/loan_rejected": 1,
+        "income_too_low": 0, "income_too_low/loan_rejected": 0,
+    }
+    assert report["unreachable_nodes"] == [
+        "credit_score_check", "loan_approved", "income_too_low", "income_too_low/loan_rejected",
+    ]
+
+    report = client.post(f"/coverage/{report['session_id']}/samples", json={"sample_inputs": [LOW_INCOME]}).json()
+    assert report["unreachable_nodes"] == ["credit_score_check", "loan_approved"]
+
+
+def test_registered_tree():
+    tree_id = client.post("/trees", json=LOAN.model_dump()).json()["tree_id"]
+    report = client.post("/coverage", json={"tree_id": tree_id, "sample_inputs": [LOW_INCOME]}).json()
+    assert hits(report)["income_too_low"] == 1
+
+
+def test_unknown_sessions():
+    assert client.get("/coverage/nope").status_code == 404
+    assert client.post("/coverage/nope/samples", json={"sample_inputs": []}).status_code == 404
+    assert client.post("/coverage", json={"sample_inputs": []}).status_code == 400
+
+
+def test_least_recently_used_sessions_expire():
+    sessions = CoverageSessions(maxsize=2)
+    compiled = compile_tree(LOAN.root)
+    first, second = sessions.create(compiled), sessions.create(compiled)
+    assert sessions.get(first.session_id) is first
+    third = sessions.create(compiled)
+    assert sessions.get(second.session_id) is None
+    assert sessions.get(first.session_id) is first and sessions.get(third.session_id) is third
+    assert sessions.info() == {"hits": 3, "misses": 1, "size": 2, "maxsize": 2}
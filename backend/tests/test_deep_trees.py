@@ -0,0 +1,92 @@
+"""
+Trees nested far beyond the recursion limit: the compact endpoints take
+them, the validating endpoints say they are too deep.
+"""
+import json
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import TREE_TOO_DEEP, app
+from records import loads
+
+
+client = TestClient(app)
+
+
+def chain(depth: int) -> str:
+    # Written out as text: json.dumps would hit the recursion limit too
+    opened = "".join(f'{{"node_id":"n{level}","text":"t",' + ('"condition":"input.x > 0",' if level else "") + '"children":[' for level in range(depth))
+    return opened + f'{{"node_id":"n{depth}","text":"leaf"}}' + "]}" * depth
+
+
+def post(url: str, body: str):
+    return client.post(url, content=body, headers={"content-type": "application/json"})
+
+
+@pytest.mark.parametrize("depth", [900, 10000])
+def test_compact_endpoints_take_any_depth(depth):
+    tree = '{"root":' + chain(depth) + "}"
+    response = post("/simulate/compact", '{"tree":' + tree + ',"input_values":{"x":1}}')
+    assert response.status_code == 200
+    assert response.json()["final_node"]["node_id"] == f"n{depth}"
+
+    response = post("/simulate/compact", '{"tree":' + tree + ',"input_values":{"x":0}}')
+    assert response.json()["path"] == ["n0"]
+
+    response = post("/detect-unreachable/compact", '{"tree":' + tree + ',"sample_inputs":[{"x":0}]}')
+    assert response.status_code == 200
+    assert len(response.json()["unreachable_nodes"]) == depth
+
+    response = post("/detect-unreachable/compact?mode=static", '{"tree":' + tree + "}")
+    assert response.json()["unreachable_nodes"] == []
+
+
+@pytest.mark.parametrize("depth", [300, 900, 10000])
+@pytest.mark.parametrize("url", ["/simulate", "/detect-unreachable", "/trees", "/simulate/stream"])
+def test_validating_endpoints_say_too_deep(depth, url):
+    tree = '{"root":' + chain(depth) + "}"
+    if url == "/trees":
+        body = tree
+    elif url == "/simulate/stream":
+        body = tree + '\n{"x":1}\n'
+    else:
+        body = '{"tree":' + tree + "}"
+    response = post(url, body)
+    assert response.status_code == 422
+    assert response.json() == {"detail": TREE_TOO_DEEP}
+
+
+def test_other_errors_are_unchanged():
+    response = post("/simulate", '{"tree":{"root":{"node_id":1}}}')
+    assert response.status_code == 422
+    assert isinstance(response.json()["detail"], list)
+    assert client.get("/trees/unknown").status_code == 404
+
+
+def test_loads_matches_json():
+    rng = random.Random(0)
+
+    def value(depth):
+        roll = rng.random()
+        if depth > 4 or roll < 0.3:
+            return rng.choice([0, -2.5, 1e300, "s\"\\é\n", None, True, False, float("inf")])
+        if roll < 0.6:
+            return [value(depth + 1) for _ in range(rng.randint(0, 3))]
+        return {f"k{position}": value(depth + 1) for position in range(rng.randint(0, 3))}
+
+    for _ in range(500):
+        text = json.dumps(value(0), indent=rng.choice([None, 2]))
+        assert loads(text) == json.loads(text)
+        assert loads(text.encode("utf-8")) == json.loads(text)
+    assert loads('{"a": 1, "a": 2}') == {"a": 2}
+    assert loads("[" * 5000 + "]" * 5000) is not None
+
+
+@pytest.mark.parametrize("text", ["", "[1,]", '{"a" 1}', '{"a":1,}', "[1 2]", "{1:2}", "nul", "[", '{"a":', "01", "[-]", '{"a":1}}'])
+def test_loads_refuses_what_json_refuses(text):
+    with pytest.raises(ValueError):
+        json.loads(text)
+    with pytest.raises(ValueError):
+        loads(text)
@@ -0,0 +1,39 @@
+"""
+Lookup tables for runs of siblings: the same path as checking the
+conditions one by one, and the same errors reported.
+"""
+import pytest
+
+from codegen import CodegenCache
+from compiled import compile_tree
+from conditions import condition_errors
+from engine import traverse_tree
+from models import Node
+
+
+def run_tree(conditions):
+    children = [Node(node_id=f"c{position}", text="", condition=condition) for position, condition in enumerate(conditions)]
+    return Node(node_id="root", text="", children=children + [Node(node_id="other", text="")])
+
+
+EQUALITY = [f"input.x == {value}" for value in range(6)]
+RANGE = [f"input.x < {value}" for value in (10, 20, 30, 40, 50)]
+
+
+@pytest.mark.parametrize("conditions", [EQUALITY, RANGE], ids=["equality", "range"])
+@pytest.mark.parametrize("inputs", [{}, {"y": 1}, {"x": 3}, {"x": 35}, {"x": "a"}, {"x": [1]}, {"x": float("nan")}])
+def test_same_errors_as_a_scan(conditions, inputs):
+    root = run_tree(conditions)
+    compiled = compile_tree(root)
+    assert compiled.dispatch[1] is not None
+    generated = CodegenCache(maxsize=1).traversal(compiled)
+
+    condition_errors.clear()
+    expected = traverse_tree(root, inputs)[0]
+    scanned = condition_errors.info()
+    for traversal in (compiled, generated):
+        condition_errors.clear()
+        assert traversal.traverse(inputs)[0] == expected
+        assert condition_errors.info() == scanned
+    if "x" not in inputs:
+        assert scanned == {"AttributeError": len(conditions)}
@@ -0,0 +1,93 @@
+"""
+Every traversal backend against `engine.traverse_tree`, on seeded random
+trees and inputs, before and after random patches.
+"""
+import asyncio
+import random
+
+import pytest
+
+import columnar
+from codegen import CodegenCache
+from columnar import evaluate_columns, rows_to_columns
+from compiled import compile_tree
+from engine import simulate_batch, traverse_tree
+from memo import SubtreeCache
+from patches import apply_patch
+from profiling import TreeProfile
+from resolvers import traverse_async
+from tests.random_trees import random_inputs, random_operations, random_tree
+
+
+SEEDS = range(40)
+ROWS = 60
+
+
+def check_backends(root, compiled, rows):
+    expected = [traverse_tree(root, inputs)[0] for inputs in rows]
+
+    assert [compiled.traverse(inputs)[0] for inputs in rows] == expected
+
+    generated = CodegenCache(maxsize=4).traversal(compiled)
+    assert [generated.traverse(inputs)[0] for inputs in rows] == expected
+
+    # Twice, so the second pass is served from the cache
+    memoized = SubtreeCache(maxsize=10000, min_size=2).traversal("tree", compiled, "test")
+    for _ in range(2):
+        assert [memoized.traverse(inputs)[0] for inputs in rows] == expected
+
+    profiled = TreeProfile(compiled).traversal()
+    assert [profiled.traverse(inputs)[0] for inputs in rows] == expected
+
+    results = simulate_batch(compiled, rows)
+    assert [result["path"] for result in results] == expected
+
+    node_ids = compiled.node_ids
+    finals = evaluate_columns(compiled, rows_to_columns(rows))
+    assert [node_ids[index] for index in finals] == [path[-1] for path in expected]
+
+    async def walk():
+        return [(await traverse_async(compiled, inputs, []))[0] for inputs in rows]
+
+    assert [[node_ids[index] for index in path] for path in asyncio.run(walk())] == expected
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_backends_match_traverse_tree(seed):
+    root = random_tree(seed)
+    rows = random_inputs(random.Random(seed), ROWS)
+    check_backends(root, compile_tree(root), rows)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_backends_match_after_patches(seed):
+    rng = random.Random(seed)
+    root = random_tree(seed)
+    compiled = compile_tree(root)
+    patched, _, _ = apply_patch(compiled, random_operations(rng, compiled, rng.randint(1, 8)))
+    rows = random_inputs(rng, ROWS)
+
+    check_backends(patched.root, patched, rows)
+    check_backends(patched.root, compile_tree(patched.root), rows)
+    # The original is left as it was
+    check_backends(root, compiled, rows)
+
+
+def test_patched_tree_matches_fresh_compile():
+    for seed in SEEDS:
+        rng = random.Random(seed)
+        compiled = compile_tree(random_tree(seed))
+        patched, _, _ = apply_patch(compiled, random_operations(rng, compiled, 6))
+        fresh = compile_tree(patched.root)
+        assert patched.subtree_hashes()[0] == fresh.subtree_hashes()[0]
+        assert [patched.node_ids[index] for index in patched.preorder()] == fresh.node_ids
+        assert patched.node_count == len(fresh)
+
+
+def test_row_wise_columns_without_numpy(monkeypatch):
+    monkeypatch.setattr(columnar, "np", None)
+    root = random_tree(7)
+    compiled = compile_tree(root)
+    rows = random_inputs(random.Random(7), ROWS)
+    finals = evaluate_columns(compiled, rows_to_columns(rows))
+    assert [compiled.node_ids[index] for index in finals] == [traverse_tree(root, inputs)[0][-1] for inputs in rows]
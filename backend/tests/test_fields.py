@@ -0,0 +1,33 @@
+"""
+What conditions read, as memoization, code generation and path search see it.
+"""
+from codegen import _inline_fields
+from fields import condition_reads
+from memo import condition_fields
+from conditions import compile_condition
+
+
+def test_condition_reads():
+    reads = condition_reads("input.a > 1 and input.b == 'x'")
+    assert reads.fields == {"a", "b"} and reads.plain and not reads.other_names
+    assert reads.constants == (1, "x")
+
+    reads = condition_reads("len(input.s) > 2")
+    assert reads.fields == {"s"} and reads.plain and reads.other_names
+
+    reads = condition_reads("input['a'] > 1")
+    assert not reads.plain
+
+    reads = condition_reads("input.a >")
+    assert reads.tree is None and reads.fields == frozenset()
+
+
+def test_consumers_agree():
+    assert condition_fields(compile_condition("len(input.s) > 2")) == {"s"}
+    # The sandbox refuses other uses of input, so such conditions read nothing
+    assert condition_fields(compile_condition("input['a'] > 1")) == frozenset()
+    assert condition_fields(None) == frozenset()
+    assert _inline_fields("input.a + 1 > input.b") == {"a", "b"}
+    # Calls need the sandbox's checks, and other names are not inputs
+    assert _inline_fields("len(input.s) > 2") is None
+    assert _inline_fields("input.a > x") is None
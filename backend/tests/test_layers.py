@@ -0,0 +1,111 @@
+"""
+Copy-on-write layers of patched trees: chains of patches give the same
+trees as compiling afresh, leave every earlier version as it was, and share
+what they did not change.
+"""
+import random
+
+import pytest
+
+import layers
+from compiled import compile_tree
+from layers import ChunkedList, DictOverlay
+from models import EditNodeOperation, Node
+from patches import apply_patch
+from tests.random_trees import random_inputs, random_operations, random_tree
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # Many chunks even in small trees, so edits cross chunk boundaries
+    monkeypatch.setattr(layers, "CHUNK_SHIFT", 2)
+    monkeypatch.setattr(layers, "CHUNK_SIZE", 4)
+    monkeypatch.setattr(layers, "CHUNK_MASK", 3)
+    monkeypatch.setattr(layers, "MIN_OVERLAY_CHANGES", 2)
+
+
+def snapshot(compiled):
+    return (
+        compiled.subtree_hashes()[0],
+        list(compiled.preorder()),
+        [compiled.node_ids[index] for index in compiled.preorder()],
+        dict(compiled.duplicate_ids),
+    )
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_patch_chains(small_chunks, seed):
+    rng = random.Random(seed)
+    versions = [compile_tree(random_tree(seed))]
+    before = [snapshot(versions[0])]
+    for _ in range(15):
+        operations = random_operations(rng, versions[-1], rng.randint(1, 3))
+        patched, _, renumbered = apply_patch(versions[-1], operations)
+        versions.append(patched)
+        before.append(snapshot(patched))
+
+    rows = random_inputs(rng, 30)
+    for version, expected in zip(versions, before):
+        # Later patches left it as it was
+        assert snapshot(version) == expected
+        fresh = compile_tree(version.root)
+        assert version.root_digest() == fresh.root_digest()
+        assert [version.traverse(inputs)[0] for inputs in rows] == [fresh.traverse(inputs)[0] for inputs in rows]
+        order = list(version.preorder())
+        visited = set(rng.sample(order, min(2, len(order))))
+        reached = {version.node_ids[index] for index in visited}
+        expected = [node_id for node_id in fresh.unvisited_ids(set()) if node_id not in reached]
+        assert version.unvisited_ids(visited) == expected
+        for node_id in set(fresh.node_ids):
+            assert [version.node_ids[index] for index in version.indices_of(node_id)] == [node_id] * len(fresh.indices_of(node_id))
+
+
+def test_unchanged_arrays_are_shared():
+    compiled = compile_tree(random_tree(3))
+    patched, _, _ = apply_patch(compiled, [EditNodeOperation(op="edit", index=len(compiled) - 1, text="edited")])
+    for name in ("first_child", "next_sibling", "parent", "depth", "conditions"):
+        assert getattr(patched, name) is getattr(compiled, name)
+    assert patched.nodes is not compiled.nodes
+    assert patched.nodes[-1].text == "edited" and compiled.nodes[-1].text != "edited"
+
+
+def test_unvisited_ids_after_renaming():
+    compiled = compile_tree(Node(node_id="r", text="r", children=[Node(node_id=node_id, text=node_id) for node_id in "abc"]))
+    patched, _, _ = apply_patch(compiled, [EditNodeOperation(op="edit", index=1, node_id="z")])
+    assert patched.unvisited_ids({0}) == ["z", "b", "c"]
+    assert compiled.unvisited_ids({0}) == ["a", "b", "c"]
+
+
+def test_chunked_list(small_chunks):
+    base = list(range(10))
+    chunked = ChunkedList(base)
+    copy = chunked.copy()
+    copy[5] = "x"
+    copy.append(10)
+    copy.extend([11, 12])
+    assert list(copy) == [0, 1, 2, 3, 4, "x", 6, 7, 8, 9, 10, 11, 12]
+    assert copy[-1] == 12 and len(copy) == 13
+    assert chunked.flatten() is base and base == list(range(10))
+
+    again = copy.copy()
+    copy[6] = "z"
+    again[5] = "y"
+    assert copy[5] == "x" and again[5] == "y"
+    assert copy[6] == "z" and again[6] == 6
+    with pytest.raises(IndexError):
+        copy[13]
+
+
+def test_dict_overlay(small_chunks):
+    base = {"a": 1, "b": 2}
+    overlay = DictOverlay(base)
+    overlay["c"] = 3
+    del overlay["a"]
+    assert overlay.setdefault("b", 5) == 2 and overlay.setdefault("a", 6) == 6
+    copy = overlay.copy()
+    del copy["b"]
+    assert "b" in overlay and "b" not in copy
+    assert copy.flatten() == {"a": 6, "c": 3}
+    assert base == {"a": 1, "b": 2}
+    with pytest.raises(KeyError):
+        copy["b"]
@@ -0,0 +1,22 @@
+"""
+The LRU map shared by the caches and registries.
+"""
+from lru import LRUCache
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    assert cache.store("a", 1) == [] and cache.store("b", 2) == []
+    assert cache.lookup("a") == 1
+    assert cache.store("c", 3) == [("b", 2)]
+    assert cache.lookup("b") is None
+    assert cache.values() == [1, 3] and "c" in cache and len(cache) == 2
+    assert cache.info() == {"hits": 1, "misses": 1, "size": 2, "maxsize": 2}
+
+    # Storing again refreshes without evicting
+    assert cache.store("a", 4) == []
+    assert cache.store("d", 5) == [("c", 3)]
+    assert cache.discard("a") == 4 and cache.discard("a") is None
+
+    cache.clear()
+    assert cache.info() == {"hits": 0, "misses": 0, "size": 0, "maxsize": 2}
@@ -0,0 +1,101 @@
+"""
+The /metrics exposition, its latency histogram buckets, and per-tree
+profiling, which costs nothing on trees that are not being profiled.
+"""
+import random
+
+from fastapi.testclient import TestClient
+
+import profiling
+from compiled import compile_tree
+from engine import simulate_batch
+from main import app
+from metrics import Histogram, render_metrics
+from tests.random_trees import random_inputs, random_tree
+
+
+client = TestClient(app)
+
+
+def test_buckets_include_their_upper_bound():
+    histogram = Histogram("latency", "Latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.1, 0.05, 0.10001, 1.0, 7.0):
+        histogram.observe(("/a",), value)
+    histogram.observe(('say "hi"\n',), 0.5)
+    assert list(histogram.render()) == [
+        "# HELP latency Latency.",
+        "# TYPE latency histogram",
+        'latency_bucket{route="/a",le="0.1"} 2',
+        'latency_bucket{route="/a",le="1.0"} 4',
+        'latency_bucket{route="/a",le="+Inf"} 5',
+        "latency_sum{route=\"/a\"} 8.25001",
+        'latency_count{route="/a"} 5',
+        'latency_bucket{route="say \\"hi\\"\\n",le="0.1"} 0',
+        'latency_bucket{route="say \\"hi\\"\\n",le="1.0"} 1',
+        'latency_bucket{route="say \\"hi\\"\\n",le="+Inf"} 1',
+        'latency_sum{route="say \\"hi\\"\\n"} 0.5',
+        'latency_count{route="say \\"hi\\"\\n"} 1',
+    ]
+
+
+def test_stats_become_gauges():
+    text = render_metrics({"cache": {"hits": 3, "enabled": True, "note": None, "trees": {"a": {"size": 2}}}}, histograms=())
+    assert text == (
+        "# TYPE treejack_cache_hits gauge\n"
+        "treejack_cache_hits 3\n"
+        "# TYPE treejack_cache_size gauge\n"
+        'treejack_cache_size{tree="a"} 2\n'
+    )
+
+
+def test_metrics_endpoint():
+    client.get("/examples")
+    client.get("/no/such/route")
+    client.get("/trees/abc")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+    lines = response.text.splitlines()
+    assert "# TYPE treejack_request_duration_seconds histogram" in lines
+    assert any(line.startswith('treejack_request_duration_seconds_count{route="/examples",method="GET",status="200"}') for line in lines)
+    # Labelled by route template, not path
+    assert any('route="/trees/{tree_id}",method="GET",status="404"' in line for line in lines)
+    assert any('route="unmatched",method="GET",status="404"' in line for line in lines)
+    assert not any('route="/metrics"' in line for line in lines)
+    assert "# TYPE treejack_tree_registry_hits gauge" in lines
+    for line in lines:
+        if not line.startswith("#"):
+            float(line.rsplit(" ", 1)[1])
+
+
+def test_profiling_only_when_enabled(monkeypatch):
+    root = random_tree(6)
+    rows = random_inputs(random.Random(6), 20)
+    expected = [result["path"] for result in simulate_batch(compile_tree(root), rows)]
+    tree_id = client.post("/trees", json={"root": root.model_dump()}).json()["tree_id"]
+
+    def simulate():
+        return [client.post(f"/trees/{tree_id}/simulate", json={"input_values": row}).json()["path"] for row in rows]
+
+    def unprofiled():
+        # No profiled traversal and nothing recorded
+        def fail(*args):
+            raise AssertionError("profiled while profiling is off")
+        with monkeypatch.context() as patched:
+            patched.setattr(profiling.ProfiledTree, "traverse_indices", fail)
+            patched.setattr(profiling.TreeProfile, "record", fail)
+            return simulate()
+
+    assert unprofiled() == expected
+
+    assert client.post(f"/trees/{tree_id}/profile").status_code == 200
+    assert simulate() == expected
+    report = client.get(f"/trees/{tree_id}/profile").json()
+    assert report["traversals"] == len(rows)
+    visits = {node["node_id"]: node["visits"] for node in report["nodes"]}
+    assert visits[root.node_id] == len(rows)
+
+    assert client.delete(f"/trees/{tree_id}/profile").json()["traversals"] == len(rows)
+    assert client.get(f"/trees/{tree_id}/profile").status_code == 404
+    assert unprofiled() == expected
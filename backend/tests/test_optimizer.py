@@ -0,0 +1,72 @@
+"""
+Branch reordering: trees it reorders give every input the same path as
+the original.
+"""
+import random
+
+from compiled import compile_tree
+from engine import traverse_tree
+from models import Node
+from optimizer import reorder, visit_counts
+from tests.random_trees import random_inputs, random_tree
+
+
+def leaf(node_id, condition=None):
+    return Node(node_id=node_id, text=node_id, condition=condition)
+
+
+def banded_tree():
+    return Node(node_id="root", text="root", children=[
+        leaf("low", "input.x < 10 and input.y > 0"),
+        leaf("middle", "input.x >= 10 and input.x < 20"),
+        Node(node_id="high", text="high", condition="input.x >= 20 and input.y > 0", children=[
+            leaf("rare", "input.y > 100 and input.z == 'a'"),
+            leaf("common", "input.y <= 100 and input.z != 'a'"),
+            leaf("fallback"),
+        ]),
+        leaf("default"),
+    ])
+
+
+def banded_inputs(rng, count):
+    rows = []
+    for _ in range(count):
+        row = {"x": rng.choice([rng.randint(-5, 40), 25, 30, None, "x"]), "y": rng.randint(-5, 150), "z": rng.choice("ab")}
+        for field in list(row):
+            if rng.random() < 0.1:
+                del row[field]
+        rows.append(row)
+    return rows
+
+
+def same_paths(original, reordered, rows):
+    for inputs in rows:
+        assert traverse_tree(reordered, inputs)[0] == traverse_tree(original, inputs)[0], inputs
+
+
+def test_reordered_tree_takes_the_same_paths():
+    rng = random.Random(1)
+    root = banded_tree()
+    compiled = compile_tree(root)
+    samples = [{"x": 30, "y": 5, "z": "b"}] * 20 + banded_inputs(rng, 20)
+    reordering = reorder(compiled, visit_counts(compiled, samples))
+
+    assert reordering.changed == ["root", "high"]
+    assert reordering.after < reordering.before
+    reordered = reordering.build_root()
+    assert [child.node_id for child in reordered.children] == ["high", "low", "middle", "default"]
+    assert [child.node_id for child in reordered.children[0].children] == ["common", "rare", "fallback"]
+    same_paths(root, reordered, banded_inputs(rng, 2000))
+
+
+def test_random_trees_take_the_same_paths():
+    changed = 0
+    for seed in range(40):
+        rng = random.Random(seed)
+        root = random_tree(seed)
+        compiled = compile_tree(root)
+        reordering = reorder(compiled, visit_counts(compiled, random_inputs(rng, 100)))
+        changed += len(reordering.orders)
+        same_paths(root, reordering.build_root(), random_inputs(rng, 300))
+    # The trees must give the optimizer something to reorder
+    assert changed > 5
@@ -0,0 +1,63 @@
+"""
+Multi-process scoring: the same results as scoring in one process, in
+input order, across chunk boundaries, for trees of any depth.
+"""
+import json
+import random
+
+import pytest
+
+from compiled import compile_tree
+from engine import detect_unreachable_nodes, simulate_batch
+from parallel import ParallelScorer, chunked, parallel_detect_unreachable_nodes, parallel_simulate_batch
+from records import NodeRecord
+from streaming import score_lines
+from tests.random_trees import random_inputs, random_tree
+
+
+def test_chunked():
+    assert list(chunked(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(chunked(range(6), 3)) == [[0, 1, 2], [3, 4, 5]]
+    assert list(chunked([], 3)) == []
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+def test_batch_results_in_input_order(chunk_size):
+    root = random_tree(4)
+    rows = random_inputs(random.Random(4), 100)
+    expected = simulate_batch(compile_tree(root), rows)
+    assert parallel_simulate_batch(root, rows, workers=3, chunk_size=chunk_size) == expected
+    final = parallel_simulate_batch(root, rows, final_only=True, workers=2, chunk_size=chunk_size)
+    assert final == simulate_batch(compile_tree(root), rows, final_only=True)
+
+
+@pytest.mark.parametrize("qualify_duplicates", [False, True])
+def test_unreachable_merged_across_chunks(qualify_duplicates):
+    for seed in range(3):
+        root = random_tree(seed)
+        samples = random_inputs(random.Random(seed), 60)
+        expected = detect_unreachable_nodes(root, samples, qualify_duplicates)
+        merged = parallel_detect_unreachable_nodes(root, samples, workers=3, chunk_size=5, qualify_duplicates=qualify_duplicates)
+        assert merged == expected
+
+
+def test_score_lines_numbering():
+    root = random_tree(5)
+    lines = [json.dumps(row) + "\n" for row in random_inputs(random.Random(5), 20)]
+    lines[3] = "\n"
+    lines[8] = "[1, 2]\n"
+    lines[12] = "{oops\n"
+    with ParallelScorer(root, workers=2, chunk_size=4) as scorer:
+        scored = list(scorer.score_lines(lines))
+    assert scored == list(score_lines(compile_tree(root), lines))
+    assert [json.loads(line)["line"] for line in scored] == [number for number in range(1, 21) if number != 4]
+
+
+def test_deep_tree():
+    # Built bottom up, as nesting this deep cannot be validated as a Node
+    depth = 5000
+    root = NodeRecord(f"n{depth}", "leaf", None, [])
+    for level in range(depth - 1, -1, -1):
+        root = NodeRecord(f"n{level}", "t", "input.x > 0" if level else None, [root])
+    results = parallel_simulate_batch(root, [{"x": 1}, {"x": 0}], final_only=True, workers=2, chunk_size=1)
+    assert [result["final_node_id"] for result in results] == [f"n{depth}", "n0"]
@@ -0,0 +1,17 @@
+import pytest
+
+from compiled import compile_tree
+from models import Node
+from paths import path_page
+
+
+@pytest.mark.parametrize("condition", ["input.flag is True", "input.flag is False"])
+def test_fit_tries_booleans_as_well_as_0_and_1(condition):
+    # `is` is opaque to the analysis, so only a fitted input reaches "target"
+    root = Node(node_id="root", text="", children=[
+        Node(node_id="target", text="", condition=condition),
+        Node(node_id="other", text=""),
+    ])
+    page = path_page(compile_tree(root), 0, 10)
+    (entry,) = [entry for entry in page["paths"] if entry["path"][-1] == "target"]
+    assert entry["verified"]
@@ -0,0 +1,88 @@
+"""
+The tree registry: content addresses, LRU eviction, and trees written to
+disk surviving evictions and restarts.
+"""
+import os
+
+from models import DecisionTree, EditNodeOperation
+from registry import TreeRegistry
+from tests.random_trees import random_tree
+
+
+def tree(seed):
+    return DecisionTree(root=random_tree(seed), sample_inputs=[{"x": seed}])
+
+
+def test_same_content_same_entry():
+    registry = TreeRegistry()
+    entry = registry.register(tree(1))
+    assert registry.register(tree(1)) is entry
+    assert registry.register(tree(2)).tree_id != entry.tree_id
+    # Sample inputs are part of the address
+    assert registry.register(DecisionTree(root=random_tree(1))).tree_id != entry.tree_id
+
+
+def test_lru_eviction():
+    registry = TreeRegistry(maxsize=2)
+    first, second = registry.register(tree(1)), registry.register(tree(2))
+    assert registry.get(first.tree_id) is first
+    third = registry.register(tree(3))
+    assert [entry.tree_id for entry in registry.entries()] == [first.tree_id, third.tree_id]
+    # Nowhere to reload it from
+    assert registry.get(second.tree_id) is None
+    # Registering looks the id up first, a miss for each new tree
+    assert registry.info() == {"hits": 1, "misses": 4, "size": 2, "maxsize": 2}
+
+
+def test_reloaded_after_eviction(tmp_path):
+    registry = TreeRegistry(maxsize=1, storage_dir=str(tmp_path))
+    first = registry.register(tree(1))
+    registry.register(tree(2))
+    reloaded = registry.get(first.tree_id)
+    assert reloaded is not first
+    assert reloaded.compiled.root_digest() == first.compiled.root_digest()
+    assert reloaded.tree.sample_inputs == [{"x": 1}]
+
+
+def test_survives_restart(tmp_path):
+    registry = TreeRegistry(storage_dir=str(tmp_path))
+    ids = [registry.register(tree(seed)).tree_id for seed in range(3)]
+    # Oldest first, so the last registered is the most recently written
+    for age, tree_id in enumerate(ids):
+        os.utime(tmp_path / f"{tree_id}.json", (1000 + age, 1000 + age))
+
+    restarted = TreeRegistry(maxsize=2, storage_dir=str(tmp_path))
+    assert restarted.preload_stored() == 2
+    assert [entry.tree_id for entry in restarted.entries()] == ids[1:]
+    assert restarted.get(ids[0]).tree.sample_inputs == [{"x": 0}]
+
+
+def test_patched_trees_written_on_flush_or_eviction(tmp_path):
+    registry = TreeRegistry(maxsize=2, storage_dir=str(tmp_path))
+    entry = registry.register(tree(1))
+    patched, _, _ = registry.patch(entry, [EditNodeOperation(op="edit", index=0, text="edited")])
+    path = tmp_path / f"{patched.tree_id}.json"
+    assert not patched.persisted and not path.exists()
+    registry.flush()
+    assert patched.persisted and path.exists()
+
+    again, _, _ = registry.patch(patched, [EditNodeOperation(op="edit", index=0, text="again")])
+    registry.register(tree(2))
+    registry.register(tree(3))
+    assert again.tree_id not in {entry.tree_id for entry in registry.entries()}
+    assert TreeRegistry(storage_dir=str(tmp_path)).get(again.tree_id).tree.root.text == "again"
+
+
+def test_only_alphanumeric_ids_are_read(tmp_path):
+    storage = tmp_path / "trees"
+    registry = TreeRegistry(storage_dir=str(storage))
+    entry = registry.register(tree(1))
+    # A tree stored outside the registry, and one under a name no id has
+    (tmp_path / "outside.json").write_text(entry.tree.model_dump_json())
+    (storage / "not-an-id.json").write_text(entry.tree.model_dump_json())
+
+    restarted = TreeRegistry(storage_dir=str(storage))
+    assert restarted.get("../outside") is None
+    assert restarted.get("not-an-id") is None
+    assert restarted.preload_stored() == 1
+    assert [stored.tree_id for stored in restarted.entries()] == [entry.tree_id]
@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+
+from compiled import compile_tree
+from models import Node
+from resolvers import Resolver, StubResolver, traverse_async
+
+
+def test_resolve_must_be_implemented():
+    class Incomplete(Resolver):
+        fields = {"x"}
+
+    with pytest.raises(TypeError, match="resolve"):
+        Incomplete()
+
+
+def test_fields_are_fetched_for_reached_branches_only():
+    root = Node(node_id="root", text="", children=[
+        Node(node_id="a", text="", condition="input.x > 1", children=[
+            Node(node_id="a1", text="", condition="input.y > 1"),
+        ]),
+        Node(node_id="b", text=""),
+    ])
+    compiled = compile_tree(root)
+    resolver = StubResolver({"x": 0, "y": 5})
+    path, features = asyncio.run(traverse_async(compiled, {}, [resolver]))
+    assert [compiled.node_ids[index] for index in path] == ["root", "b"]
+    assert resolver.calls == [("x",)]
+    assert features.resolved == {"x": 0}
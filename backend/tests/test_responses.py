@@ -0,0 +1,53 @@
+"""
+Precomputed JSON responses: the bodies decode to what FastAPI's own
+encoding gave, and ETags turn repeat requests into 304s.
+"""
+import json
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from main import app
+from responses import CachedJSON, dumps
+from tree_examples import example_trees
+
+
+client = TestClient(app)
+
+
+def test_examples_match_fastapi_encoding():
+    response = client.get("/examples")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == jsonable_encoder(example_trees)
+
+    for name, tree in example_trees.items():
+        response = client.get(f"/examples/{name}/sample_inputs")
+        assert response.json() == jsonable_encoder(tree.sample_inputs or [])
+
+
+def test_etag_revalidation():
+    first = client.get("/examples")
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "no-cache"
+
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = client.get("/examples", headers={"If-None-Match": header})
+        assert response.status_code == 304, header
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+    response = client.get("/examples", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+    assert response.content == first.content
+
+
+def test_etag_follows_content():
+    assert CachedJSON({"a": 1}).etag == CachedJSON({"a": 1}).etag
+    assert CachedJSON({"a": 1}).etag != CachedJSON({"a": 2}).etag
+
+
+def test_dumps_matches_json_module():
+    content = {"text": "café ✓", "n": [1, 2.5, -3, None, True], "nested": {"k": []}, "big": 2 ** 70}
+    assert json.loads(dumps(content)) == content
+    assert json.loads(dumps({"small": 1})) == {"small": 1}
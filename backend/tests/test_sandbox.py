@@ -0,0 +1,179 @@
+"""
+The condition sandbox: what it refuses, the limits on what it runs, that
+it agrees with eval() on what it accepts, and request time budgets.
+"""
+import ast
+import random
+import time
+import tracemalloc
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from compiled import compile_tree
+from conditions import InputView, compile_condition, input_namespace
+from engine import simulate_batch
+from sandbox import (
+    BudgetExceeded,
+    ConditionValidationError,
+    EvaluationLimitError,
+    TimeBudgetMiddleware,
+    compile_expression,
+    time_budget,
+)
+from tests.random_trees import random_inputs, random_tree
+
+
+def compile_source(source: str):
+    return compile_expression(ast.parse(source, mode="eval"))
+
+
+@pytest.mark.parametrize("source", [
+    "[x for x in input.l]",
+    "{x: 1 for x in input.l}",
+    "(lambda: 1)()",
+    "__import__('os')",
+    "open('/etc/passwd')",
+    "input.__class__.__bases__",
+    "().__class__",
+    "getattr(input, 'x')",
+    "f'{input.x}'",
+    "x",
+    "input.s.format(1)",
+    "+".join(["input.x > 1"] * 600),
+])
+def test_refused(source):
+    with pytest.raises(ConditionValidationError):
+        compile_source(source)
+    condition = compile_condition(source)
+    assert condition.code is None
+    assert not condition(input_namespace({"x": 1, "l": [1], "s": "a"}))
+
+
+def test_dunder_fields_are_just_missing_fields():
+    with pytest.raises(AttributeError, match="input has no field '__class__'"):
+        compile_source("input.__class__")({})
+
+
+@pytest.mark.parametrize("source", [
+    "10 ** 10 ** 8 > 1",
+    "'a' * 10 ** 9 == ''",
+    "input.s * input.n",
+    "1 << 10 ** 9",
+    "'%0999999999d' % 1",
+    "input.s.replace('', 'xxxxxxxxxx')",
+    "input.s.center(10 ** 9)",
+    "input.s.zfill(input.n)",
+    "input.l * input.n",
+    "sum(input.big) > 0 and sum(input.big) > 0",
+    "len(input.s.join(input.w)) > 0",
+    "len(('a' * 999999) + ('a' * 999999)) > 0",
+    "len(input.s + input.s + input.s + input.s + input.s + input.s) > 0",
+    "len(str(['a' * 10000] * 10000)) > 0",
+    "len(str(input.u)) > 0",
+    "('%s' * 1000) % ((input.s,) * 1000)",
+    "('%s' * 10) % (input.s, input.s, input.s, input.s, input.s, input.s, input.s, input.s, input.s, input.s)",
+    "('%(k)s' * 10) % {'k': input.s}",
+])
+def test_limits_fail_fast(source):
+    inputs = {
+        "s": "a" * 200_000, "n": 10 ** 9, "l": [1], "big": list(range(600_000)),
+        "w": ["b"] * 10_000, "u": ["\x00" * 9] * 100_000,
+    }
+    started = time.perf_counter()
+    with pytest.raises(EvaluationLimitError):
+        compile_source(source)(inputs)
+    assert time.perf_counter() - started < 0.5
+    # As a condition, exceeding a limit is False like any other error
+    assert not compile_condition(source)(input_namespace(inputs))
+
+
+def test_folding_keeps_no_huge_constants():
+    source = "len(" + " + ".join(["('a' * 999999)"] * 70) + ") > 0"
+    tracemalloc.start()
+    try:
+        evaluate = compile_source(source)
+        kept, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert kept < 5_000_000
+    with pytest.raises(EvaluationLimitError):
+        evaluate({})
+
+
+EXPRESSIONS = [
+    "input.a >= 18", "input.x == 'a'", "input.x != 3", "input.a > 1 and input.b < 2",
+    "input.a > 1 or input.b < 2", "not input.a", "1 < input.a <= 5", "input.a in [1, 2, 'x']",
+    "input.a not in (1, 2)", "input.s in input.t", "input.a + input.b > 3", "input.a * 0.8 >= input.b",
+    "input.a % 2 == 0", "input.a ** 2 > 10", "-input.a < 0", "input.l[0] == 1", "input.l[1:] == [2]",
+    "input.d['k'] == 1", "len(input.s) > 2", "input.s.lower() == 'ab'", "input.s.startswith('a')",
+    "max(input.l) > 1", "input.a if input.b else input.c", "input.a is None", "(input.a or 0) > 1",
+    "input.a // 2 == 1", "input.a / input.b > 1", "abs(input.a) > 1", "round(input.a) == 2",
+    "input.d.get('k', 0) > 0", "input.a & 1", "input.a == True", "~input.a < 0", "'%s-%d' % (input.s, input.a)",
+    "input.s + input.t == 'ab'", "input.l + [3] == [1, 2, 3]", "input.a + 1 > 2", "str(input.l) == '[1, 2]'",
+    "'-'.join(input.l) == ''", "input.l * 2 == []",
+]
+VALUES = [0, 1, 2, 3, -1, 2.5, "a", "ab", "AB", "x", None, True, False, [1, 2], [], {"k": 1}, {}, 1e300]
+FIELDS = "a b c s t l d x".split()
+
+
+def outcome(evaluate, inputs):
+    try:
+        return "ok", bool(evaluate(inputs))
+    except Exception as e:
+        return "error", type(e).__name__, str(e)
+
+
+@pytest.mark.parametrize("source", EXPRESSIONS)
+def test_agrees_with_eval(source):
+    rng = random.Random(source)
+    code = compile(source, "<condition>", "eval")
+    evaluate = compile_source(source)
+    for _ in range(300):
+        inputs = {name: rng.choice(VALUES) for name in FIELDS if rng.random() < 0.8}
+        expected = outcome(lambda values: eval(code, {"__builtins__": __builtins__}, {"input": InputView(values)}), inputs)
+        assert outcome(evaluate, inputs) == expected, inputs
+
+
+def test_budget_aborts_a_batch():
+    compiled = compile_tree(random_tree(3))
+    rows = random_inputs(random.Random(3), 200) * 500
+    started = time.perf_counter()
+    with pytest.raises(BudgetExceeded):
+        with time_budget(0.05):
+            simulate_batch(compiled, rows)
+    assert time.perf_counter() - started < 2
+
+
+def test_no_budget_outside_requests():
+    compiled = compile_tree(random_tree(3))
+    with time_budget(0):
+        assert len(simulate_batch(compiled, random_inputs(random.Random(3), 50))) == 50
+
+
+def test_middleware_answers_503():
+    app = FastAPI()
+    app.add_middleware(TimeBudgetMiddleware, seconds=0.05)
+
+    @app.exception_handler(BudgetExceeded)
+    def budget_exceeded(request, exc):
+        return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+    compiled = compile_tree(random_tree(3))
+    rows = random_inputs(random.Random(3), 200) * 500
+
+    @app.get("/slow")
+    def slow():
+        return simulate_batch(compiled, rows, final_only=True)
+
+    @app.get("/fast")
+    def fast():
+        return simulate_batch(compiled, rows[:10], final_only=True)
+
+    client = TestClient(app)
+    response = client.get("/slow")
+    assert response.status_code == 503
+    assert "time budget" in response.json()["detail"]
+    assert client.get("/fast").status_code == 200
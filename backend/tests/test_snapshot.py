@@ -0,0 +1,102 @@
+import random
+import struct
+
+import pytest
+
+from compiled import compile_tree
+from models import DecisionTree
+from patches import apply_patch
+from registry import TreeRegistry
+from snapshot import SnapshotError, load_snapshot, write_snapshot
+from startup import StartupReport, warm_start
+from tests.random_trees import random_inputs, random_operations, random_tree
+from tree_examples import example_trees
+
+
+def registered(count: int) -> TreeRegistry:
+    registry = TreeRegistry()
+    for seed in range(count):
+        registry.register(DecisionTree(root=random_tree(seed), sample_inputs=[{"x": seed}]))
+    return registry
+
+
+def test_round_trip(tmp_path):
+    registry = registered(12)
+    path = str(tmp_path / "trees.snapshot")
+    write_snapshot(path, registry.entries())
+    loaded = load_snapshot(path)
+
+    assert [entry.tree_id for entry in loaded] == [entry.tree_id for entry in registry.entries()]
+    rows = random_inputs(random.Random(0), 50)
+    for original, entry in zip(registry.entries(), loaded):
+        assert entry.tree.model_dump() == original.tree.model_dump()
+        assert entry.compiled.subtree_hashes() == original.compiled.subtree_hashes()
+        assert entry.compiled.qualified_ids == original.compiled.qualified_ids
+        for name in ("first_child", "next_sibling", "parent", "depth"):
+            assert list(getattr(entry.compiled, name)) == list(getattr(original.compiled, name))
+        assert [entry.compiled.traverse(inputs)[0] for inputs in rows] == [original.compiled.traverse(inputs)[0] for inputs in rows]
+
+
+def test_loaded_trees_can_be_patched(tmp_path):
+    registry = registered(3)
+    path = str(tmp_path / "trees.snapshot")
+    write_snapshot(path, registry.entries())
+    rng = random.Random(1)
+    for entry in load_snapshot(path):
+        operations = random_operations(rng, entry.compiled, 5)
+        patched, _, _ = apply_patch(entry.compiled, operations)
+        expected, _, _ = apply_patch(compile_tree(entry.tree.root), operations)
+        assert patched.subtree_hashes()[0] == expected.subtree_hashes()[0]
+
+
+def test_patched_entries_are_written_in_preorder(tmp_path):
+    registry = TreeRegistry()
+    entry = registry.register(DecisionTree(root=random_tree(5)))
+    patched, _, _ = registry.patch(entry, random_operations(random.Random(5), entry.compiled, 6))
+    path = str(tmp_path / "trees.snapshot")
+    write_snapshot(path, [patched])
+    (loaded,) = load_snapshot(path)
+    assert loaded.tree_id == patched.tree_id
+    assert loaded.compiled.node_ids == compile_tree(patched.tree.root).node_ids
+
+
+@pytest.mark.parametrize("damage", ["empty", "magic", "truncated", "directory", "strings", "structure"])
+def test_damaged_snapshots_are_refused(tmp_path, damage):
+    path = tmp_path / "trees.snapshot"
+    write_snapshot(str(path), registered(2).entries())
+    data = path.read_bytes()
+    if damage == "empty":
+        data = b""
+    elif damage == "magic":
+        data = b"NOTASNAP" + data[8:]
+    elif damage == "truncated":
+        data = data[:-64]
+    elif damage in ("strings", "structure"):
+        # Flip a byte of a node text, or of the first tree's first_child
+        (size,) = struct.unpack_from("<Q", data, 8)
+        position = data.rindex(b"Node ") + 5 if damage == "strings" else (16 + size + 7) // 8 * 8
+        data = data[:position] + bytes([data[position] ^ 1]) + data[position + 1:]
+    else:
+        data = data[:16] + b"]" + data[17:]
+    path.write_bytes(data)
+    with pytest.raises(SnapshotError):
+        load_snapshot(str(path))
+
+
+def test_warm_start_writes_then_maps(tmp_path):
+    storage = str(tmp_path / "registry")
+    path = str(tmp_path / "trees.snapshot")
+    stored = TreeRegistry(storage_dir=storage)
+    for seed in range(4):
+        stored.register(DecisionTree(root=random_tree(seed)))
+
+    first = warm_start(TreeRegistry(storage_dir=storage), example_trees, path, StartupReport())
+    assert first.stored_trees == 4
+    assert first.snapshot_bytes > 0
+
+    registry = TreeRegistry(storage_dir=storage)
+    second = warm_start(registry, example_trees, path, StartupReport())
+    assert second.snapshot_trees == 4 + len(example_trees)
+    assert second.stored_trees == 0
+    assert second.snapshot_bytes is None
+    assert len(registry.entries()) == 4 + len(example_trees)
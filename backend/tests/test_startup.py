@@ -0,0 +1,26 @@
+import logging
+
+import columnar
+import responses
+from registry import TreeRegistry
+from startup import StartupReport, missing_extras, warm_start
+
+
+def test_missing_extras_are_logged_once(monkeypatch, caplog):
+    monkeypatch.setattr(columnar, "np", None)
+    monkeypatch.setattr(responses, "orjson", None)
+    assert missing_extras() == ["numpy", "orjson"]
+
+    with caplog.at_level(logging.WARNING, logger="treejack.startup"):
+        report = warm_start(TreeRegistry(), {}, None, StartupReport())
+    assert report.info()["missing_extras"] == ["numpy", "orjson"]
+    assert [record.getMessage().split()[0] for record in caplog.records] == ["numpy", "orjson"]
+
+
+def test_nothing_logged_with_extras_installed(monkeypatch, caplog):
+    # Installed or not here
+    monkeypatch.setattr(columnar, "np", object())
+    monkeypatch.setattr(responses, "orjson", object())
+    with caplog.at_level(logging.WARNING, logger="treejack.startup"):
+        report = warm_start(TreeRegistry(), {}, None, StartupReport())
+    assert report.missing_extras == [] and not caplog.records
@@ -0,0 +1,120 @@
+"""
+NDJSON scoring: one result line per input line, error lines for rows that
+are not JSON objects, line numbers that count every input line, and the
+time budget starting over on each line.
+"""
+import asyncio
+import json
+import random
+import time
+
+from fastapi.testclient import TestClient
+
+from compiled import compile_tree
+from conditions import input_value
+from engine import simulate_batch
+from main import app
+from sandbox import check_budget, time_budget
+from streaming import iter_lines, score_lines, score_stream
+from tests.random_trees import random_inputs, random_tree
+
+
+client = TestClient(app)
+
+
+def rows_with_errors():
+    lines = [json.dumps(row) for row in random_inputs(random.Random(2), 12)]
+    lines[2] = ""
+    lines[5] = "[1, 2]"
+    lines[9] = "{oops"
+    return lines
+
+
+def test_score_lines():
+    compiled = compile_tree(random_tree(2))
+    lines = rows_with_errors()
+    scored = [json.loads(line) for line in score_lines(compiled, [line + "\n" for line in lines])]
+
+    assert [result["line"] for result in scored] == [number for number in range(1, 13) if number != 3]
+    errors = {result["line"]: result["error"] for result in scored if "error" in result}
+    assert set(errors) == {6, 10}
+    assert errors[6] == "input row must be a JSON object"
+
+    rows = [json.loads(lines[number - 1]) for number in range(1, 13) if number not in (3, 6, 10)]
+    expected = simulate_batch(compiled, rows)
+    results = [result for result in scored if "error" not in result]
+    assert [result["final_node_id"] for result in results] == [row["final_node_id"] for row in expected]
+    assert [result["path"] for result in results] == [row["path"] for row in expected]
+
+
+def test_stream_endpoint():
+    root = random_tree(2)
+    lines = rows_with_errors()
+    body = json.dumps({"root": root.model_dump()}) + "\n" + "\n".join(lines)
+    response = client.post("/simulate/stream?final_only=true", content=body)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    scored = [json.loads(line) for line in response.text.splitlines()]
+    # The tree is line 1
+    assert [result["line"] for result in scored] == [number for number in range(2, 14) if number != 4]
+    assert "path" not in scored[0]
+    expected = [json.loads(line) for line in score_lines(compile_tree(root), [line + "\n" for line in lines], final_only=True)]
+    assert [{**result, "line": result["line"] - 1} for result in scored] == expected
+
+
+def test_stream_without_a_tree():
+    assert client.post("/simulate/stream", content="").status_code == 400
+    assert client.post("/simulate/stream", content="{oops\n{}").status_code == 400
+
+
+def test_iter_lines_across_chunks():
+    async def chunks():
+        for chunk in (b'{"x"', b': 1}\n{"x": 2}\n\n{"x"', b": 3}"):
+            yield chunk
+
+    async def collect():
+        return [line async for line in iter_lines(chunks())]
+
+    assert asyncio.run(collect()) == [b'{"x": 1}', b'{"x": 2}', b"", b'{"x": 3}']
+
+
+class SlowTree:
+    """
+    A compiled tree whose traversals take `seconds` when the row asks.
+    """
+
+    def __init__(self, compiled, seconds):
+        self.compiled = compiled
+        self.node_ids = compiled.node_ids
+        self.seconds = seconds
+
+    def traverse_indices(self, inputs):
+        if input_value(inputs, "slow") is True:
+            time.sleep(self.seconds)
+            check_budget()
+        return self.compiled.traverse_indices(inputs)
+
+
+def test_budget_renewed_per_line():
+    tree = SlowTree(compile_tree(random_tree(2)), 0.03)
+    lines = [b'{"slow": true}', b'{"x": 1}', b'{"slow": true, "x": 1}', b'{"x": 2}']
+
+    async def stream():
+        for line in lines:
+            yield line
+
+    async def collect():
+        return [json.loads(line) async for line in score_stream(tree, stream())]
+
+    # Together the rows take longer than the budget; each alone does not
+    with time_budget(0.05):
+        scored = asyncio.run(collect())
+    assert all("error" not in result for result in scored)
+
+    # A row over the budget gets an error line; the next row starts afresh
+    tree.seconds = 0.08
+    with time_budget(0.05):
+        scored = asyncio.run(collect())
+    assert ["error" in result for result in scored] == [True, False, True, False]
+    assert "time budget" in scored[0]["error"]
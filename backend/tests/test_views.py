@@ -0,0 +1,82 @@
+"""
+Node views of registered trees: bounded levels, pages of children, and
+finding nodes by id, with qualified ids telling duplicates apart.
+"""
+from fastapi.testclient import TestClient
+
+from compiled import compile_tree
+from main import app
+from models import DecisionTree, Node
+from tree_examples import example_trees
+
+
+client = TestClient(app)
+
+LOAN = example_trees["loan_application"]
+
+
+def register(tree):
+    return client.post("/trees", json=tree.model_dump()).json()["tree_id"]
+
+
+def test_node_with_levels():
+    tree_id = register(LOAN)
+    view = client.get(f"/trees/{tree_id}/nodes/0", params={"depth": 1}).json()
+    assert view["node_id"] == "start" and view["child_count"] == 2
+    assert [child["node_id"] for child in view["children"]] == ["income_check", "income_too_low"]
+    # Below the last level, children are only counted
+    assert all("children" not in child for child in view["children"])
+    assert view["children"][0]["condition"] == "input.annual_income >= 30000"
+    assert "condition" not in view
+
+    deep = client.get(f"/trees/{tree_id}/nodes/1", params={"depth": 5}).json()
+    assert [child["node_id"] for child in deep["children"]] == ["credit_score_check", "credit_score_low"]
+    rejected = deep["children"][1]["children"][0]
+    assert (rejected["index"], rejected["node_id"], rejected["child_count"], rejected["children"]) == (5, "loan_rejected", 0, [])
+
+    assert client.get(f"/trees/{tree_id}/nodes/8").status_code == 404
+    assert client.get("/trees/unknown/nodes/0").status_code == 404
+
+
+def test_children_pages():
+    wide = DecisionTree(root=Node(node_id="root", text="root", children=[
+        Node(node_id=f"c{position}", text="", children=[Node(node_id=f"g{position}", text="")]) for position in range(5)
+    ]))
+    tree_id = register(wide)
+    page = client.get(f"/trees/{tree_id}/nodes/0/children", params={"offset": 0, "limit": 2}).json()
+    assert [child["node_id"] for child in page["children"]] == ["c0", "c1"]
+    assert page["total"] == 5 and page["next_offset"] == 2
+    assert all("children" not in child for child in page["children"])
+
+    page = client.get(f"/trees/{tree_id}/nodes/0/children", params={"offset": 4, "limit": 2, "depth": 1}).json()
+    assert [child["node_id"] for child in page["children"]] == ["c4"]
+    assert page["children"][0]["children"][0]["node_id"] == "g4"
+    assert "next_offset" not in page
+
+
+def test_find_duplicates():
+    tree_id = register(LOAN)
+    found = client.get(f"/trees/{tree_id}/find/loan_rejected").json()
+    assert found["node_id"] == "loan_rejected"
+    assert [(match["index"], match["depth"], match["qualified_id"]) for match in found["matches"]] == [
+        (5, 3, "credit_score_low/loan_rejected"),
+        (7, 2, "income_too_low/loan_rejected"),
+    ]
+    assert [step["node_id"] for step in found["matches"][1]["path"]] == ["start", "income_too_low", "loan_rejected"]
+
+    found = client.get(f"/trees/{tree_id}/find/income_check").json()
+    assert [match["qualified_id"] for match in found["matches"]] == ["income_check"]
+    assert client.get(f"/trees/{tree_id}/find/nope").status_code == 404
+
+
+def test_qualified_ids_are_unique():
+    # "b/x" is already a node id, so the second x under b gets a suffix
+    root = Node(node_id="r", text="", children=[
+        Node(node_id="b", text="", children=[Node(node_id="x", text=""), Node(node_id="x", text="")]),
+        Node(node_id="b/x", text=""),
+        Node(node_id="x", text=""),
+    ])
+    compiled = compile_tree(root)
+    assert compiled.qualified_ids == ["r", "b", "b/x#2", "b/x#3", "b/x", "r/x"]
+    assert compiled.display_ids() == compiled.node_ids
+    assert compiled.display_ids(qualify_duplicates=True) == compiled.qualified_ids
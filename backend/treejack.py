@@ -0,0 +1,97 @@
+"""
+Command line entry point.
+
+    python -m treejack score tree.json inputs.ndjson [-o results.ndjson] [--final-only]
+                              [--workers N] [--chunk-size N]
+
+Pass "-" as the inputs file to read rows from stdin.
+
+    python -m treejack snapshot snapshot.bin [--registry-dir DIR] [--max-trees N]
+
+Writes the example trees and the trees stored in DIR (newest first, up to N)
+to a snapshot that API workers started with TREEJACK_SNAPSHOT map at
+start-up instead of compiling.
+"""
+import argparse
+import logging
+import sys
+
+from models import DecisionTree
+from compiled import compile_tree
+from streaming import score_lines
+from parallel import DEFAULT_CHUNK_SIZE, ParallelScorer
+from registry import DEFAULT_REGISTRY_SIZE, TreeRegistry
+from snapshot import write_snapshot
+from startup import warm_start
+
+
+def load_tree(path: str) -> DecisionTree:
+    with open(path, encoding="utf-8") as f:
+        return DecisionTree.model_validate_json(f.read())
+
+
+def score(args: argparse.Namespace) -> int:
+    tree = load_tree(args.tree)
+
+    inputs = sys.stdin if args.inputs == "-" else open(args.inputs, encoding="utf-8")
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        # Rows are read, scored and written one at a time
+        if args.workers > 1:
+            with ParallelScorer(tree.root, args.workers, args.chunk_size) as scorer:
+                for line in scorer.score_lines(inputs, args.final_only):
+                    output.write(line)
+        else:
+            for line in score_lines(compile_tree(tree.root), inputs, args.final_only):
+                output.write(line)
+    finally:
+        if inputs is not sys.stdin:
+            inputs.close()
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+def snapshot(args: argparse.Namespace) -> int:
+    # Building the example trees takes a while; only this command needs them
+    from tree_examples import example_trees
+
+    registry = TreeRegistry(maxsize=args.max_trees, storage_dir=args.registry_dir)
+    warm_start(registry, example_trees)
+    entries = registry.entries()
+    size = write_snapshot(args.output, entries)
+    print(f"wrote {len(entries)} trees, {size} bytes, to {args.output}", file=sys.stderr)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="treejack", description="TreeJack decision tree tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    score_parser = subcommands.add_parser("score", help="score NDJSON input rows against a tree")
+    score_parser.add_argument("tree", help="tree JSON file (a DecisionTree with a 'root')")
+    score_parser.add_argument("inputs", help="NDJSON file with one input_values object per line, or -")
+    score_parser.add_argument("-o", "--output", default="-", help="where to write NDJSON results (default: stdout)")
+    score_parser.add_argument("--final-only", action="store_true", help="only emit the final node id per row")
+    score_parser.add_argument("--workers", type=int, default=1, help="score in this many processes (default: 1)")
+    score_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows per task sent to a worker")
+    score_parser.set_defaults(handler=score)
+
+    snapshot_parser = subcommands.add_parser("snapshot", help="write compiled trees to a snapshot for API workers")
+    snapshot_parser.add_argument("output", help="snapshot file to write")
+    snapshot_parser.add_argument("--registry-dir", help="also include the trees stored here (TREEJACK_REGISTRY_DIR)")
+    snapshot_parser.add_argument("--max-trees", type=int, default=DEFAULT_REGISTRY_SIZE, help="at most this many trees")
+    snapshot_parser.set_defaults(handler=snapshot)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    # Condition errors are logged; they go to stderr, clear of the results
+    logging.basicConfig(stream=sys.stderr, format="%(message)s")
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
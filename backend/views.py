@@ -0,0 +1,75 @@
+"""
+Lazy views of a registered tree for the viewer.
+
+Instead of sending a whole tree, these build responses for one node with a
+bounded number of levels below it, one page of a wide node's children at a
+time, or the path from the root to a node found by id. Nodes are addressed by
+their preorder index in the compiled tree (the root is 0), since ids need not
+be unique. Every view reports `child_count`, so the viewer knows what is left
+to fetch.
+"""
+from itertools import islice
+from typing import Any, Dict, List
+
+from compiled import CompiledTree
+
+
+def node_summary(compiled: CompiledTree, index: int) -> Dict[str, Any]:
+    node = compiled.nodes[index]
+    return {
+        "index": index,
+        "node_id": node.node_id,
+        "text": node.text,
+        "condition": node.condition,
+        "child_count": len(node.children),
+    }
+
+
+def node_view(compiled: CompiledTree, index: int, depth: int, limit: int) -> Dict[str, Any]:
+    """
+    Node `index` with up to `depth` levels below it, and at most `limit`
+    children per node. Nodes below the last level come without `children`.
+    """
+    view = node_summary(compiled, index)
+    if depth > 0:
+        view["children"] = [
+            node_view(compiled, child, depth - 1, limit)
+            for child in islice(compiled.iter_children(index), limit)
+        ]
+    return view
+
+
+def children_page(compiled: CompiledTree, index: int, offset: int, limit: int, depth: int) -> Dict[str, Any]:
+    """
+    Children `offset` to `offset + limit` of node `index`, each with `depth`
+    further levels.
+    """
+    total = len(compiled.nodes[index].children)
+    children = [
+        node_view(compiled, child, depth, limit)
+        for child in islice(compiled.iter_children(index), offset, offset + limit)
+    ]
+    return {
+        "index": index,
+        "offset": offset,
+        "limit": limit,
+        "total": total,
+        "next_offset": offset + limit if offset + limit < total else None,
+        "children": children,
+    }
+
+
+def find_node(compiled: CompiledTree, node_id: str) -> List[Dict[str, Any]]:
+    """
+    Every node with this id, each with its depth, its qualified id (unique
+    even when the id is not) and the path of node summaries from the root.
+    """
+    return [
+        {
+            "index": index,
+            "depth": compiled.depth[index],
+            "qualified_id": compiled.qualified_ids[index],
+            "path": [node_summary(compiled, step) for step in compiled.path_to(index)],
+        }
+        for index in compiled.indices_of(node_id)
+    ]
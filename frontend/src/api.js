@@ -51,6 +51,91 @@ const api = {
       console.error('Error detecting unreachable nodes:', error);
       throw error;
     }
+  },
+
+  // Register a tree once; later requests refer to it by tree_id
+  registerTree: async (tree) => {
+    try {
+      const response = await axios.post(`${API_URL}/trees`, tree);
+      return response.data;
+    } catch (error) {
+      console.error('Error registering tree:', error);
+      throw error;
+    }
+  },
+
+  // Get one node of a registered tree (index 0 is the root) with `depth` levels below it
+  getTreeNode: async (treeId, index = 0, depth = 1, limit = 100) => {
+    try {
+      const response = await axios.get(`${API_URL}/trees/${treeId}/nodes/${index}`, {
+        params: { depth, limit }
+      });
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching tree node:', error);
+      throw error;
+    }
+  },
+
+  // Get a page of a node's children
+  getTreeChildren: async (treeId, index, offset = 0, limit = 100, depth = 0) => {
+    try {
+      const response = await axios.get(`${API_URL}/trees/${treeId}/nodes/${index}/children`, {
+        params: { offset, limit, depth }
+      });
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching tree children:', error);
+      throw error;
+    }
+  },
+
+  // Find the nodes with a given id and the path from the root to each
+  findTreeNode: async (treeId, nodeId) => {
+    try {
+      const response = await axios.get(`${API_URL}/trees/${treeId}/find/${encodeURIComponent(nodeId)}`);
+      return response.data;
+    } catch (error) {
+      console.error('Error finding tree node:', error);
+      throw error;
+    }
+  },
+
+  // Apply add/remove/move/edit operations to a registered tree; returns the new tree_id
+  patchTree: async (treeId, operations) => {
+    try {
+      const response = await axios.post(`${API_URL}/trees/${treeId}/patch`, { operations });
+      return response.data;
+    } catch (error) {
+      console.error('Error patching tree:', error);
+      throw error;
+    }
+  },
+
+  // Get a page of a registered tree's root-to-leaf paths, each with its constraints and an input
+  getTreePaths: async (treeId, offset = 0, limit = 100) => {
+    try {
+      const response = await axios.get(`${API_URL}/trees/${treeId}/paths`, {
+        params: { offset, limit }
+      });
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching tree paths:', error);
+      throw error;
+    }
+  },
+
+  // Synthesize sample inputs covering every reachable leaf
+  getTestInputs: async (treeId, limit = 1000) => {
+    try {
+      const response = await axios.get(`${API_URL}/trees/${treeId}/test-inputs`, {
+        params: { limit }
+      });
+      return response.data;
+    } catch (error) {
+      console.error('Error generating test inputs:', error);
+      throw error;
+    }
   }
 };
 